@@ -33,12 +33,24 @@ def merge_and_store_elasticities(regression_df_7, regression_df_14, regression_d
     print(f"Загружено {len(merged_df)} записей в ts_schema.product_elasticities")
 
 
+# Число из таймстемпа: value_num, а если он пуст - безопасное приведение value (пустые и нечисловые строки -> NULL).
+# Числа вне диапазона double precision тоже дают NULL (функция to_double_or_null из миграций databaseadmin).
+# Скрипт работает без Django, поэтому выражение продублировано из databaseadmin.data_access.value_number_sql
+NUMERIC_VALUE_SQL = r"""
+    CASE
+        WHEN btrim({column}) ~ '^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$'
+        THEN ts_schema.to_double_or_null(btrim({column}))
+    END
+"""
+
+
 def read_from_postgres(engine=None):
     if engine is None:
         engine = get_engine()
-    query = """
+    value = f"COALESCE(t1.value_num, {NUMERIC_VALUE_SQL.format(column='t1.value')})"
+    query = f"""
     select val as trips, att_val as attribute, t5.dt as date, t5.time_series_id, t6.attribute_id
-    from (select sum(t1.value::float) as val,
+    from (select sum({value}) as val,
         start_dt as dt, t3.time_series_id, t1.attribute_id
     from ts_schema.timestamps t1
     join ts_schema.attributes t2 
@@ -46,8 +58,8 @@ def read_from_postgres(engine=None):
     join ts_schema.time_series t3
     on t1.time_series_id = t3.time_series_id
     and t2.name = 'traffic'
-    group by dt, t4.time_series_id, t1.attribute_id) t5
-    join (select avg(t1.value::float) as att_val,
+    group by dt, t3.time_series_id, t1.attribute_id) t5
+    join (select avg({value}) as att_val,
         start_dt as dt, t3.time_series_id, t1.attribute_id
     from ts_schema.timestamps t1
     join ts_schema.attributes t2 
@@ -62,3 +74,130 @@ def read_from_postgres(engine=None):
     df = pd.read_sql(query, engine)
     print(f"Данные успешно загружены из таблицы")
     return df
+
+
+# Отпечаток снимков series_store: число строк и сумма xmin до водяного знака и число строк после него.
+# Продублирован из databaseadmin.series_store.FINGERPRINT_SQL: снимок верен, только если отпечаток совпадает
+STORE_FINGERPRINT_SQL = """
+    SELECT
+        k.time_series_id,
+        k.attribute_id,
+        count(t.timestamp_id) FILTER (WHERE t.timestamp_id <= k.watermark),
+        coalesce(sum(t.xmin::text::bigint) FILTER (WHERE t.timestamp_id <= k.watermark), 0),
+        count(t.timestamp_id) FILTER (WHERE t.timestamp_id > k.watermark)
+    FROM unnest(CAST(:series_ids AS integer[]), CAST(:attribute_ids AS integer[]),
+                CAST(:watermarks AS bigint[])) AS k(time_series_id, attribute_id, watermark)
+    LEFT JOIN ts_schema.timestamps t
+        ON t.time_series_id = k.time_series_id AND t.attribute_id = k.attribute_id
+    GROUP BY k.time_series_id, k.attribute_id
+"""
+
+# Пары (ряд, атрибут) с таймстемпами: для каждой нужен снимок
+STORE_KEYS_SQL = """
+    SELECT DISTINCT time_series_id, attribute_id
+    FROM ts_schema.timestamps
+    WHERE attribute_id = ANY(CAST(:attribute_ids AS integer[]))
+"""
+
+# Версия формата meta.json (databaseadmin.series_store.META_VERSION)
+STORE_META_VERSION = 1
+
+
+def _load_store_metas(store_dir, attribute_ids):
+    """meta.json снимков выбранных атрибутов: {(time_series_id, attribute_id): meta}"""
+    import json
+    import os
+
+    metas = {}
+    if not os.path.isdir(store_dir):
+        return metas
+    for series_dir in os.listdir(store_dir):
+        for attribute_id in attribute_ids:
+            path = os.path.join(store_dir, series_dir, str(attribute_id), "meta.json")
+            try:
+                with open(path, encoding="utf-8") as meta_file:
+                    meta = json.load(meta_file)
+            except (OSError, ValueError):
+                continue
+            if meta.get("version") == STORE_META_VERSION:
+                metas[(meta["time_series_id"], meta["attribute_id"])] = meta
+    return metas
+
+
+def _store_is_fresh(metas, attribute_ids, engine):
+    """Снимки есть для всех пар с таймстемпами и совпадают с БД по отпечатку"""
+    with engine.connect() as conn:
+        keys = {tuple(row) for row in conn.execute(text(STORE_KEYS_SQL), {"attribute_ids": list(attribute_ids)})}
+        if not keys <= set(metas):
+            return False
+        if not metas:
+            return True
+        known = sorted(metas)
+        fingerprints = conn.execute(text(STORE_FINGERPRINT_SQL), {
+            "series_ids": [key[0] for key in known],
+            "attribute_ids": [key[1] for key in known],
+            "watermarks": [metas[key]["watermark"] for key in known],
+        })
+        for series_id, attribute_id, rows, xmin_sum, new_rows in fingerprints:
+            meta = metas[(series_id, attribute_id)]
+            if rows != meta["rows"] or int(xmin_sum) != meta["xmin_sum"] or new_rows:
+                return False
+    return True
+
+
+def _read_store_values(store_dir, metas, attribute_ids):
+    """Строки снимков series_store выбранных атрибутов: date, time_series_id, attribute_id, value"""
+    import os
+
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+
+    attribute_ids = set(attribute_ids)
+    frames = []
+    for (series_id, attribute_id), meta in metas.items():
+        if attribute_id not in attribute_ids:
+            continue
+        directory = os.path.join(store_dir, str(series_id), str(attribute_id))
+        for segment in meta["segments"]:
+            table = pa.ipc.open_file(pa.memory_map(os.path.join(directory, segment), "r")).read_all()
+            frames.append(pd.DataFrame({
+                "date": table.column("start_dt").to_pandas(),
+                "time_series_id": series_id,
+                "attribute_id": attribute_id,
+                "value": table.column("num").to_pandas(),
+            }))
+    if not frames:
+        return pd.DataFrame(columns=["date", "time_series_id", "attribute_id", "value"])
+    df = pd.concat(frames, ignore_index=True)
+    df["date"] = df["date"].astype("datetime64[ns, UTC]")
+    return df
+
+
+def read_from_store(store_dir, engine=None):
+    """
+    То же, что read_from_postgres, но значения читаются из снимков databaseadmin.series_store
+    (manage.py sync_series_store --all), из БД - только список атрибутов и отпечатки снимков.
+    Если снимка какой-то пары нет или он отстал от БД, данные читаются через read_from_postgres
+    """
+    if engine is None:
+        engine = get_engine()
+    attributes = pd.read_sql("select attribute_id, name from ts_schema.attributes", engine)
+    traffic_ids = attributes.loc[attributes["name"] == "traffic", "attribute_id"].tolist()
+    other_ids = attributes.loc[attributes["name"] != "traffic", "attribute_id"].tolist()
+
+    metas = _load_store_metas(store_dir, traffic_ids + other_ids)
+    if not _store_is_fresh(metas, traffic_ids + other_ids, engine):
+        print(f"Снимки {store_dir} отстали от БД (нужен manage.py sync_series_store --all), данные читаются из БД")
+        return read_from_postgres(engine)
+
+    keys = ["date", "time_series_id", "attribute_id"]
+    trips = (_read_store_values(store_dir, metas, traffic_ids)
+             .groupby(keys, as_index=False)["value"].sum(min_count=1)
+             .rename(columns={"value": "trips"}))
+    other = (_read_store_values(store_dir, metas, other_ids)
+             .groupby(keys, as_index=False)["value"].mean()
+             .rename(columns={"value": "attribute"}))
+    df = trips.drop(columns="attribute_id").merge(other, on=["date", "time_series_id"])
+    df = df[["trips", "attribute", "date", "time_series_id", "attribute_id"]]
+    print(f"Данные успешно загружены из снимков {store_dir}")
+    return df
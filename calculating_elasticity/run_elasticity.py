@@ -1,10 +1,16 @@
+import os
+
 from calculate_regression import compute_rolling_elasticity
 from calculate_pointwise import compute_pointwise_elasticity
-from db_interaction import merge_and_store_elasticities, read_from_postgres
+from db_interaction import merge_and_store_elasticities, read_from_postgres, read_from_store
 
 
-def run_elasticity():
-    df = read_from_postgres()
+def run_elasticity(store_dir=None):
+    # Снимки series_store читаются только по явному запросу: аргумент store_dir или
+    # ELASTICITY_FROM_SERIES_STORE=True (каталог из SERIES_STORE_DIR). Иначе значения читаются из timestamps
+    if store_dir is None and os.environ.get("ELASTICITY_FROM_SERIES_STORE", "False").lower() == "true":
+        store_dir = os.environ.get("SERIES_STORE_DIR")
+    df = read_from_store(store_dir) if store_dir else read_from_postgres()
 
     regression_df_7 = compute_rolling_elasticity(df, 7)
     regression_df_14 = compute_rolling_elasticity(df, 14)
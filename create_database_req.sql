@@ -33,6 +33,11 @@ ALTER TABLE time_series.timestamps ADD FOREIGN KEY ("time_series_id") REFERENCES
 
 ALTER TABLE time_series.timestamps ADD FOREIGN KEY ("attribute_id") REFERENCES time_series.attributes ("attribute_id");
 
+-- Выборка атрибута ряда по порядку start_dt; value в INCLUDE для Index Only Scan
+CREATE INDEX timestamps_series_attr_idx ON time_series.timestamps ("time_series_id", "attribute_id", "start_dt") INCLUDE ("value");
+
+-- Секционирование timestamps по start_dt (необязательно): python manage.py partition_timestamps
+
 ALTER TABLE time_series.time_series ADD FOREIGN KEY ("parent_time_series_id") REFERENCES time_series.time_series ("time_series_id");
 
 CREATE TABLE time_series.forecasting_models (
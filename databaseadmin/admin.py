@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Attribute, TimeSeries, Timestamp
+from .models import Product, Attribute, TimeSeries, Timestamp, TrainingJob, IngestionJob
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -16,3 +16,14 @@ class TimeSeriesAdmin(admin.ModelAdmin):
 @admin.register(Timestamp)
 class TimestampAdmin(admin.ModelAdmin):
     list_display = ('timestamp_id', 'time_series', 'attribute', 'value', 'start_dt', 'end_dt')
+
+@admin.register(TrainingJob)
+class TrainingJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'forecasting_model', 'status', 'progress', 'created_at', 'finished_at')
+    list_filter = ('status',)
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'model_name', 'original_name', 'status', 'progress', 'rows_processed', 'created_at',
+                    'finished_at')
+    list_filter = ('status', 'model_name')
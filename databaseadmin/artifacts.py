@@ -0,0 +1,230 @@
+"""
+Компактный формат сохранения обученного SARIMAXAutoForecaster (.npz).
+
+Вместо pickle всего SARIMAXResultsWrapper (с исходными рядами, выходом фильтра
+и сглаживателя) сохраняется только то, что нужно для прогноза: порядки модели,
+параметры, выбранные лаги и состояние фильтра Калмана на конце обучающей выборки.
+Прогноз продолжает фильтрацию с этого состояния и совпадает с прогнозом полной модели.
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from .forecasting import SARIMAXAutoForecaster
+
+FORMAT_VERSION = 1
+
+# Параметры конструктора SARIMAX, которые влияют на пространство состояний
+_MODEL_OPTIONS = (
+    'enforce_stationarity',
+    'enforce_invertibility',
+    'measurement_error',
+    'mle_regression',
+    'time_varying_regression',
+    'trend_offset',
+)
+
+
+class CompactForecast:
+    """Результат CompactSARIMAXResults.get_forecast (аналог PredictionResults statsmodels)"""
+
+    def __init__(self, prediction: Any, index: pd.Index):
+        self._prediction = prediction
+        self.predicted_mean = pd.Series(np.asarray(prediction.predicted_mean), index=index, name='predicted_mean')
+        self.var_pred_mean = pd.Series(np.asarray(prediction.var_pred_mean), index=index, name='var_pred_mean')
+
+    def conf_int(self, alpha: float = 0.05) -> pd.DataFrame:
+        bounds = np.asarray(self._prediction.conf_int(alpha=alpha))
+        return pd.DataFrame(bounds, index=self.predicted_mean.index, columns=['lower', 'upper'])
+
+
+class CompactSARIMAXResults:
+    """
+    Замена SARIMAXResultsWrapper для прогноза вне выборки: хранит параметры
+    и предсказанное состояние (и его ковариацию) для первого момента после выборки.
+    """
+
+    def __init__(self, params: pd.Series, order: tuple, seasonal_order: tuple, trend: Any,
+                 options: Dict[str, Any], state: np.ndarray, state_cov: np.ndarray,
+                 nobs: int, index_freq: Optional[str] = None, index_last: Optional[pd.Timestamp] = None):
+        self.params = params
+        self.order = tuple(order)
+        self.seasonal_order = tuple(seasonal_order)
+        self.trend = trend
+        self.options = dict(options)
+        self.state = np.asarray(state, dtype=float)
+        self.state_cov = np.asarray(state_cov, dtype=float)
+        self.nobs = nobs
+        self.index_freq = index_freq
+        self.index_last = index_last
+
+    @classmethod
+    def from_results(cls, results: Any) -> 'CompactSARIMAXResults':
+        model = results.model
+        if model.simple_differencing or model.concentrate_scale:
+            raise ValueError("Компактный формат не поддерживает simple_differencing и concentrate_scale")
+
+        index = getattr(model, '_index', None)
+        index_freq = index_last = None
+        if isinstance(index, pd.DatetimeIndex) and index.freq is not None:
+            index_freq = index.freqstr
+            index_last = index[-1]
+
+        return cls(
+            params=pd.Series(np.asarray(results.params), index=list(model.param_names)),
+            order=model.order,
+            seasonal_order=model.seasonal_order,
+            trend=model.trend,
+            options={name: getattr(model, name) for name in _MODEL_OPTIONS},
+            state=results.predicted_state[:, -1],
+            state_cov=results.predicted_state_cov[:, :, -1],
+            nobs=int(results.nobs),
+            index_freq=index_freq,
+            index_last=index_last,
+        )
+
+    def _forecast_index(self, steps: int) -> pd.Index:
+        # Так же, как statsmodels продолжает индекс выборки при прогнозе
+        if self.index_freq is not None and self.index_last is not None:
+            return pd.date_range(self.index_last, periods=steps + 1, freq=self.index_freq)[1:]
+        return pd.RangeIndex(self.nobs, self.nobs + steps)
+
+    def get_forecast(self, steps: int = 1, exog: Any = None) -> CompactForecast:
+        exog_values = None if exog is None else np.asarray(exog, dtype=float).reshape(steps, -1)
+        model = SARIMAX(
+            np.full(steps, np.nan),
+            exog=exog_values,
+            order=self.order,
+            seasonal_order=self.seasonal_order,
+            trend=self.trend,
+            **self.options
+        )
+        model.ssm.initialize_known(self.state, self.state_cov)
+        results = model.filter(self.params.to_numpy())
+        prediction = results.get_prediction(start=0, end=steps - 1)
+        return CompactForecast(prediction, self._forecast_index(steps))
+
+    def forecast(self, steps: int = 1, exog: Any = None) -> pd.Series:
+        return self.get_forecast(steps, exog).predicted_mean
+
+
+def _cv_results_to_json(cv_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            'order': list(result['order']),
+            'seasonal_order': list(result['seasonal_order']),
+            'mape': float(result['mape']) if np.isfinite(result['mape']) else None,
+            'fit_time': result['fit_time'],
+            'error': result['error'],
+        }
+        for result in cv_results
+    ]
+
+
+def _cv_results_from_json(cv_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            'order': tuple(result['order']),
+            'seasonal_order': tuple(result['seasonal_order']),
+            'mape': result['mape'] if result['mape'] is not None else np.inf,
+            'fit_time': result['fit_time'],
+            'error': result['error'],
+        }
+        for result in cv_results
+    ]
+
+
+def save_compact_forecaster(forecaster: SARIMAXAutoForecaster, path: str, compress: bool = True) -> None:
+    """
+    Сохраняет обученный прогнозировщик в компактном формате .npz.
+
+    Raises:
+        ValueError: Если модель не обучена или её конфигурация не поддерживается
+    """
+    if forecaster.best_model_ is None or forecaster.best_features_ is None:
+        raise ValueError("Сначала вызовите fit().")
+
+    results = forecaster.best_model_
+    if not isinstance(results, CompactSARIMAXResults):
+        results = CompactSARIMAXResults.from_results(results)
+
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'order': list(results.order),
+        'seasonal_order': list(results.seasonal_order),
+        'trend': results.trend,
+        'options': results.options,
+        'nobs': results.nobs,
+        'index_freq': results.index_freq,
+        'index_last': results.index_last.isoformat() if results.index_last is not None else None,
+        'forecaster': {
+            'max_lags': forecaster.max_lags,
+            'top_k_features': forecaster.top_k,
+            'train_ratio': forecaster.train_ratio,
+            'n_jobs': getattr(forecaster, 'n_jobs', 1),
+            'feature_selector': getattr(forecaster, 'feature_selector', 'corr'),
+            'best_order': list(forecaster.best_order_),  # type: ignore
+            'best_seasonal_order': list(forecaster.best_seasonal_order_),  # type: ignore
+            'best_features': list(forecaster.best_features_),
+            'best_mape': float(forecaster.best_mape_) if np.isfinite(forecaster.best_mape_) else None,
+            'cv_results': _cv_results_to_json(getattr(forecaster, 'cv_results_', [])),
+            'search_time': getattr(forecaster, 'search_time_', None),
+            'refit_time': getattr(forecaster, 'refit_time_', None),
+        },
+    }
+
+    save = np.savez_compressed if compress else np.savez
+    with open(path, 'wb') as f:
+        save(
+            f,
+            meta=np.array(json.dumps(meta)),
+            params=results.params.to_numpy(dtype=float),
+            param_names=np.array(results.params.index, dtype=str),
+            state=results.state,
+            state_cov=results.state_cov,
+        )
+
+
+def load_compact_forecaster(path: str) -> SARIMAXAutoForecaster:
+    """Восстанавливает SARIMAXAutoForecaster из файла, сохранённого save_compact_forecaster"""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия формата модели: {meta.get('format_version')}")
+
+        results = CompactSARIMAXResults(
+            params=pd.Series(data['params'], index=data['param_names'].tolist()),
+            order=tuple(meta['order']),
+            seasonal_order=tuple(meta['seasonal_order']),
+            trend=meta['trend'],
+            options=meta['options'],
+            state=data['state'],
+            state_cov=data['state_cov'],
+            nobs=meta['nobs'],
+            index_freq=meta['index_freq'],
+            index_last=pd.Timestamp(meta['index_last']) if meta['index_last'] else None,
+        )
+
+    info = meta['forecaster']
+    forecaster = SARIMAXAutoForecaster(
+        arima_orders=[tuple(info['best_order'])],
+        seasonal_orders=[tuple(info['best_seasonal_order'])],
+        max_lags=info['max_lags'],
+        top_k_features=info['top_k_features'],
+        train_ratio=info['train_ratio'],
+        n_jobs=info['n_jobs'],
+        feature_selector=info['feature_selector'],
+    )
+    forecaster.best_model_ = results  # type: ignore
+    forecaster.best_order_ = tuple(info['best_order'])  # type: ignore
+    forecaster.best_seasonal_order_ = tuple(info['best_seasonal_order'])  # type: ignore
+    forecaster.best_features_ = list(info['best_features'])
+    forecaster.selected_features_ = list(info['best_features'])
+    forecaster.best_mape_ = info['best_mape'] if info['best_mape'] is not None else np.inf
+    forecaster.cv_results_ = _cv_results_from_json(info['cv_results'])
+    forecaster.search_time_ = info['search_time']
+    forecaster.refit_time_ = info['refit_time']
+    return forecaster
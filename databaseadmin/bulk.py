@@ -0,0 +1,149 @@
+"""
+Массовая запись таймстемпов (прогнозов) пачками вместо INSERT на каждую точку.
+"""
+import math
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from django.db import transaction
+
+from . import effective
+from .hierarchy_cache import hierarchy_cache
+from .models import Attribute, TimeSeries, Timestamp
+
+WRITE_MODE_REPLACE = 'replace'
+WRITE_MODE_UPSERT = 'upsert'
+WRITE_MODES = (WRITE_MODE_REPLACE, WRITE_MODE_UPSERT)
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _to_datetime(value: Any) -> datetime:
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def _iter_points(values: pd.Series) -> Iterable[Tuple[datetime, str, Optional[float]]]:
+    """Точки (start_dt, value, value_num); NaN и бесконечности не дают value_num"""
+    for date, value in values.items():
+        number = float(value)
+        yield _to_datetime(date), str(number), number if math.isfinite(number) else None
+
+
+def write_timestamps(time_series: TimeSeries, attribute: Attribute, values: pd.Series,
+                     mode: str = WRITE_MODE_REPLACE,
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Записывает значения атрибута временного ряда (индекс - start_dt) одной транзакцией.
+
+    Args:
+        time_series: Временной ряд
+        attribute: Атрибут
+        values: Значения, индексированные датой начала периода
+        mode: replace - удалить все значения атрибута ряда и вставить заново;
+              upsert - обновить точки с совпадающим start_dt и добавить новые,
+              остальные значения не трогать
+        batch_size: Размер пачки для bulk_create / bulk_update
+
+    Returns:
+        Словарь со статистикой: created, updated, deleted, written, elapsed, rows_per_second
+    """
+    return write_timestamps_many(attribute, {time_series.pk: values}, mode=mode, batch_size=batch_size)
+
+
+def write_timestamps_many(attribute: Attribute, values_by_series: Dict[int, pd.Series],
+                          mode: str = WRITE_MODE_REPLACE,
+                          batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    То же, что write_timestamps, но сразу для нескольких рядов: {time_series_id: значения}.
+    Удаление, поиск существующих точек и вставка выполняются общими запросами для всех рядов.
+    """
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Неизвестный режим записи: {mode}")
+
+    started = time.perf_counter()
+    numeric = attribute.is_numeric
+    points = {
+        series_id: [(date, value, number if numeric else None) for date, value, number in _iter_points(values)]
+        for series_id, values in values_by_series.items()
+    }
+    deleted = 0
+    to_create: List[Timestamp] = []
+    to_update: List[Timestamp] = []
+    written_by_series = {series_id: 0 for series_id in points}
+
+    with transaction.atomic():
+        existing = Timestamp.objects.filter(time_series_id__in=list(points), attribute=attribute)
+
+        if mode == WRITE_MODE_REPLACE:
+            deleted, _ = existing.delete()
+            new_points = points
+        else:
+            # Ключ (time_series, attribute, start_dt) не уникален в схеме,
+            # поэтому ON CONFLICT недоступен: сопоставляем существующие строки по start_dt
+            existing_by_key: Dict[Tuple[int, datetime], Timestamp] = {}
+            all_dates = {date for series_points in points.values() for date, _, _ in series_points}
+            if all_dates:
+                for timestamp in (existing.filter(start_dt__in=list(all_dates))
+                                  .only('timestamp_id', 'time_series_id', 'start_dt')):
+                    existing_by_key.setdefault((timestamp.time_series_id, timestamp.start_dt), timestamp)
+
+            new_points = {}
+            for series_id, series_points in points.items():
+                new_points[series_id] = []
+                for date, value, number in series_points:
+                    timestamp = existing_by_key.get((series_id, date))
+                    if timestamp is None:
+                        new_points[series_id].append((date, value, number))
+                    else:
+                        timestamp.value = value
+                        timestamp.value_num = number
+                        to_update.append(timestamp)
+                        written_by_series[series_id] += 1
+
+        for series_id, series_points in new_points.items():
+            to_create.extend(
+                Timestamp(
+                    time_series_id=series_id,
+                    attribute=attribute,
+                    value=value,
+                    value_num=number,
+                    start_dt=date,
+                    end_dt=None
+                )
+                for date, value, number in series_points
+            )
+            written_by_series[series_id] += len(series_points)
+
+        if to_update:
+            Timestamp.objects.bulk_update(to_update, ['value', 'value_num'], batch_size=batch_size)
+        if to_create:
+            Timestamp.objects.bulk_create(to_create, batch_size=batch_size)
+        # bulk_create, bulk_update и QuerySet.delete не отправляют сигналы
+        hierarchy_cache.invalidate_series(*points)
+        effective.refresh(points, attribute_ids=[attribute.pk])
+
+    elapsed = time.perf_counter() - started
+    written = len(to_create) + len(to_update)
+    rows_per_second = written / elapsed if elapsed > 0 else None
+
+    logging.info(
+        f"Записано {written} таймстемпов ({len(points)} рядов, атрибут {attribute.pk}, режим {mode}) "
+        f"за {elapsed:.3f} с"
+        + (f" ({rows_per_second:.0f} строк/с)" if rows_per_second else "")
+    )
+
+    return {
+        'mode': mode,
+        'created': len(to_create),
+        'updated': len(to_update),
+        'deleted': deleted,
+        'written': written,
+        'written_by_series': written_by_series,
+        'elapsed': round(elapsed, 4),
+        'rows_per_second': round(rows_per_second, 1) if rows_per_second else None,
+    }
@@ -0,0 +1,42 @@
+"""
+Версии данных в БД для ключей кэша и ETag.
+
+Кэш Django по умолчанию (LocMemCache) у каждого процесса свой: счётчик версии в нём
+не видят другие веб-процессы и воркер (manage.py run_worker). Поэтому версии хранятся
+в таблице cache_versions. Новые значения берутся из последовательности cache_versions_seq,
+а она не откатывается вместе с транзакцией: однажды выданная версия не повторится,
+и версию можно менять в той же транзакции, что и данные.
+
+Отсутствующий ключ имеет версию 0 (последовательность начинается с 1).
+"""
+from typing import Dict, Iterable
+
+from django.db import connection
+
+
+def get_versions(keys: Iterable[str]) -> Dict[str, int]:
+    """Текущие версии ключей одним запросом"""
+    keys = list(keys)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT key, version FROM ts_schema.cache_versions WHERE key = ANY(%s)", [keys])
+        versions = dict(cursor.fetchall())
+    return {key: versions.get(key, 0) for key in keys}
+
+
+def get_version(key: str) -> int:
+    return get_versions([key])[key]
+
+
+def bump(*keys: str) -> None:
+    """Выдаёт ключам новые версии (строки блокируются до конца транзакции)"""
+    if not keys:
+        return
+    with connection.cursor() as cursor:
+        # Ключи по порядку: параллельные транзакции блокируют строки в одном порядке, без взаимоблокировок
+        cursor.execute("""
+            INSERT INTO ts_schema.cache_versions (key, version)
+            SELECT key, nextval('ts_schema.cache_versions_seq')
+            FROM unnest(%s::text[]) AS key
+            ORDER BY key
+            ON CONFLICT (key) DO UPDATE SET version = EXCLUDED.version
+        """, [sorted(set(keys))])
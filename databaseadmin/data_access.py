@@ -0,0 +1,234 @@
+"""
+Чтение значений атрибутов временных рядов из timestamps одним SQL-запросом.
+Числа берутся из value_num (заполняется при записи для числовых атрибутов),
+текстовое value разбирается на стороне БД только там, где value_num пуст.
+Результат сразу собирается в массивы NumPy, без создания объектов Timestamp.
+"""
+import math
+import re
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection
+
+from . import effective
+
+# Безопасное приведение value к числу: пустые и нечисловые строки дают NULL, а не ошибку запроса.
+# Числа вне диапазона double precision ('1e999', '1e-400') тоже дают NULL: приведение выполняет
+# функция to_double_or_null (миграция 0013). Такое же выражение используется в
+# calculating_elasticity/db_interaction.py.
+NUMERIC_VALUE_SQL = r"""
+    CASE
+        WHEN btrim({column}) ~ '^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$'
+        THEN ts_schema.to_double_or_null(btrim({column}))
+    END
+"""
+
+
+NUMERIC_VALUE_RE = re.compile(r'^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$')
+
+
+def numeric_value_sql(column: str = 'value') -> str:
+    """SQL-выражение, приводящее текстовый столбец column к double precision или NULL"""
+    return NUMERIC_VALUE_SQL.format(column=column)
+
+
+def value_number_sql(alias: str = '') -> str:
+    """
+    Число из таймстемпа таблицы alias: value_num, а если он пуст (нечисловой атрибут,
+    пустое значение или строка, записанная в обход приложения) - разбор value
+    """
+    prefix = f"{alias}." if alias else ''
+    return f"COALESCE({prefix}value_num, {numeric_value_sql(prefix + 'value')})"
+
+
+def parse_numeric_value(value: Optional[str]) -> Optional[float]:
+    """То же приведение, что numeric_value_sql, в Python: число или None"""
+    if value is None:
+        return None
+    value = value.strip(' ')
+    match = NUMERIC_VALUE_RE.fullmatch(value)
+    if not match:
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        return None
+    if number == 0 and match.group(1).strip('.0'):
+        # Потеря значимости ('1e-400'): PostgreSQL отвергает такое значение, to_double_or_null даёт NULL
+        return None
+    return number
+
+
+class DailyFrame(NamedTuple):
+    """
+    Значения нескольких атрибутов одного ряда по дням.
+
+    dates: datetime64[D], дни, в которые заданы все атрибуты
+    values: массив (len(dates), число атрибутов), столбцы в порядке attribute_ids
+    invalid_count: число непустых значений, которые не удалось привести к числу
+    attribute_days: число дней с числовым значением для каждого атрибута (до выравнивания)
+    """
+    dates: np.ndarray
+    values: np.ndarray
+    invalid_count: int
+    attribute_days: np.ndarray
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.dates.astype('datetime64[ns]'))
+
+    def series(self, column: int) -> pd.Series:
+        return pd.Series(self.values[:, column], index=self.index)
+
+
+def series_store_enabled() -> bool:
+    return getattr(settings, 'SERIES_STORE_ENABLED', False)
+
+
+def _source_table(inherited: bool) -> Tuple[str, str]:
+    """
+    Таблица и столбец порядка добавления: собственные таймстемпы ряда или,
+    при inherited=True, материализованные значения с учётом предков (effective_timestamps).
+    """
+    if not inherited:
+        return 'ts_schema.timestamps', 'timestamp_id'
+    if not effective.is_enabled():
+        raise ValueError("Материализация таймстемпов иерархии отключена (EFFECTIVE_TIMESTAMPS_ENABLED)")
+    return 'ts_schema.effective_timestamps', 'source_timestamp_id'
+
+
+def fetch_daily_values(time_series_id: int, attribute_ids: Sequence[int], inherited: bool = False) -> DailyFrame:
+    """
+    Возвращает значения атрибутов ряда, развёрнутые по дням (дата start_dt в UTC),
+    только за дни, где непустые значения есть у всех атрибутов. Если за день
+    у атрибута несколько значений, берётся последнее по start_dt.
+    Пустые значения пропускаются, нечисловые учитываются в invalid_count.
+    При inherited=True недостающие точки берутся у предков (effective_timestamps).
+    Собственные значения ряда при SERIES_STORE_ENABLED читаются из снимка series_store.
+    """
+    if not inherited and series_store_enabled():
+        from .series_store import series_store
+        return series_store.daily_values(time_series_id, attribute_ids)
+
+    table, order_column = _source_table(inherited)
+    attribute_ids = list(attribute_ids)
+    pivot_columns = ',\n'.join(
+        f"max(num) FILTER (WHERE attribute_id = %s) AS value_{position}"
+        for position in range(len(attribute_ids))
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH points AS (
+                SELECT DISTINCT ON (attribute_id, day)
+                    attribute_id,
+                    (start_dt AT TIME ZONE 'UTC')::date AS day,
+                    {value_number_sql()} AS num
+                FROM {table}
+                WHERE time_series_id = %s
+                  AND attribute_id = ANY(%s)
+                  AND btrim(value) <> ''
+                ORDER BY attribute_id, day, start_dt DESC, {order_column} DESC
+            )
+            SELECT
+                day - DATE '1970-01-01' AS day_number,
+                count(*) AS present,
+                count(*) FILTER (WHERE num IS NULL) AS invalid,
+                {pivot_columns}
+            FROM points
+            GROUP BY day
+            ORDER BY day
+        """, [time_series_id, attribute_ids, *attribute_ids])
+        rows = cursor.fetchall()
+
+    return daily_frame(np.array(rows, dtype=float), len(attribute_ids))
+
+
+def daily_frame(table: np.ndarray, k: int) -> DailyFrame:
+    """
+    Собирает DailyFrame из таблицы по дням со столбцами: номер дня от 1970-01-01,
+    число атрибутов со значением за день, число нечисловых из них и k столбцов значений (NaN - нет числа)
+    """
+    if not len(table):
+        return DailyFrame(np.array([], dtype='datetime64[D]'), np.empty((0, k)), 0, np.zeros(k, dtype=int))
+
+    invalid_count = int(table[:, 2].sum())
+    numeric = ~np.isnan(table[:, 3:])
+    common = (table[:, 1] == k) & numeric.all(axis=1)
+    table = table[common]
+
+    return DailyFrame(
+        dates=table[:, 0].astype('int64').astype('datetime64[D]'),
+        values=table[:, 3:],
+        invalid_count=invalid_count,
+        attribute_days=numeric.sum(axis=0),
+    )
+
+
+def _datetime_index(epoch_us: np.ndarray) -> pd.DatetimeIndex:
+    """Микросекунды эпохи -> индекс дат в том же виде, в каком их возвращает ORM"""
+    index = pd.to_datetime(epoch_us, unit='us', utc=True)
+    if not settings.USE_TZ:
+        index = index.tz_convert(settings.TIME_ZONE).tz_localize(None)
+    return index
+
+
+def fetch_attribute_series(time_series_ids: Sequence[int], attribute_id: int,
+                           inherited: bool = False) -> Tuple[Dict[int, pd.Series], Dict[int, int]]:
+    """
+    Значения одного атрибута для нескольких рядов одним запросом, индекс - start_dt.
+    При inherited=True недостающие точки берутся у предков (effective_timestamps).
+
+    Returns:
+        Кортеж ({time_series_id: Series}, {time_series_id: число пустых или нечисловых значений}).
+        Ряды с такими значениями во втором словаре и в первый не попадают.
+        Если у ряда несколько значений с одним start_dt, берётся последнее добавленное.
+    """
+    if not inherited and series_store_enabled():
+        from .series_store import series_store
+        return series_store.attribute_series(time_series_ids, attribute_id)
+
+    table, order_column = _source_table(inherited)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT
+                time_series_id,
+                (extract(epoch FROM start_dt) * 1000000)::bigint AS start_us,
+                {value_number_sql()} AS num
+            FROM {table}
+            WHERE time_series_id = ANY(%s)
+              AND attribute_id = %s
+            ORDER BY time_series_id, start_dt, {order_column}
+        """, [list(time_series_ids), attribute_id])
+        rows = cursor.fetchall()
+
+    if not rows:
+        return {}, {}
+
+    table = np.array(rows, dtype=float)
+    # Микросекунды эпохи (~1.7e15) точно представимы в float64
+    return split_attribute_series(table[:, 0].astype('int64'), table[:, 1].astype('int64'), table[:, 2])
+
+
+def split_attribute_series(series_ids: np.ndarray, start_us: np.ndarray,
+                           values: np.ndarray) -> Tuple[Dict[int, pd.Series], Dict[int, int]]:
+    """
+    Результат fetch_attribute_series из массивов строк, упорядоченных по ряду,
+    start_dt и порядку добавления; values - NaN для пустых и нечисловых значений
+    """
+    boundaries = np.flatnonzero(np.diff(series_ids)) + 1
+    series: Dict[int, pd.Series] = {}
+    invalid: Dict[int, int] = {}
+    for positions in np.split(np.arange(len(series_ids)), boundaries):
+        series_id = int(series_ids[positions[0]])
+        chunk = values[positions]
+        bad = int(np.isnan(chunk).sum())
+        if bad:
+            invalid[series_id] = bad
+            continue
+        values_series = pd.Series(chunk, index=_datetime_index(start_us[positions]))
+        # Для повторяющихся start_dt остаётся последнее значение
+        series[series_id] = values_series[~values_series.index.duplicated(keep='last')]
+    return series, invalid
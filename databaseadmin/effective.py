@@ -0,0 +1,89 @@
+"""
+Материализация таймстемпов иерархии (EffectiveTimestamp, таблица effective_timestamps).
+
+Для каждого ряда хранится результат get_hierarchy_data: по каждой точке
+(attribute, start_dt, end_dt) значение ближайшего ряда среди самого ряда и его предков.
+Обучение, прогнозы и страница иерархии читают ряд из неё обычным индексным запросом.
+
+Таблица ведётся, только если EFFECTIVE_TIMESTAMPS_ENABLED = True. Изменение таймстемпов
+ряда пересчитывает затронутые точки во всём его поддереве в той же транзакции
+(сигналы и явные вызовы в местах массовой записи, как для hierarchy_cache).
+После включения настройки или изменений в обход приложения таблицу нужно
+перестроить: manage.py rebuild_effective_timestamps.
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+
+RESOLVE_SQL = """
+    INSERT INTO ts_schema.effective_timestamps
+        (time_series_id, attribute_id, value, value_num, start_dt, end_dt,
+         source_timestamp_id, source_time_series_id, depth)
+    SELECT DISTINCT ON (c.descendant_id, t.attribute_id, t.start_dt, t.end_dt)
+        c.descendant_id,
+        t.attribute_id,
+        t.value,
+        t.value_num,
+        t.start_dt,
+        t.end_dt,
+        t.timestamp_id,
+        t.time_series_id,
+        c.depth + 1
+    FROM ts_schema.time_series_closure c
+    INNER JOIN ts_schema.timestamps t ON t.time_series_id = c.ancestor_id
+    WHERE {where}
+    ORDER BY c.descendant_id, t.attribute_id, t.start_dt, t.end_dt, c.depth ASC, t.timestamp_id DESC
+"""
+
+SUBTREE_SQL = "SELECT descendant_id FROM ts_schema.time_series_closure WHERE ancestor_id = ANY(%s)"
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'EFFECTIVE_TIMESTAMPS_ENABLED', False)
+
+
+def refresh(series_ids: Iterable[int], attribute_ids: Optional[Sequence[int]] = None,
+            points: Optional[Sequence[Tuple[int, datetime]]] = None) -> int:
+    """
+    Пересчитывает материализованные значения рядов series_ids и всех их потомков.
+
+    Args:
+        attribute_ids: Пересчитать только эти атрибуты
+        points: Пересчитать только точки (attribute_id, start_dt) - для единичных изменений
+
+    Returns:
+        Число записанных строк (0, если материализация отключена)
+    """
+    series_ids = list(set(series_ids))
+    if not is_enabled() or not series_ids:
+        return 0
+
+    delete_where = f"time_series_id IN ({SUBTREE_SQL})"
+    resolve_where = f"c.descendant_id IN ({SUBTREE_SQL})"
+    params: List = [series_ids]
+    if attribute_ids is not None:
+        delete_where += " AND attribute_id = ANY(%s)"
+        resolve_where += " AND t.attribute_id = ANY(%s)"
+        params.append(list(attribute_ids))
+    if points is not None:
+        point_list = "SELECT * FROM unnest(%s::integer[], %s::timestamptz[])"
+        delete_where += f" AND (attribute_id, start_dt) IN ({point_list})"
+        resolve_where += f" AND (t.attribute_id, t.start_dt) IN ({point_list})"
+        params.extend([[attribute_id for attribute_id, _ in points], [start_dt for _, start_dt in points]])
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM ts_schema.effective_timestamps WHERE {delete_where}", params)
+            cursor.execute(RESOLVE_SQL.format(where=resolve_where), params)
+            return cursor.rowcount
+
+
+def rebuild() -> int:
+    """Полностью перестраивает таблицу. Возвращает число строк"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM ts_schema.effective_timestamps")
+            cursor.execute(RESOLVE_SQL.format(where="TRUE"))
+            return cursor.rowcount
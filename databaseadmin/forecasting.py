@@ -1,35 +1,257 @@
 import pandas as pd
 import numpy as np
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 from statsmodels.tsa.statespace.sarimax import SARIMAXResultsWrapper
-from typing import List, Optional, Tuple, Dict, Any
-from django.db import transaction
+from typing import List, Optional, Tuple, Dict, Any, Callable, Sequence
+
+
+def build_lag_diff_matrix(values: np.ndarray, max_lags: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Строит матрицу разностей x[t] - x[t - lag] для lag = 1..max_lags одной операцией
+    над скользящим окном (без вставки столбцов по одному).
+
+    Returns:
+        Кортеж (матрица размера (n - max_lags, max_lags), маска строк без пропусков).
+        Строка i матрицы соответствует моменту t = i + max_lags.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) <= max_lags:
+        return np.empty((0, max_lags)), np.zeros(0, dtype=bool)
+
+    windows = sliding_window_view(values, max_lags + 1)
+    # windows[:, -1] - x[t], windows[:, max_lags - lag] - x[t - lag]
+    matrix = windows[:, -1:] - windows[:, -2::-1]
+    valid = ~np.isnan(matrix).any(axis=1)
+    return matrix, valid
+
+
+def make_lag_diff_features(ts_price: pd.Series, max_lags: int) -> pd.DataFrame:
+    """
+    Признаки lag_diff_1..lag_diff_{max_lags} = price - price.shift(lag) без строк с пропусками.
+    """
+    matrix, valid = build_lag_diff_matrix(ts_price.to_numpy(), max_lags)
+    index = ts_price.index[max_lags:] if len(matrix) else ts_price.index[:0]
+    if not valid.all():
+        matrix = matrix[valid]
+        index = index[valid]
+    return pd.DataFrame(matrix, index=index,
+                        columns=[f'lag_diff_{lag}' for lag in range(1, max_lags + 1)])
+
+
+class LagFeatureCache:
+    """
+    LRU-кэш лаговых признаков, ключ - хэш значений и индекса ряда цены и max_lags.
+    Общий для всех прогнозировщиков процесса: повторные fit/predict и прогнозы
+    дочерних рядов по одному и тому же ряду не пересчитывают признаки.
+    Возвращаемые DataFrame общие для всех вызовов и не должны изменяться.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[Tuple[str, int], pd.DataFrame]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(ts_price: pd.Series, max_lags: int) -> Tuple[str, int]:
+        hashed = pd.util.hash_pandas_object(ts_price, index=True).to_numpy()
+        return hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest(), max_lags
+
+    def get(self, ts_price: pd.Series, max_lags: int) -> pd.DataFrame:
+        key = self._key(ts_price, max_lags)
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key]
+            self.misses += 1
+
+        exog = make_lag_diff_features(ts_price, max_lags)
+
+        with self._lock:
+            self._data[key] = exog
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return exog
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+lag_feature_cache = LagFeatureCache()
+
+
+def correlation_scores(exog: pd.DataFrame, y: pd.Series) -> pd.Series:
+    """
+    |corr(x, y)| Пирсона для всех столбцов exog одним матричным произведением.
+    """
+    X = exog.to_numpy(dtype=float)
+    v = y.to_numpy(dtype=float)
+    observed = ~np.isnan(v)
+    X, v = X[observed], v[observed]
+
+    Xc = X - X.mean(axis=0)
+    vc = v - v.mean()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = (Xc.T @ vc) / (np.sqrt((Xc ** 2).sum(axis=0)) * np.sqrt((vc ** 2).sum()))
+    return pd.Series(np.abs(corr), index=exog.columns)
+
+
+def mutual_info_scores(exog: pd.DataFrame, y: pd.Series) -> pd.Series:
+    """
+    Взаимная информация признаков с целевым рядом (требуется scikit-learn).
+    """
+    try:
+        from sklearn.feature_selection import mutual_info_regression
+    except ImportError:
+        raise ImportError("Для отбора признаков по взаимной информации установите scikit-learn")
+
+    observed = y.notna().to_numpy()
+    scores = mutual_info_regression(exog.to_numpy(dtype=float)[observed],
+                                    y.to_numpy(dtype=float)[observed],
+                                    random_state=0)
+    return pd.Series(scores, index=exog.columns)
+
+
+def partial_correlation_scores(exog: pd.DataFrame, y: pd.Series) -> pd.Series:
+    """
+    Частная корреляция y с каждым лагом при исключении влияния меньших лагов -
+    аналог PACF для лагов признака. Считается по одному QR-разложению [X, y]:
+    для k-го столбца |R[k, y]| / ||R[k:, y]||.
+    """
+    observed = y.notna().to_numpy()
+    X = exog.to_numpy(dtype=float)[observed]
+    v = y.to_numpy(dtype=float)[observed]
+
+    data = np.column_stack([X - X.mean(axis=0), v - v.mean()])
+    r = np.linalg.qr(data, mode='r')
+    r_y = r[:-1, -1]
+    residual_norms = np.sqrt(np.cumsum((r[:, -1] ** 2)[::-1])[::-1])[:-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.abs(r_y) / residual_norms
+    return pd.Series(scores, index=exog.columns)
+
+
+FEATURE_SELECTORS: Dict[str, Callable[[pd.DataFrame, pd.Series], pd.Series]] = {
+    'corr': correlation_scores,
+    'mutual_info': mutual_info_scores,
+    'pacf': partial_correlation_scores,
+}
+
+
+def resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    """
+    Переводит n_jobs в количество процессов по соглашению joblib/sklearn:
+    None и 0 - последовательное выполнение, -1 - все ядра, -2 - все кроме одного.
+    """
+    if not n_jobs:
+        return 1
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+def run_in_pool(func: Callable, tasks: Sequence[tuple], n_jobs: Optional[int] = 1,
+                initializer: Optional[Callable] = None, initargs: tuple = ()) -> List[Any]:
+    """
+    Выполняет func(*task) для каждой задачи и возвращает результаты в порядке задач.
+    При n_jobs == 1 или если пул процессов недоступен, задачи выполняются последовательно.
+    initializer(*initargs) вызывается один раз в каждом процессе пула (или в текущем процессе),
+    чтобы не передавать общие тяжёлые объекты с каждой задачей.
+    """
+    def run_serial() -> List[Any]:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(*task) for task in tasks]
+
+    workers = min(resolve_n_jobs(n_jobs), len(tasks))
+    if workers <= 1:
+        return run_serial()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+            futures = [executor.submit(func, *task) for task in tasks]
+            return [future.result() for future in futures]
+    except Exception as e:
+        logging.warning(f"Пул процессов недоступен ({e}), выполняем последовательно")
+        return run_serial()
+
+
+def _fit_candidate(y_train: pd.Series, ex_train: pd.DataFrame,
+                   y_val: pd.Series, ex_val: pd.DataFrame,
+                   order: Tuple[int, int, int], seasonal: Tuple[int, int, int, int]) -> Dict[str, Any]:
+    """
+    Обучает SARIMAX для одной комбинации порядков и считает MAPE на валидации.
+    Функция на уровне модуля, чтобы её можно было передать в пул процессов.
+    """
+    started = time.perf_counter()
+    result: Dict[str, Any] = {
+        'order': order,
+        'seasonal_order': seasonal,
+        'model': None,
+        'mape': np.inf,
+        'fit_time': 0.0,
+        'error': None,
+    }
+    try:
+        model = SARIMAX(y_train, order=order,
+                        seasonal_order=seasonal,
+                        exog=ex_train)
+        model_fit = model.fit(disp=False)  # type: ignore
+        pred = model_fit.get_forecast(steps=len(y_val),  # type: ignore
+                                      exog=ex_val).predicted_mean
+        result['mape'] = np.mean(np.abs((y_val - pred) / y_val)) * 100
+        result['model'] = model_fit
+    except Exception as e:
+        result['error'] = str(e)
+    result['fit_time'] = time.perf_counter() - started
+    return result
+
 
 class SARIMAXAutoForecaster:
     def __init__(self, arima_orders=[(1,1,1)], seasonal_orders=[(1,1,1,7)],
-                 max_lags=30, top_k_features=10, train_ratio=0.8):
+                 max_lags=30, top_k_features=10, train_ratio=0.8, n_jobs=1,
+                 feature_selector='corr'):
         self.arima_orders = arima_orders
         self.seasonal_orders = seasonal_orders
         self.max_lags = max_lags
         self.top_k = top_k_features
         self.train_ratio = train_ratio
+        self.n_jobs = n_jobs
+        if feature_selector not in FEATURE_SELECTORS:
+            raise ValueError(f"Неизвестный способ отбора признаков: {feature_selector}")
+        self.feature_selector = feature_selector
 
         self.best_model_: Optional[SARIMAXResultsWrapper] = None
         self.best_order_ = None
         self.best_seasonal_order_ = None
         self.best_features_: Optional[List[str]] = None
+        self.selected_features_: Optional[List[str]] = None
         self.best_mape_ = np.inf
+        self.cv_results_: List[Dict[str, Any]] = []
+        self.search_time_: Optional[float] = None
+        self.refit_time_: Optional[float] = None
 
     def _make_exogs(self, ts_price: pd.Series) -> pd.DataFrame:
-        exog = pd.DataFrame(index=ts_price.index)
-        for lag in range(1, self.max_lags + 1):
-            exog[f'lag_diff_{lag}'] = ts_price - ts_price.shift(lag)
-        return exog.dropna()
+        return lag_feature_cache.get(ts_price, self.max_lags)
 
     def _select_features(self, ts_traffic: pd.Series, exog: pd.DataFrame) -> List[str]:
         y = ts_traffic.loc[exog.index]
-        corrs = exog.apply(lambda col: abs(col.corr(y)))
-        return corrs.sort_values(ascending=False).index[:self.top_k].tolist()  # type: ignore
+        scores = FEATURE_SELECTORS[getattr(self, 'feature_selector', 'corr')](exog, y)
+        return scores.sort_values(ascending=False).index[:self.top_k].tolist()  # type: ignore
 
     def _split(self, ts: pd.Series, exog: pd.DataFrame) -> Tuple[pd.Series, pd.DataFrame, pd.Series, pd.DataFrame]:
         n = len(ts)
@@ -38,39 +260,95 @@ class SARIMAXAutoForecaster:
                 ts.iloc[train_n:], exog.iloc[train_n:])
 
     def fit(self, ts_traffic: pd.Series, ts_price: pd.Series) -> 'SARIMAXAutoForecaster':
+        started = time.perf_counter()
         full_exog = self._make_exogs(ts_price)
         full_traffic = ts_traffic.loc[full_exog.index]
         y_train, ex_train, y_val, ex_val = self._split(full_traffic, full_exog)
 
-        for order in self.arima_orders:
-            for seasonal in self.seasonal_orders:
-                selected = self._select_features(y_train, ex_train)
-                exog_train_sel = ex_train[selected]
-                exog_val_sel   = ex_val[selected]
-                try:
-                    model = SARIMAX(y_train, order=order,
-                                    seasonal_order=seasonal,
-                                    exog=exog_train_sel)
-                    model_fit = model.fit(disp=False)  # type: ignore
-                except Exception:
-                    continue
-
-                try:
-                    pred = model_fit.get_forecast(steps=len(y_val),  # type: ignore
-                                         exog=exog_val_sel).predicted_mean
-                    mape = np.mean(np.abs((y_val - pred) / y_val)) * 100
-                except Exception:
-                    continue
-
-                if mape < self.best_mape_:
-                    self.best_mape_ = mape
-                    self.best_model_ = model_fit  # type: ignore
-                    self.best_order_ = order
-                    self.best_seasonal_order_ = seasonal
-                    self.best_features_ = selected
+        # Отбор признаков не зависит от порядков модели, поэтому выполняется один раз
+        self.selected_features_ = self._select_features(y_train, ex_train)
+        exog_train_sel = ex_train[self.selected_features_]
+        exog_val_sel = ex_val[self.selected_features_]
 
+        tasks = [
+            (y_train, exog_train_sel, y_val, exog_val_sel, order, seasonal)
+            for order in self.arima_orders
+            for seasonal in self.seasonal_orders
+        ]
+
+        # Результаты возвращаются в порядке перебора, поэтому при равных MAPE
+        # побеждает та же комбинация, что и при последовательном обучении
+        results = run_in_pool(_fit_candidate, tasks, getattr(self, 'n_jobs', 1))
+
+        self.cv_results_ = []
+        for result in results:
+            model_fit = result.pop('model')
+            self.cv_results_.append(result)
+            if model_fit is None:
+                continue
+
+            if result['mape'] < self.best_mape_:
+                self.best_mape_ = result['mape']
+                self.best_model_ = model_fit  # type: ignore
+                self.best_order_ = result['order']
+                self.best_seasonal_order_ = result['seasonal_order']
+                self.best_features_ = list(self.selected_features_)
+
+        self.search_time_ = time.perf_counter() - started
         return self
 
+    def refit(self, ts_traffic: pd.Series, ts_price: pd.Series,
+              warm_start: bool = True) -> 'SARIMAXAutoForecaster':
+        """
+        Обучает одну модель на новых данных с уже подобранными порядками и признаками,
+        без повторного перебора. Возвращает новый прогнозировщик, исходный не меняется.
+
+        Args:
+            ts_traffic: Целевой ряд (все данные)
+            ts_price: Ряд признака (все данные)
+            warm_start: Начинать оптимизацию с параметров best_model_
+        """
+        if self.best_order_ is None or self.best_seasonal_order_ is None or self.best_features_ is None:
+            raise ValueError("Сначала вызовите fit().")
+
+        started = time.perf_counter()
+        exog = self._make_exogs(ts_price)[self.best_features_]
+        traffic = ts_traffic.loc[exog.index]
+
+        model = SARIMAX(traffic, order=self.best_order_,
+                        seasonal_order=self.best_seasonal_order_,
+                        exog=exog)
+        start_params = None
+        if warm_start and self.best_model_ is not None:
+            start_params = np.asarray(self.best_model_.params)  # type: ignore
+
+        try:
+            model_fit = model.fit(start_params=start_params, disp=False)  # type: ignore
+        except Exception:
+            if start_params is None:
+                raise
+            model_fit = model.fit(disp=False)  # type: ignore
+
+        refitted = SARIMAXAutoForecaster(
+            arima_orders=[self.best_order_],
+            seasonal_orders=[self.best_seasonal_order_],
+            max_lags=self.max_lags,
+            top_k_features=self.top_k,
+            train_ratio=self.train_ratio,
+            n_jobs=getattr(self, 'n_jobs', 1),
+            feature_selector=getattr(self, 'feature_selector', 'corr')
+        )
+        refitted.best_model_ = model_fit  # type: ignore
+        refitted.best_order_ = self.best_order_
+        refitted.best_seasonal_order_ = self.best_seasonal_order_
+        refitted.best_features_ = list(self.best_features_)
+        refitted.selected_features_ = list(self.best_features_)
+        refitted.best_mape_ = self.best_mape_
+        refitted.cv_results_ = list(getattr(self, 'cv_results_', []))
+        refitted.search_time_ = getattr(self, 'search_time_', None)
+        refitted.refit_time_ = time.perf_counter() - started
+        return refitted
+
     def predict(self, ts_price_full: pd.Series) -> pd.Series:
         if self.best_model_ is None or self.best_features_ is None:
             raise ValueError("Сначала вызовите fit().")
@@ -90,13 +368,77 @@ class SARIMAXAutoForecaster:
     def get_mape(self, actual: pd.Series, predicted: pd.Series) -> float:
         return float(np.mean(np.abs((actual - predicted) / actual)) * 100)
 
+    def get_cv_results(self) -> List[Dict[str, Any]]:
+        """Результаты перебора параметров в JSON-совместимом виде (порядки, MAPE, время обучения)"""
+        return [
+            {
+                'order': str(result['order']),
+                'seasonal_order': str(result['seasonal_order']),
+                'mape': round(float(result['mape']), 2) if np.isfinite(result['mape']) else None,
+                'fit_time': round(result['fit_time'], 3),
+                'error': result['error'],
+            }
+            for result in getattr(self, 'cv_results_', [])
+        ]
+
     def summary(self) -> str:
         return (f"Best SARIMAX order: {self.best_order_}, "
                 f"seasonal: {self.best_seasonal_order_}\n"
                 f"Selected features (lags): {self.best_features_}\n"
                 f"MAPE on validation: {self.best_mape_:.2f}%")
 
-def make_forecast_for_child_series(parent_model_id: int, child_series_id: int, forecast_periods: int = 30) -> Dict[str, Any]:
+def predict_child_series(model_object: SARIMAXAutoForecaster, parent_features: pd.Series,
+                         child_features: pd.Series, forecast_periods: int) -> pd.Series:
+    """
+    Прогноз целевого атрибута дочернего ряда по признакам родительского и дочернего рядов,
+    выровненный по датам дочернего ряда и ограниченный forecast_periods точками.
+    """
+    # Модель обучается на датах без часового пояса, а даты из БД при USE_TZ приходят с ним
+    tz = child_features.index.tz
+    if tz is not None:
+        child_features = child_features.tz_convert(None)
+    if parent_features.index.tz is not None:
+        parent_features = parent_features.tz_convert(None)
+
+    combined_features_series = pd.concat([parent_features, child_features]).sort_index()
+    forecast_series = model_object.predict(combined_features_series)
+    forecast_dates = child_features.index
+    
+    if len(forecast_series) < len(forecast_dates):
+        aligned_forecast = pd.Series(index=forecast_dates, dtype=float)
+        
+        common_dates = forecast_series.index.intersection(forecast_dates.tolist())
+        aligned_forecast.loc[common_dates] = forecast_series.loc[common_dates]
+        
+        last_value = forecast_series.iloc[-1] if len(forecast_series) > 0 else 0.0
+        missing_dates = forecast_dates.difference(common_dates)
+        aligned_forecast.loc[missing_dates] = last_value
+        
+        aligned_forecast = aligned_forecast.fillna(last_value)
+        
+        forecast_to_use = aligned_forecast
+    else:
+        forecast_to_use = forecast_series.loc[forecast_dates.intersection(forecast_series.index.tolist())]
+        
+        if len(forecast_to_use) < len(forecast_dates):
+            missing_dates = forecast_dates.difference(forecast_to_use.index)
+            last_value = forecast_series.iloc[-1] if len(forecast_series) > 0 else 0.0
+            for date in missing_dates:
+                forecast_to_use[date] = last_value
+            
+            forecast_to_use = forecast_to_use.sort_index()
+    
+    if len(forecast_to_use) > forecast_periods:
+        forecast_to_use = forecast_to_use.iloc[:forecast_periods]
+    
+    if tz is not None:
+        forecast_to_use = forecast_to_use.tz_localize('UTC').tz_convert(tz)
+    
+    return forecast_to_use
+
+
+def make_forecast_for_child_series(parent_model_id: int, child_series_id: int, forecast_periods: int = 30,
+                                   write_mode: str = 'replace') -> Dict[str, Any]:
     """
     Выполняет прогнозирование для дочернего временного ряда на основе обученной модели родительского ряда
     и сохраняет результаты прогноза в виде таймстемпов.
@@ -105,11 +447,14 @@ def make_forecast_for_child_series(parent_model_id: int, child_series_id: int, f
         parent_model_id: ID модели прогнозирования родительского ряда
         child_series_id: ID дочернего временного ряда
         forecast_periods: Количество периодов для прогноза (используется только если нужно ограничить количество прогнозов)
+        write_mode: replace - заменить все значения целевого атрибута, upsert - обновить/добавить по start_dt
         
     Returns:
         Словарь с результатами прогнозирования
     """
-    from databaseadmin.models import ForecastingModel, TimeSeries, Timestamp
+    from databaseadmin.models import ForecastingModel, TimeSeries
+    from databaseadmin.bulk import write_timestamps
+    from databaseadmin.data_access import fetch_attribute_series
     
     try:
         forecasting_model = ForecastingModel.objects.get(model_id=parent_model_id)
@@ -125,35 +470,25 @@ def make_forecast_for_child_series(parent_model_id: int, child_series_id: int, f
         feature_attribute = forecasting_model.feature_attribute
         target_attribute = forecasting_model.target_attribute
         
-        parent_feature_timestamps = Timestamp.objects.filter(
-            time_series=parent_series,
-            attribute=feature_attribute
-        ).order_by('start_dt')
-        
-        child_feature_timestamps = Timestamp.objects.filter(
-            time_series=child_series,
-            attribute=feature_attribute
-        ).order_by('start_dt')
+        features, invalid = fetch_attribute_series(
+            [parent_series.time_series_id, child_series.time_series_id],
+            feature_attribute.attribute_id
+        )
         
-        if not parent_feature_timestamps.exists() or not child_feature_timestamps.exists():
+        if invalid:
             return {
                 'success': False,
-                'error': 'Недостаточно данных для прогнозирования'
+                'error': f'Ошибка при преобразовании данных: нечисловых значений - {sum(invalid.values())}'
             }
         
-        parent_features = {
-            timestamp.start_dt: float(timestamp.value) 
-            for timestamp in parent_feature_timestamps
-        }
-        parent_features_series = pd.Series(parent_features)
-        parent_features_series.index = pd.DatetimeIndex(parent_features_series.index)
+        parent_features_series = features.get(parent_series.time_series_id)
+        child_features_series = features.get(child_series.time_series_id)
         
-        child_features = {
-            timestamp.start_dt: float(timestamp.value) 
-            for timestamp in child_feature_timestamps
-        }
-        child_features_series = pd.Series(child_features)
-        child_features_series.index = pd.DatetimeIndex(child_features_series.index)
+        if parent_features_series is None or child_features_series is None:
+            return {
+                'success': False,
+                'error': 'Недостаточно данных для прогнозирования'
+            }
         
         model_object = forecasting_model.load_model_object()
         if not model_object:
@@ -164,63 +499,30 @@ def make_forecast_for_child_series(parent_model_id: int, child_series_id: int, f
             
         if isinstance(model_object, SARIMAXAutoForecaster):
             try:
-                combined_features_series = pd.concat([parent_features_series, child_features_series]).sort_index()
-                forecast_series = model_object.predict(combined_features_series)
-                forecast_dates = child_features_series.index
-                
-                if len(forecast_series) < len(forecast_dates):
-                    aligned_forecast = pd.Series(index=forecast_dates, dtype=float)
-                    
-                    common_dates = forecast_series.index.intersection(forecast_dates.tolist())
-                    aligned_forecast.loc[common_dates] = forecast_series.loc[common_dates]
-                    
-                    last_value = forecast_series.iloc[-1] if len(forecast_series) > 0 else 0.0
-                    missing_dates = forecast_dates.difference(common_dates)
-                    aligned_forecast.loc[missing_dates] = last_value
-                    
-                    aligned_forecast = aligned_forecast.fillna(last_value)
-                    
-                    forecast_to_use = aligned_forecast
-                else:
-                    forecast_to_use = forecast_series.loc[forecast_dates.intersection(forecast_series.index.tolist())]
-                    
-                    if len(forecast_to_use) < len(forecast_dates):
-                        missing_dates = forecast_dates.difference(forecast_to_use.index)
-                        last_value = forecast_series.iloc[-1] if len(forecast_series) > 0 else 0.0
-                        for date in missing_dates:
-                            forecast_to_use[date] = last_value
-                        
-                        forecast_to_use = forecast_to_use.sort_index()
+                forecast_to_use = predict_child_series(
+                    model_object,
+                    parent_features_series,
+                    child_features_series,
+                    forecast_periods
+                )
                 
-                if len(forecast_to_use) > forecast_periods:
-                    forecast_to_use = forecast_to_use.iloc[:forecast_periods]
-                
-                with transaction.atomic():
-                    existing_forecasts = Timestamp.objects.filter(
-                        time_series=child_series,
-                        attribute=target_attribute
-                    )
-                    existing_count = existing_forecasts.count()
-                    existing_forecasts.delete()
-                    
-                    saved_timestamps = []
-                    
-                    for date, value in forecast_to_use.items():
-                        new_timestamp = Timestamp.objects.create(
-                            time_series=child_series,
-                            attribute=target_attribute,
-                            value=str(float(value)),
-                            start_dt=date,
-                            end_dt=None
-                        )
-                        saved_timestamps.append(new_timestamp)
+                write_stats = write_timestamps(
+                    child_series,
+                    target_attribute,
+                    forecast_to_use,
+                    mode=write_mode
+                )
                 
                 return {
                     'success': True,
-                    'message': f'Прогноз успешно сохранен. Создано {len(saved_timestamps)} таймстемпов.',
-                    'forecast_count': len(saved_timestamps),
+                    'message': f'Прогноз успешно сохранен. Записано {write_stats["written"]} таймстемпов.',
+                    'forecast_count': write_stats['written'],
                     'child_features_count': len(child_features_series),
-                    'existing_deleted': existing_count,
+                    'existing_deleted': write_stats['deleted'],
+                    'created_count': write_stats['created'],
+                    'updated_count': write_stats['updated'],
+                    'write_mode': write_mode,
+                    'rows_per_second': write_stats['rows_per_second'],
                     'time_series_id': child_series_id,
                     'time_series_name': child_series.name
                 }
@@ -251,3 +553,171 @@ def make_forecast_for_child_series(parent_model_id: int, child_series_id: int, f
             'success': False,
             'error': f'Произошла ошибка: {str(e)}'
         }
+
+
+# Общие для всех задач пакетного прогноза объекты, задаются initializer'ом пула
+_batch_model: Optional[SARIMAXAutoForecaster] = None
+_batch_parent_features: Optional[pd.Series] = None
+
+
+def _init_batch_forecast(model_object: SARIMAXAutoForecaster, parent_features: pd.Series) -> None:
+    global _batch_model, _batch_parent_features
+    _batch_model = model_object
+    _batch_parent_features = parent_features
+
+
+def _forecast_child_task(series_id: int, child_features: pd.Series) -> Tuple[int, Optional[pd.Series], Optional[str]]:
+    try:
+        forecast = predict_child_series(_batch_model, _batch_parent_features, child_features, len(child_features))  # type: ignore
+        return series_id, forecast, None
+    except Exception as e:
+        return series_id, None, f'Ошибка при прогнозировании: {str(e)}'
+
+
+def make_forecasts_for_children(parent_model_id: int, include_descendants: bool = False,
+                                write_mode: str = 'replace', n_jobs: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Прогнозирует все дочерние ряды (или всё поддерево) ряда модели за один вызов:
+    модель и признаки родительского ряда загружаются один раз, признаки всех дочерних
+    рядов - одним запросом, прогнозы считаются в пуле процессов и записываются пачкой.
+
+    Args:
+        parent_model_id: ID модели прогнозирования родительского ряда
+        include_descendants: Прогнозировать всех потомков, а не только непосредственных детей
+        write_mode: replace или upsert (см. databaseadmin.bulk)
+        n_jobs: Число процессов (по умолчанию settings.FORECASTING_N_JOBS)
+
+    Returns:
+        Словарь с результатами прогнозирования по каждому ряду
+    """
+    from django.conf import settings
+    from databaseadmin.models import ForecastingModel, TimeSeries
+    from databaseadmin.bulk import write_timestamps_many
+    from databaseadmin.data_access import fetch_attribute_series
+
+    started = time.perf_counter()
+
+    try:
+        forecasting_model = ForecastingModel.objects.select_related(
+            'time_series', 'feature_attribute', 'target_attribute'
+        ).get(model_id=parent_model_id)
+    except ForecastingModel.DoesNotExist:
+        return {
+            'success': False,
+            'error': 'Модель прогнозирования не найдена'
+        }
+
+    parent_series = forecasting_model.time_series
+    feature_attribute = forecasting_model.feature_attribute
+    target_attribute = forecasting_model.target_attribute
+
+    if include_descendants:
+        series_ids = parent_series.get_descendant_ids()
+    else:
+        series_ids = list(TimeSeries.objects.filter(
+            parent_time_series=parent_series
+        ).order_by('time_series_id').values_list('time_series_id', flat=True))
+
+    if not series_ids:
+        return {
+            'success': False,
+            'error': 'У ряда модели нет дочерних рядов'
+        }
+
+    parent_id = parent_series.time_series_id
+    features, invalid = fetch_attribute_series([parent_id, *series_ids], feature_attribute.attribute_id)
+
+    if parent_id in invalid:
+        return {
+            'success': False,
+            'error': f'Ошибка при преобразовании данных: нечисловых значений - {invalid[parent_id]}'
+        }
+    parent_features_series = features.pop(parent_id, None)
+    if parent_features_series is None:
+        return {
+            'success': False,
+            'error': 'Недостаточно данных для прогнозирования'
+        }
+
+    child_features = features
+    errors: Dict[int, str] = {
+        series_id: f'Ошибка при преобразовании данных: нечисловых значений - {count}'
+        for series_id, count in invalid.items()
+    }
+
+    model_object = forecasting_model.load_model_object()
+    if not model_object:
+        return {
+            'success': False,
+            'error': 'Не удалось загрузить объект модели'
+        }
+    if not isinstance(model_object, SARIMAXAutoForecaster):
+        return {
+            'success': False,
+            'error': 'Неподдерживаемый тип модели прогнозирования'
+        }
+    load_time = time.perf_counter() - started
+
+    for series_id in series_ids:
+        if series_id not in child_features:
+            errors.setdefault(series_id, 'Недостаточно данных для прогнозирования')
+    tasks = [(series_id, child_features[series_id]) for series_id in series_ids if series_id in child_features]
+
+    predict_started = time.perf_counter()
+    forecasts: Dict[int, pd.Series] = {}
+    for series_id, forecast, error in run_in_pool(
+            _forecast_child_task, tasks,
+            n_jobs if n_jobs is not None else settings.FORECASTING_N_JOBS,
+            initializer=_init_batch_forecast,
+            initargs=(model_object, parent_features_series)):
+        if error is None:
+            forecasts[series_id] = forecast  # type: ignore
+        else:
+            errors[series_id] = error
+    predict_time = time.perf_counter() - predict_started
+
+    try:
+        write_stats = write_timestamps_many(target_attribute, forecasts, mode=write_mode)
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'Ошибка при сохранении прогнозов: {str(e)}'
+        }
+
+    names = dict(TimeSeries.objects.filter(time_series_id__in=series_ids).values_list('time_series_id', 'name'))
+    results = []
+    for series_id in series_ids:
+        item: Dict[str, Any] = {
+            'time_series_id': series_id,
+            'time_series_name': names.get(series_id),
+            'success': series_id in forecasts,
+        }
+        if series_id in forecasts:
+            item['forecast_count'] = write_stats['written_by_series'][series_id]
+            item['child_features_count'] = len(child_features[series_id])
+        else:
+            item['error'] = errors[series_id]
+        results.append(item)
+
+    return {
+        'success': True,
+        'message': f'Прогноз выполнен для {len(forecasts)} из {len(series_ids)} рядов. '
+                   f'Записано {write_stats["written"]} таймстемпов.',
+        'model_id': parent_model_id,
+        'series_count': len(series_ids),
+        'forecasted_count': len(forecasts),
+        'failed_count': len(series_ids) - len(forecasts),
+        'write_mode': write_mode,
+        'forecast_count': write_stats['written'],
+        'existing_deleted': write_stats['deleted'],
+        'created_count': write_stats['created'],
+        'updated_count': write_stats['updated'],
+        'rows_per_second': write_stats['rows_per_second'],
+        'timings': {
+            'load': round(load_time, 3),
+            'predict': round(predict_time, 3),
+            'write': write_stats['elapsed'],
+            'total': round(time.perf_counter() - started, 3),
+        },
+        'results': results,
+    }
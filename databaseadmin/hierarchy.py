@@ -0,0 +1,112 @@
+"""
+Поддержка таблицы замыкания иерархии временных рядов (TimeSeriesClosure).
+
+Таблица обновляется сигналами TimeSeries (databaseadmin.signals) при создании ряда,
+смене родителя и удалении. Изменения в обход сигналов (QuerySet.update, bulk_create,
+загрузка фикстур, правка в БД) требуют перестройки: manage.py rebuild_time_series_closure.
+"""
+from typing import Optional
+
+from django.db import connection, transaction
+
+REBUILD_CLOSURE_SQL = """
+    INSERT INTO ts_schema.time_series_closure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE paths AS (
+        SELECT time_series_id AS ancestor_id, time_series_id AS descendant_id, 0 AS depth
+        FROM ts_schema.time_series
+
+        UNION ALL
+
+        SELECT p.ancestor_id, ts.time_series_id, p.depth + 1
+        FROM paths p
+        INNER JOIN ts_schema.time_series ts ON ts.parent_time_series_id = p.descendant_id
+    )
+    SELECT ancestor_id, descendant_id, depth FROM paths
+"""
+
+
+class HierarchyCycleError(ValueError):
+    """Попытка сделать ряд потомком самого себя"""
+
+
+def insert_node(series_id: int, parent_id: Optional[int]) -> None:
+    """Добавляет связи нового ряда: с самим собой и со всеми предками родителя"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO ts_schema.time_series_closure (ancestor_id, descendant_id, depth)
+            SELECT %s, %s, 0
+            UNION ALL
+            SELECT ancestor_id, %s, depth + 1
+            FROM ts_schema.time_series_closure
+            WHERE descendant_id = %s
+        """, [series_id, series_id, series_id, parent_id])
+
+
+def is_descendant(series_id: int, ancestor_id: int) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM ts_schema.time_series_closure
+            WHERE ancestor_id = %s AND descendant_id = %s
+        """, [ancestor_id, series_id])
+        return cursor.fetchone() is not None
+
+
+def detach_subtree(series_id: int) -> None:
+    """Удаляет связи поддерева ряда со всеми его внешними предками"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM ts_schema.time_series_closure
+            WHERE descendant_id IN (
+                SELECT descendant_id FROM ts_schema.time_series_closure WHERE ancestor_id = %s
+            )
+            AND ancestor_id IN (
+                SELECT ancestor_id FROM ts_schema.time_series_closure
+                WHERE descendant_id = %s AND ancestor_id <> %s
+            )
+        """, [series_id, series_id, series_id])
+
+
+def attach_subtree(series_id: int, parent_id: int) -> None:
+    """Связывает все узлы поддерева ряда со всеми предками нового родителя (включая его самого)"""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO ts_schema.time_series_closure (ancestor_id, descendant_id, depth)
+            SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+            FROM ts_schema.time_series_closure above
+            CROSS JOIN ts_schema.time_series_closure below
+            WHERE above.descendant_id = %s
+              AND below.ancestor_id = %s
+        """, [parent_id, series_id])
+
+
+def move_subtree(series_id: int, new_parent_id: Optional[int]) -> None:
+    """
+    Переносит ряд вместе с потомками под нового родителя (None - сделать корнем).
+
+    Raises:
+        HierarchyCycleError: Если новый родитель - сам ряд или его потомок
+    """
+    if new_parent_id is not None and (new_parent_id == series_id or is_descendant(new_parent_id, series_id)):
+        raise HierarchyCycleError("Ряд нельзя сделать потомком самого себя")
+
+    with transaction.atomic():
+        detach_subtree(series_id)
+        if new_parent_id is not None:
+            attach_subtree(series_id, new_parent_id)
+
+
+def remove_node(series_id: int) -> None:
+    """
+    Вызывается перед удалением ряда: дочерние ряды (parent = NULL после удаления)
+    становятся корнями своих поддеревьев. Связи с самим рядом удаляются каскадно.
+    """
+    detach_subtree(series_id)
+
+
+def rebuild_closure() -> int:
+    """Полностью перестраивает таблицу замыкания по time_series. Возвращает число связей"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM ts_schema.time_series_closure")
+            cursor.execute(REBUILD_CLOSURE_SQL)
+            return cursor.rowcount
@@ -0,0 +1,131 @@
+"""
+Кэш таймстемпов иерархии ряда (get_hierarchy_data и страницы HierarchyQuery) в кэше Django.
+
+Данные ряда зависят от таймстемпов самого ряда и всех его предков, поэтому ключ
+включает версии каждого из них. Изменение таймстемпов ряда увеличивает только его
+версию - это меняет ключи всех потомков, остальные записи кэша остаются действительными.
+Смена родителя меняет список предков, а значит и ключ, без явной инвалидации.
+
+Версии хранятся в БД (databaseadmin.cache_versions), а не в кэше: иначе инвалидацию
+в одном процессе (другой веб-процесс, воркер импорта) не увидели бы остальные. Версия
+меняется в транзакции вместе с таймстемпами: до фиксации другие запросы видят прежнюю
+версию и прежние данные, а после отката выданная версия больше не встретится.
+"""
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Iterable, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import cache_versions
+
+VERSION_KEY = 'hierarchy:{series_id}'
+EPOCH_KEY = 'hierarchy:epoch'
+ENTRY_KEY = 'databaseadmin:hierarchy:{series_id}:{digest}'
+
+_MISSING = object()
+
+
+class HierarchyCache:
+    """
+    Кэш результатов запросов иерархии с версиями рядов. Счётчики попаданий -
+    в памяти текущего процесса.
+    """
+
+    def __init__(self, timeout: int = 600, max_rows: int = 50_000):
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.timeout > 0
+
+    def _ancestor_versions(self, series_id: int) -> List[Any]:
+        """Предки ряда (включая его самого) по глубине с их версиями и версия всего кэша"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.depth, c.ancestor_id, COALESCE(v.version, 0)
+                FROM ts_schema.time_series_closure c
+                LEFT JOIN ts_schema.cache_versions v ON v.key = %s || c.ancestor_id
+                WHERE c.descendant_id = %s
+                UNION ALL
+                SELECT -1, 0, COALESCE((SELECT version FROM ts_schema.cache_versions WHERE key = %s), 0)
+                ORDER BY 1
+            """, [VERSION_KEY.format(series_id=''), series_id, EPOCH_KEY])
+            return [(ancestor_id, version) for _, ancestor_id, version in cursor.fetchall()]
+
+    def key(self, series_id: int, parts: Iterable[Any]) -> str:
+        """Ключ записи: версии ряда и его предков плюс параметры запроса parts"""
+        signature = (self._ancestor_versions(series_id), tuple(parts))
+        digest = hashlib.sha1(repr(signature).encode()).hexdigest()
+        return ENTRY_KEY.format(series_id=series_id, digest=digest)
+
+    def get_or_compute(self, series_id: int, parts: Iterable[Any], compute: Callable[[], Any]) -> Any:
+        """
+        Возвращает результат из кэша или вычисляет его через compute().
+        Результаты длиннее max_rows строк не сохраняются.
+        """
+        if not self.enabled:
+            return compute()
+
+        key = self.key(series_id, parts)
+        value = cache.get(key, _MISSING)
+        with self._lock:
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = compute()
+        if len(value) <= self.max_rows:
+            cache.set(key, value, timeout=self.timeout)
+            with self._lock:
+                self.stores += 1
+        else:
+            with self._lock:
+                self.skipped += 1
+        return value
+
+    def _bump(self, keys: List[str]) -> None:
+        cache_versions.bump(*keys)
+        with self._lock:
+            self.invalidations += len(keys)
+
+    def invalidate_series(self, *series_ids: int) -> None:
+        """Делает недействительными данные рядов и всех их потомков"""
+        keys = [VERSION_KEY.format(series_id=series_id) for series_id in set(series_ids)]
+        if keys:
+            self._bump(keys)
+
+    def invalidate_all(self) -> None:
+        self._bump([EPOCH_KEY])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'backend': settings.CACHES['default']['BACKEND'],
+                'timeout': self.timeout,
+                'max_rows': self.max_rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'stores': self.stores,
+                'skipped': self.skipped,
+                'invalidations': self.invalidations,
+            }
+
+
+hierarchy_cache = HierarchyCache(
+    timeout=getattr(settings, 'HIERARCHY_CACHE_TIMEOUT', 600),
+    max_rows=getattr(settings, 'HIERARCHY_CACHE_MAX_ROWS', 50_000),
+)
@@ -0,0 +1,318 @@
+"""
+Построитель запроса к таймстемпам иерархии ряда (вариант TimeSeries.get_hierarchy_data).
+
+Фильтры, сортировка и постраничный вывод переводятся в SQL, так что из БД читается
+только запрошенная страница. Выборка начинается с самого ряда: его предки берутся
+из таблицы замыкания, а фильтры по ключам DISTINCT ON (attribute_id, start_dt, end_dt)
+применяются ещё до выбора ближайшего значения - они отбрасывают точку целиком.
+"""
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import effective
+from .data_access import value_number_sql
+from .hierarchy_cache import hierarchy_cache
+from .pagination import KeysetPage, count_rows, decode_cursor, encode_cursor, keyset_condition
+
+# Точки иерархии из материализованной таблицы (effective.is_enabled())
+EFFECTIVE_HIERARCHY_SQL = """
+    WITH hierarchy AS (
+        SELECT
+            t.time_series_id AS root_time_series_id,
+            t.source_timestamp_id AS timestamp_id,
+            t.source_time_series_id AS initial_time_series_id,
+            t.attribute_id,
+            t.value,
+            t.value_num,
+            t.start_dt,
+            t.end_dt,
+            t.depth
+        FROM ts_schema.effective_timestamps t
+        WHERE t.time_series_id = %s{inner_where}
+    )
+    SELECT h.*{key_columns}
+    FROM hierarchy h
+    WHERE TRUE{outer_where}
+"""
+
+HIERARCHY_SQL = """
+    WITH hierarchy AS (
+        SELECT DISTINCT ON (t.attribute_id, t.start_dt, t.end_dt)
+            c.descendant_id AS root_time_series_id,
+            t.timestamp_id,
+            t.time_series_id AS initial_time_series_id,
+            t.attribute_id,
+            t.value,
+            t.value_num,
+            t.start_dt,
+            t.end_dt,
+            c.depth + 1 AS depth
+        FROM ts_schema.time_series_closure c
+        INNER JOIN ts_schema.timestamps t ON t.time_series_id = c.ancestor_id
+        WHERE c.descendant_id = %s{inner_where}
+        ORDER BY t.attribute_id, t.start_dt, t.end_dt, c.depth ASC, t.timestamp_id DESC
+    )
+    SELECT h.*{key_columns}
+    FROM hierarchy h
+    WHERE TRUE{outer_where}
+"""
+
+# Поле -> (тип, столбец внутри DISTINCT ON или None, если фильтр возможен только по результату)
+HIERARCHY_FIELDS: Dict[str, Tuple[str, Optional[str]]] = {
+    'depth': ('int', None),
+    'initial_time_series_id': ('int', None),
+    'attribute_id': ('int', 't.attribute_id'),
+    'value': ('text', None),
+    'start_dt': ('datetime', 't.start_dt'),
+    'end_dt': ('datetime', 't.end_dt'),
+}
+
+TEXT_OPERATORS = {'exact', 'iexact', 'contains', 'icontains', 'startswith', 'endswith'}
+COMPARISON_OPERATORS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+DEFAULT_ORDERING = [('attribute_id', False), ('start_dt', False), ('end_dt', False)]
+
+DATETIME_INPUT_FORMATS = ['%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y']
+
+
+def _parse_datetime_value(value: str) -> Tuple[Optional[datetime], bool]:
+    """Разбирает дату из фильтра. Возвращает (datetime, задан ли только день)"""
+    value = value.strip()
+    parsed = None
+    date_only = False
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is not None:
+                parsed, date_only = datetime.combine(day, time()), True
+    except ValueError:
+        return None, False
+
+    if parsed is None:
+        for input_format in DATETIME_INPUT_FORMATS:
+            try:
+                parsed = datetime.strptime(value, input_format)
+            except ValueError:
+                continue
+            date_only = '%H' not in input_format
+            break
+    if parsed is None:
+        return None, False
+
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, date_only
+
+
+def _like_pattern(value: str, operator: str) -> str:
+    escaped = value.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    if operator in ('contains', 'icontains'):
+        return f'%{escaped}%'
+    if operator == 'startswith':
+        return f'{escaped}%'
+    return f'%{escaped}'
+
+
+def _filter_sql(column: str, kind: str, operator: str, value: str) -> Tuple[str, List[Any]]:
+    """
+    Условие для одного фильтра. Как и прежний фильтр в Python, сравнение строк
+    регистронезависимое, а gt/gte/lt/lte сравнивают числа (для дат - моменты времени).
+    """
+    if kind == 'datetime':
+        moment, date_only = _parse_datetime_value(value)
+        if moment is not None and operator in ('exact', 'iexact'):
+            if date_only:
+                return f"{column} >= %s AND {column} < %s", [moment, moment + timedelta(days=1)]
+            return f"{column} = %s", [moment]
+        if operator in COMPARISON_OPERATORS:
+            if moment is None:
+                return "FALSE", []
+            return f"{column} {COMPARISON_OPERATORS[operator]} %s", [moment]
+
+    if operator in ('exact', 'iexact'):
+        return f"lower({column}::text) = %s", [value.lower()]
+    if operator in TEXT_OPERATORS:
+        return f"lower({column}::text) LIKE %s", [_like_pattern(value, operator)]
+
+    try:
+        number = float(value)
+    except ValueError:
+        return "FALSE", []
+    if kind == 'text':
+        # Единственное текстовое поле - h.value: сравнивается его число (value_num или разбор текста)
+        column = value_number_sql(column.rpartition('.')[0])
+    return f"{column} {COMPARISON_OPERATORS[operator]} %s", [number]
+
+
+def _sort_keys(field: str, descending: bool) -> List[Tuple[str, bool]]:
+    """
+    Выражения сортировки для поля. Ни одно из них не принимает NULL, иначе курсор
+    нельзя сравнивать. value: сначала числовые значения по величине, затем остальные по тексту.
+    """
+    if field == 'value':
+        number = value_number_sql('h')
+        return [
+            (f"({number}) IS NULL", False),
+            (f"COALESCE({number}, 0)", descending),
+            ("lower(h.value)", descending),
+        ]
+    if field == 'end_dt':
+        return [("h.end_dt IS NULL", False), ("COALESCE(h.end_dt, h.start_dt)", descending)]
+    return [(f"h.{field}", descending)]
+
+
+class HierarchyQuery:
+    """
+    Запрос таймстемпов иерархии ряда с фильтрами и сортировкой на стороне БД.
+
+    Пример:
+        page = (HierarchyQuery(series_id)
+                .filter('value', 'gt', '10')
+                .order_by('start_dt', descending=True)
+                .page(per_page=50))
+    """
+
+    def __init__(self, time_series_id: int):
+        self.time_series_id = time_series_id
+        self._inner: List[Tuple[str, List[Any]]] = []
+        self._outer: List[Tuple[str, List[Any]]] = []
+        self._ordering: List[Tuple[str, bool]] = []
+
+    def filter(self, field: str, operator: str, value: str) -> 'HierarchyQuery':
+        """
+        Добавляет фильтр (условия объединяются через AND).
+
+        Raises:
+            ValueError: Неизвестное поле или оператор
+        """
+        if field not in HIERARCHY_FIELDS:
+            raise ValueError(f"Неизвестное поле фильтра: {field}")
+        if operator not in TEXT_OPERATORS and operator not in COMPARISON_OPERATORS:
+            raise ValueError(f"Неизвестный оператор фильтра: {operator}")
+
+        kind, inner_column = HIERARCHY_FIELDS[field]
+        if inner_column is not None:
+            self._inner.append(_filter_sql(inner_column, kind, operator, str(value)))
+        else:
+            self._outer.append(_filter_sql(f'h.{field}', kind, operator, str(value)))
+        return self
+
+    def order_by(self, field: str, descending: bool = False) -> 'HierarchyQuery':
+        """
+        Добавляет поле сортировки (порядок вызовов - приоритет полей).
+
+        Raises:
+            ValueError: Неизвестное поле
+        """
+        if field not in HIERARCHY_FIELDS:
+            raise ValueError(f"Неизвестное поле сортировки: {field}")
+        self._ordering.append((field, descending))
+        return self
+
+    def _keys(self) -> List[Tuple[str, bool]]:
+        keys: List[Tuple[str, bool]] = []
+        for field, descending in self._ordering or DEFAULT_ORDERING:
+            keys.extend(_sort_keys(field, descending))
+        # timestamp_id уникален в выборке и делает порядок строк однозначным
+        keys.append(("h.timestamp_id", False))
+        return keys
+
+    def _sql(self, keys: Sequence[Tuple[str, bool]] = ()) -> Tuple[str, List[Any]]:
+        """Запрос отфильтрованной иерархии; keys добавляются столбцами _k0, _k1, ..."""
+        params: List[Any] = [self.time_series_id]
+        inner_where = ''
+        for condition, condition_params in self._inner:
+            inner_where += f"\n          AND {condition}"
+            params.extend(condition_params)
+        outer_where = ''
+        for condition, condition_params in self._outer:
+            outer_where += f"\n      AND {condition}"
+            params.extend(condition_params)
+
+        key_columns = ''.join(
+            f",\n        {expression} AS _k{position}" for position, (expression, _) in enumerate(keys)
+        )
+        template = EFFECTIVE_HIERARCHY_SQL if effective.is_enabled() else HIERARCHY_SQL
+        sql = template.format(inner_where=inner_where, key_columns=key_columns, outer_where=outer_where)
+        return sql, params
+
+    def count(self) -> Tuple[int, bool]:
+        """Число строк (оценка планировщика для больших выборок): (число, является ли оценкой)"""
+        sql, params = self._sql()
+        return count_rows(sql, params)
+
+    def page(self, per_page: int = 50, number: int = 1, cursor: Optional[str] = None,
+             backwards: bool = False, with_count: bool = True, use_cache: bool = True) -> KeysetPage:
+        """
+        Возвращает одну страницу.
+
+        Без курсора страница number выбирается через OFFSET (переход к произвольной странице).
+        С курсором - строки сразу после (backwards=True - перед) строкой курсора;
+        number тогда только подписывает страницу.
+        Страницы кэшируются до изменения таймстемпов ряда или его предков (hierarchy_cache).
+
+        Raises:
+            ValueError: Курсор повреждён или не соответствует сортировке
+        """
+        if use_cache:
+            parts = ('page', self._inner, self._outer, self._ordering, per_page, number, cursor, backwards, with_count)
+            return hierarchy_cache.get_or_compute(
+                self.time_series_id, parts,
+                lambda: self.page(per_page, number, cursor, backwards, with_count, use_cache=False))
+
+        keys = self._keys()
+        count, count_is_estimate = self.count() if with_count else (None, False)
+
+        offset = 0
+        keyset_sql, keyset_params = 'TRUE', []
+        if cursor:
+            directions = [(f"_k{position}", descending != backwards) for position, (_, descending) in enumerate(keys)]
+            keyset_sql, keyset_params = keyset_condition(directions, decode_cursor(cursor))
+        else:
+            number = max(1, number)
+            if count is not None and not count_is_estimate:
+                number = min(number, max(1, -(-count // per_page)))
+            offset = (number - 1) * per_page
+
+        order = ', '.join(
+            f"_k{position} {'DESC' if descending != backwards else 'ASC'}"
+            for position, (_, descending) in enumerate(keys)
+        )
+        sql, params = self._sql(keys)
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(f"""
+                SELECT * FROM ({sql}) AS q
+                WHERE {keyset_sql}
+                ORDER BY {order}
+                LIMIT %s OFFSET %s
+            """, [*params, *keyset_params, per_page + 1, offset])
+            columns = [col[0] for col in db_cursor.description]
+            rows = [dict(zip(columns, row)) for row in db_cursor.fetchall()]
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor) or offset > 0
+
+        key_names = [f"_k{position}" for position in range(len(keys))]
+        cursors = [encode_cursor([row.pop(name) for name in key_names]) for row in rows]
+        return KeysetPage(
+            object_list=rows,
+            number=max(1, number),
+            per_page=per_page,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=cursors[-1] if rows else None,
+            previous_cursor=cursors[0] if rows else None,
+            count=count,
+            count_is_estimate=count_is_estimate,
+        )
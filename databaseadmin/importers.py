@@ -0,0 +1,454 @@
+"""
+Потоковый импорт CSV в таблицы продуктов, атрибутов, рядов и таймстемпов.
+
+Файл читается построчно из потока загрузки, без чтения целиком в память, строки
+собираются в пачки по batch_size. Внешние ключи разрешаются по заранее загруженным
+словарям id и имён связанных таблиц, даты пачки разбираются одним вызовом pandas.
+Пачка записывается bulk_create, таймстемпы - через COPY (CSV_IMPORT_METHOD=copy, psycopg 3).
+Если запись пачки не удалась, её строки записываются по одной, чтобы сообщить,
+какие строки ошибочны; остальные строки файла записываются.
+
+bulk_create не отправляет сигналы, поэтому после импорта явно обновляются таблица
+замыкания (новые ряды), effective_timestamps и кэши иерархии и дерева.
+
+В режиме dedupe (только таймстемпы) строка с уже существующим ключом
+(time_series_id, attribute_id, start_dt) обновляет найденные строки, а не добавляет
+новую, поэтому повторный импорт того же файла не создаёт дубликатов.
+"""
+import csv
+import io
+import logging
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+
+from . import effective, hierarchy
+from .data_access import parse_numeric_value
+from .hierarchy_cache import hierarchy_cache
+from .models import Attribute, Product, TimeSeries, Timestamp
+from .tree import bump_tree_version
+
+IMPORT_MODELS: Tuple[Type[models.Model], ...] = (Product, Attribute, TimeSeries, Timestamp)
+IMPORT_METHODS = ('bulk', 'copy')
+DEFAULT_BATCH_SIZE = 5000
+# Сколько сообщений об ошибочных строках возвращается в результате
+MAX_REPORTED_ERRORS = 10
+
+# Часовой пояс в конце даты ISO 8601 после времени: Z, +03, +03:00, -0500
+TZ_SUFFIX_PATTERN = r'[T ]\d{2}(?::?\d{2}(?::?\d{2}(?:[.,]\d+)?)?)?\s*(?:[Zz]|[+-]\d{2}(?::?\d{2})?)$'
+
+# Обновляет таймстемпы с ключами строк пачки и возвращает порядковые номера обновлённых строк пачки
+DEDUPE_UPDATE_SQL = """
+    UPDATE ts_schema.timestamps t
+    SET value = k.value, value_num = k.value_num, end_dt = k.end_dt
+    FROM unnest(%s::integer[], %s::integer[], %s::timestamptz[], %s::text[], %s::double precision[],
+                %s::timestamptz[]) WITH ORDINALITY AS k(time_series_id, attribute_id, start_dt, value, value_num,
+                                                       end_dt, ord)
+    WHERE t.time_series_id = k.time_series_id AND t.attribute_id = k.attribute_id AND t.start_dt = k.start_dt
+    RETURNING k.ord
+"""
+
+
+def parse_datetimes(raw: pd.Series) -> pd.Series:
+    """
+    Даты ISO 8601 в UTC, неверные даты - NaT.
+    Даты без часового пояса считаются временем TIME_ZONE, как при разборе полей формы Django;
+    неоднозначное время при переходе на зимнее время - летним, несуществующее - сдвигается вперёд
+    """
+    parsed = pd.to_datetime(raw, errors='coerce', utc=True, format='ISO8601')
+    if timezone.get_default_timezone_name() == 'UTC':
+        return parsed
+    # pandas считает даты без часового пояса временем UTC: переводим их из местного времени
+    naive = (raw.notna() & ~raw.str.contains(TZ_SUFFIX_PATTERN, regex=True, na=False)).to_numpy()
+    if naive.any():
+        local = parsed[naive].dt.tz_localize(None).dt.tz_localize(
+            timezone.get_default_timezone(), ambiguous=np.ones(naive.sum(), dtype=bool), nonexistent='shift_forward')
+        parsed[naive] = local.dt.tz_convert('UTC')
+    return parsed
+
+
+class CsvImportError(ValueError):
+    """Файл нельзя импортировать целиком (например, нет обязательных столбцов)"""
+
+    def __init__(self, message: str, **details: Any):
+        super().__init__(message)
+        self.details = details
+
+
+class ForeignKeyMap:
+    """id и имена строк связанной таблицы для разрешения внешних ключей без запроса на каждую строку"""
+
+    def __init__(self, related_model: Type[models.Model]):
+        self.model = related_model
+        self.has_name = any(field.name == 'name' for field in related_model._meta.fields)
+        self.ids: Set[int] = set()
+        # Имя, встречающееся несколько раз, неоднозначно: None
+        self.names: Dict[str, Optional[int]] = {}
+        columns = ['pk', 'name'] if self.has_name else ['pk']
+        for row in related_model.objects.values_list(*columns):
+            self.add(*row)
+
+    def add(self, pk: int, name: Optional[str] = None) -> None:
+        self.ids.add(pk)
+        if self.has_name and name is not None:
+            self.names[name] = None if name in self.names else pk
+
+    def resolve(self, value: str) -> int:
+        """id связанной строки по id или по имени (как прежде: сначала id, затем name)"""
+        if value.isdigit() and int(value) in self.ids:
+            return int(value)
+        pk = self.names.get(value)
+        if pk is None:
+            raise ValueError(f"Не удалось найти объект {self.model.__name__} с ID или именем '{value}'")
+        return pk
+
+
+class CsvImporter:
+    """
+    Импорт CSV в модель из IMPORT_MODELS.
+
+    Столбцы называются по полям модели (product) или их столбцам (product_id), как в экспорте.
+    Пустые значения не передаются (берётся значение по умолчанию), value_num вычисляется из value.
+
+    run() импортирует файл целиком. Для импорта частями: prepare(header), затем import_rows()
+    и finish() для каждой части в своей транзакции.
+    """
+
+    def __init__(self, model: Type[models.Model], batch_size: Optional[int] = None,
+                 method: Optional[str] = None, dedupe: bool = False):
+        if model not in IMPORT_MODELS:
+            raise ValueError(f"Импорт CSV для модели {model.__name__} не поддерживается")
+        if dedupe and model is not Timestamp:
+            raise ValueError("Режим dedupe поддерживается только для таймстемпов")
+        self.dedupe = dedupe
+        self.model = model
+        self.batch_size = batch_size or getattr(settings, 'CSV_IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.method = method or getattr(settings, 'CSV_IMPORT_METHOD', 'copy')
+        if self.method not in IMPORT_METHODS:
+            raise ValueError(f"Неизвестный способ импорта: {self.method}")
+        if self.method == 'copy':
+            from django.db.backends.postgresql.psycopg_any import is_psycopg3
+            if model is not Timestamp or connection.vendor != 'postgresql' or not is_psycopg3:
+                self.method = 'bulk'
+
+        self.fields: Dict[str, models.Field] = {}
+        for field in model._meta.concrete_fields:
+            self.fields[field.name] = field
+            self.fields[field.attname] = field
+        self.pk_name = model._meta.pk.name
+        self.foreign_keys: Dict[str, ForeignKeyMap] = {}
+        self.numeric_attributes: Set[int] = set()
+        self.columns: Dict[str, models.Field] = {}
+        self.parent_columns: List[str] = []
+
+        self.processed = 0
+        self.success_count = 0
+        self.updated_count = 0
+        self.errors: List[str] = []
+        self.error_count = 0
+        self.explicit_pk = False
+        self.created_series: List[Tuple[int, Optional[int]]] = []
+        self.new_series: Set[int] = set()
+        self.touched_series: Set[int] = set()
+        self.touched_attributes: Set[int] = set()
+
+    def _error(self, line: int, message: Any) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Строка {line}: {message}")
+
+    def prepare(self, header: List[str]) -> Dict[str, models.Field]:
+        """Поля модели по столбцам файла; проверяет обязательные и неизвестные столбцы"""
+        columns: Dict[str, models.Field] = {}
+        unknown = []
+        for name in header:
+            key = (name or '').strip()
+            field = self.fields.get(key)
+            if field is None:
+                unknown.append(key)
+            elif field.editable:
+                columns[name] = field
+
+        required_fields = [
+            f.name for f in self.model._meta.fields if not f.auto_created and f.name != self.pk_name and not f.blank]
+        present = {field.name for field in columns.values()}
+        missing_fields = [field for field in required_fields if field not in present]
+        if missing_fields:
+            raise CsvImportError('Отсутствуют обязательные поля', missing_fields=missing_fields)
+        if unknown:
+            raise CsvImportError('Неизвестные поля', unknown_fields=unknown)
+
+        for field in columns.values():
+            if field.is_relation and field.name not in self.foreign_keys:
+                self.foreign_keys[field.name] = ForeignKeyMap(field.related_model)
+        if self.model is Timestamp:
+            self.numeric_attributes = {
+                pk for pk, data_type in Attribute.objects.values_list('pk', 'data_type')
+                if Attribute.is_numeric_type(data_type)
+            }
+        self.columns = columns
+        self.parent_columns = [column for column, field in columns.items() if field.name == 'parent_time_series']
+        return columns
+
+    def _build(self, rows: List[Tuple[int, Dict[str, str]]],
+               columns: Dict[str, models.Field]) -> List[Tuple[int, models.Model]]:
+        """Объекты модели для строк пачки; строки с ошибками попадают в отчёт"""
+        failed: Dict[int, str] = {}
+
+        # Даты пачки разбираются одним вызовом
+        dates: Dict[str, Any] = {}
+        for column, field in columns.items():
+            if isinstance(field, models.DateTimeField):
+                raw = pd.Series([values.get(column) or None for _, values in rows], dtype=object)
+                parsed = parse_datetimes(raw)
+                for position in (parsed.isna() & raw.notna()).to_numpy().nonzero()[0]:
+                    failed.setdefault(position, f"Неверный формат даты в поле {field.name}: '{raw[position]}'")
+                dates[column] = parsed.array.to_pydatetime()
+
+        # Объекты создаются позиционными аргументами в порядке concrete_fields: заметно быстрее именованных
+        concrete_fields = self.model._meta.concrete_fields
+        positions = {field.attname: index for index, field in enumerate(concrete_fields)}
+        template = [None if callable(field.default) else field.get_default() for field in concrete_fields]
+        callable_defaults = [(index, field) for index, field in enumerate(concrete_fields)
+                             if field.has_default() and callable(field.default)]
+        required = [field for field in self.model._meta.fields
+                    if not field.auto_created and field.name != self.pk_name and not field.blank]
+        value_num_index = positions.get('value_num')
+
+        objects = []
+        for position, (line, values) in enumerate(rows):
+            if position in failed:
+                self._error(line, failed[position])
+                continue
+            try:
+                args = list(template)
+                for index, field in callable_defaults:
+                    args[index] = field.get_default()
+                assigned = set()
+                for column, field in columns.items():
+                    value = values.get(column)
+                    if not value:
+                        continue
+                    if column in dates:
+                        value = dates[column][position]
+                    elif field.is_relation:
+                        value = self.foreign_keys[field.name].resolve(value)
+                    else:
+                        value = field.to_python(value)
+                        if getattr(field, 'max_length', None) and len(value) > field.max_length:
+                            raise ValueError(f"Значение поля {field.name} длиннее {field.max_length} символов")
+                    args[positions[field.attname]] = value
+                    assigned.add(field.attname)
+                for field in required:
+                    if field.attname not in assigned:
+                        raise ValueError(f"Не заполнено обязательное поле {field.name}")
+                if self.pk_name in assigned:
+                    self.explicit_pk = True
+                if value_num_index is not None:
+                    args[value_num_index] = (parse_numeric_value(args[positions['value']])
+                                             if args[positions['attribute_id']] in self.numeric_attributes else None)
+                objects.append((line, self.model(*args)))
+            except (ValueError, ValidationError) as exc:
+                self._error(line, exc.messages[0] if isinstance(exc, ValidationError) else exc)
+        return objects
+
+    def _copy(self, objects: List[models.Model]) -> None:
+        fields = [field for field in self.model._meta.concrete_fields
+                  if not field.primary_key or self.explicit_pk]
+        table = f"ts_schema.{self.model._meta.db_table}"
+        column_names = ', '.join(field.column for field in fields)
+        # cursor.copy() вызывается у курсора psycopg напрямую, мимо обёртки Django: без wrap_database_errors
+        # ошибки COPY остаются psycopg.Error и не попадают в except DatabaseError в _write()
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            with cursor.copy(f"COPY {table} ({column_names}) FROM STDIN") as copy:
+                for obj in objects:
+                    copy.write_row([getattr(obj, field.attname) for field in fields])
+
+    def _insert(self, objects: List[models.Model]) -> None:
+        if self.method == 'copy':
+            self._copy(objects)
+        else:
+            self.model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def _update_existing(self, objects: List[models.Model]) -> List[models.Model]:
+        """Режим dedupe: обновляет таймстемпы с ключами объектов, возвращает объекты без существующих строк"""
+        with connection.cursor() as cursor:
+            cursor.execute(DEDUPE_UPDATE_SQL, [
+                [obj.time_series_id for obj in objects],
+                [obj.attribute_id for obj in objects],
+                [obj.start_dt for obj in objects],
+                [obj.value for obj in objects],
+                [obj.value_num for obj in objects],
+                [obj.end_dt for obj in objects],
+            ])
+            updated = {ord for ord, in cursor.fetchall()}
+        return [obj for position, obj in enumerate(objects, 1) if position not in updated]
+
+    def _store(self, objects: List[models.Model], insert: Callable[[List[models.Model]], Any]) -> int:
+        """Записывает объекты, возвращает число обновлённых (dedupe) вместо добавленных"""
+        count = len(objects)
+        if self.dedupe:
+            objects = self._update_existing(objects)
+        if objects:
+            insert(objects)
+        return count - len(objects)
+
+    def _write(self, batch: List[Tuple[int, models.Model]]) -> None:
+        if self.dedupe:
+            # Из строк пачки с одинаковым ключом записывается последняя, остальные считаются обновлёнными ею
+            unique: Dict[Tuple[int, int, Any], Tuple[int, models.Model]] = {}
+            for line, obj in batch:
+                unique.pop((obj.time_series_id, obj.attribute_id, obj.start_dt), None)
+                unique[(obj.time_series_id, obj.attribute_id, obj.start_dt)] = (line, obj)
+            self.success_count += len(batch) - len(unique)
+            self.updated_count += len(batch) - len(unique)
+            batch = list(unique.values())
+
+        written: List[models.Model] = []
+        try:
+            with transaction.atomic():
+                self.updated_count += self._store([obj for _, obj in batch], self._insert)
+            written = [obj for _, obj in batch]
+        except DatabaseError:
+            # Ошибочную строку пачки находим записью по одной, каждая в своей точке сохранения
+            for line, obj in batch:
+                try:
+                    with transaction.atomic():
+                        self.updated_count += self._store([obj], self.model.objects.bulk_create)
+                    written.append(obj)
+                except DatabaseError as exc:
+                    self._error(line, str(exc).strip().splitlines()[0])
+
+        self.success_count += len(written)
+        if self.model is TimeSeries:
+            parents = self.foreign_keys.get('parent_time_series')
+            for obj in written:
+                self.created_series.append((obj.pk, obj.parent_time_series_id))
+                if parents is not None:
+                    parents.add(obj.pk, obj.name)
+        elif self.model is Timestamp:
+            for obj in written:
+                self.touched_series.add(obj.time_series_id)
+                self.touched_attributes.add(obj.attribute_id)
+
+    def _flush(self, rows: List[Tuple[int, Dict[str, str]]]) -> None:
+        if rows:
+            self._write(self._build(rows, self.columns))
+
+    def import_rows(self, rows: Iterable[Tuple[int, Dict[str, str]]]) -> None:
+        """Записывает строки (номер строки, значения) пачками по batch_size; вызывается после prepare()"""
+        batch: List[Tuple[int, Dict[str, str]]] = []
+        pending: Set[str] = set()
+        for line, values in rows:
+            self.processed += 1
+            # Родитель из ещё не записанной строки пачки: сначала записываем пачку
+            if self.parent_columns and values.get(self.parent_columns[0]) in pending:
+                self._flush(batch)
+                batch, pending = [], set()
+            batch.append((line, values))
+            if self.parent_columns:
+                pending.update(values.get(column) for column, field in self.columns.items()
+                               if field.name in ('name', self.pk_name) and values.get(column))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch, pending = [], set()
+        self._flush(batch)
+
+    def finish(self, refresh: bool = True) -> None:
+        """
+        Действия, которые при записи по одной выполняли сигналы.
+
+        Args:
+            refresh: Пересчитать effective_timestamps и сбросить кэш иерархии. При False ряды
+                остаются в created_series/touched_series до вызова refresh_derived()
+        """
+        if self.explicit_pk:
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [self.model]):
+                    cursor.execute(sql)
+            self.explicit_pk = False
+        if self.created_series:
+            for series_id, parent_id in self.created_series:
+                hierarchy.insert_node(series_id, parent_id)
+            self.new_series.update(series_id for series_id, _ in self.created_series)
+            self.created_series = []
+            bump_tree_version()
+        if refresh:
+            self.refresh_derived()
+
+    def refresh_derived(self) -> None:
+        """Пересчитывает effective_timestamps новых и изменённых рядов и сбрасывает их кэш иерархии"""
+        if self.new_series:
+            effective.refresh(self.new_series)
+            self.new_series = set()
+        if self.touched_series:
+            hierarchy_cache.invalidate_series(*self.touched_series)
+            effective.refresh(self.touched_series, attribute_ids=sorted(self.touched_attributes))
+            self.touched_series, self.touched_attributes = set(), set()
+
+    def read_rows(self, stream: BinaryIO) -> Tuple[List[str], Iterator[Tuple[int, Dict[str, str]]]]:
+        """Заголовок и строки файла (номер строки, значения без пробелов по краям)"""
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        reader = csv.DictReader(text)
+        header = reader.fieldnames or []
+
+        def rows() -> Iterator[Tuple[int, Dict[str, str]]]:
+            for row in reader:
+                yield reader.line_num, {
+                    key: value.strip() for key, value in row.items()
+                    if key is not None and isinstance(value, str)
+                }
+        return list(header), rows()
+
+    def run(self, stream: BinaryIO) -> Dict[str, Any]:
+        """
+        Импортирует файл одной транзакцией.
+
+        Returns:
+            Словарь: processed, success_count, error_count, updated_count (dedupe), errors
+            (первые MAX_REPORTED_ERRORS), elapsed, rows_per_second
+        """
+        started = time.perf_counter()
+        try:
+            header, rows = self.read_rows(stream)
+            self.prepare(header)
+            with transaction.atomic():
+                self.import_rows(rows)
+                self.finish()
+        except UnicodeDecodeError as exc:
+            raise CsvImportError(f"Файл не в кодировке UTF-8: {exc}")
+        except csv.Error as exc:
+            raise CsvImportError(f"Ошибка разбора CSV: {exc}")
+        return self.summary(started)
+
+    def summary(self, started: float) -> Dict[str, Any]:
+        """Результат импорта (см. run) для импорта, начатого в момент started (time.perf_counter)"""
+        elapsed = time.perf_counter() - started
+        rows_per_second = self.processed / elapsed if elapsed > 0 else None
+        logging.info(
+            f"Импорт {self.model._meta.model_name}: {self.success_count} из {self.processed} строк "
+            f"за {elapsed:.3f} с" + (f" ({rows_per_second:.0f} строк/с)" if rows_per_second else "")
+        )
+        return {
+            'success': True,
+            'processed': self.processed,
+            'success_count': self.success_count,
+            'error_count': self.error_count,
+            'updated_count': self.updated_count,
+            'errors': self.errors,
+            'elapsed': round(elapsed, 4),
+            'rows_per_second': round(rows_per_second, 1) if rows_per_second else None,
+        }
+
+
+def import_csv(model: Type[models.Model], stream: BinaryIO, batch_size: Optional[int] = None,
+               method: Optional[str] = None, dedupe: bool = False) -> Dict[str, Any]:
+    """Импортирует CSV из бинарного потока (файл загрузки, open(..., 'rb')) в модель, см. CsvImporter"""
+    return CsvImporter(model, batch_size=batch_size, method=method, dedupe=dedupe).run(stream)
@@ -0,0 +1,239 @@
+"""
+Фоновый импорт больших CSV (задачи IngestionJob).
+
+Загруженный файл сохраняется в каталог INGESTION_STAGING_DIR, импорт выполняет воркер
+(manage.py run_worker). Файл читается частями по INGESTION_CHUNK_ROWS записей, каждая часть
+записывается в своей транзакции вместе с контрольной точкой задачи: смещением в файле и номером
+строки после части. Задача, прерванная падением процесса или остановкой воркера, продолжается
+с контрольной точки, уже записанные части не повторяются.
+
+effective_timestamps и кэш иерархии пересчитываются один раз после последней части,
+до этого ряды для пересчёта хранятся в задаче (pending_refresh).
+"""
+import csv
+import io
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple, Type
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import models, transaction
+
+from .importers import MAX_REPORTED_ERRORS, CsvImporter, CsvImportError
+from .jobs import JobCancelled
+from .models import IngestionJob, Timestamp
+from .wide_format import LONG_HEADER, WideLayout, is_wide_header, read_csv_chunk
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+
+def stage_upload(file: UploadedFile) -> str:
+    """Сохраняет загруженный файл в INGESTION_STAGING_DIR, возвращает путь к нему"""
+    directory = Path(settings.INGESTION_STAGING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = str(directory / f"{uuid.uuid4().hex}.csv")
+    if hasattr(file, 'temporary_file_path'):
+        # Большие загрузки Django уже записал во временный файл: переносим его, а не копируем
+        shutil.move(file.temporary_file_path(), path)
+    else:
+        with open(path, 'wb') as staged:
+            for chunk in file.chunks():
+                staged.write(chunk)
+    return path
+
+
+def read_records(file: BinaryIO, limit: int) -> Tuple[bytes, int]:
+    """
+    До limit записей CSV с текущей позиции файла.
+
+    Запись может занимать несколько строк файла (перевод строки внутри кавычек), поэтому
+    строки добавляются к записи, пока число кавычек в ней не станет чётным.
+
+    Returns:
+        Данные записей (пусто в конце файла) и число прочитанных строк файла
+    """
+    lines: List[bytes] = []
+    records = quotes = 0
+    while records < limit:
+        line = file.readline()
+        if not line:
+            break
+        lines.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            records += 1
+            quotes = 0
+    return b''.join(lines), len(lines)
+
+
+def read_header(file: BinaryIO) -> Tuple[List[str], int]:
+    """Заголовок CSV с начала файла и число его строк; файл остаётся на первой записи после заголовка"""
+    file.seek(0)
+    data, lines = read_records(file, 1)
+    try:
+        header = next(csv.reader(io.StringIO(data.decode('utf-8-sig'), newline='')), [])
+    except UnicodeDecodeError as exc:
+        raise CsvImportError(f"Файл не в кодировке UTF-8: {exc}")
+    except csv.Error as exc:
+        raise CsvImportError(f"Ошибка разбора CSV: {exc}")
+    if not header:
+        raise CsvImportError('Файл пуст')
+    return header, lines
+
+
+def parse_rows(data: bytes, header: List[str], first_line: int) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Строки части файла (номер строки в файле, значения без пробелов по краям), как CsvImporter.read_rows"""
+    try:
+        reader = csv.reader(io.StringIO(data.decode('utf-8'), newline=''))
+        for row in reader:
+            if row:
+                yield first_line + reader.line_num, {key: value.strip() for key, value in zip(header, row)}
+    except UnicodeDecodeError as exc:
+        raise CsvImportError(f"Файл не в кодировке UTF-8: {exc}")
+    except csv.Error as exc:
+        raise CsvImportError(f"Ошибка разбора CSV: {exc}")
+
+
+def create_ingestion_job(model: Type[models.Model], file: UploadedFile, dedupe: bool = False) -> IngestionJob:
+    """
+    Сохраняет файл в INGESTION_STAGING_DIR и ставит его импорт в очередь.
+    Заголовок проверяется сразу: файл с неверными столбцами не попадает в очередь (CsvImportError).
+    Таймстемпы в широком формате (см. databaseadmin.wide_format) определяются по заголовку.
+    """
+    path = stage_upload(file)
+    layout = 'long'
+    try:
+        with open(path, 'rb') as staged:
+            header, _ = read_header(staged)
+        importer = CsvImporter(model, dedupe=dedupe)
+        if model is Timestamp and is_wide_header(header):
+            WideLayout(header)
+            layout = 'wide'
+        else:
+            importer.prepare(header)
+    except Exception:
+        os.remove(path)
+        raise
+    return IngestionJob.objects.create(
+        model_name=model._meta.model_name,
+        file_path=path,
+        original_name=(file.name or '')[:255],
+        file_size=os.path.getsize(path),
+        dedupe=dedupe,
+        layout=layout,
+    )
+
+
+def _pending_refresh(importer: CsvImporter) -> Dict[str, List[int]]:
+    return {
+        'new_series': sorted(importer.new_series),
+        'series': sorted(importer.touched_series),
+        'attributes': sorted(importer.touched_attributes),
+    }
+
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _refresh(job: IngestionJob, importer: CsvImporter) -> None:
+    with transaction.atomic():
+        importer.refresh_derived()
+        IngestionJob.objects.filter(pk=job.pk).update(pending_refresh={})
+
+
+def _ingest(job: IngestionJob, importer: CsvImporter, file: BinaryIO, context) -> Dict[str, Any]:
+    chunk_rows = getattr(settings, 'INGESTION_CHUNK_ROWS', DEFAULT_CHUNK_ROWS)
+    header, header_lines = read_header(file)
+    wide = WideLayout(header) if job.layout == 'wide' else None
+    importer.prepare(LONG_HEADER if wide else header)
+    if job.byte_offset:
+        file.seek(job.byte_offset)
+        offset, line_number = job.byte_offset, job.line_number
+    else:
+        offset, line_number = file.tell(), header_lines
+
+    started = time.perf_counter()
+    totals: Dict[str, int] = {}
+    while True:
+        data, lines = read_records(file, chunk_rows)
+        if not data:
+            break
+        with transaction.atomic():
+            if wide:
+                importer.import_rows(wide.unpivot(read_csv_chunk(data, wide), line_number + 1))
+            else:
+                importer.import_rows(parse_rows(data, header, line_number))
+            importer.finish(refresh=False)
+            offset += len(data)
+            line_number += lines
+            totals = {
+                'rows_processed': job.rows_processed + importer.processed,
+                'rows_written': job.rows_written + importer.success_count,
+                'rows_updated': job.rows_updated + importer.updated_count,
+                'rows_failed': job.rows_failed + importer.error_count,
+            }
+            # Контрольная точка фиксируется той же транзакцией, что и строки части
+            IngestionJob.objects.filter(pk=job.pk).update(
+                byte_offset=offset,
+                line_number=line_number,
+                errors=(job.errors + importer.errors)[:MAX_REPORTED_ERRORS],
+                pending_refresh=_pending_refresh(importer),
+                **totals,
+            )
+        percent = min(99, int(offset * 100 / job.file_size)) if job.file_size else 99
+        context.progress(percent, f"Обработано строк: {totals['rows_processed']}")
+
+    context.progress(99, 'Пересчёт значений иерархии')
+    _refresh(job, importer)
+    job.refresh_from_db()
+
+    elapsed = time.perf_counter() - started
+    logging.info(
+        f"Фоновый импорт {job.model_name} #{job.pk}: {job.rows_written} из {job.rows_processed} строк "
+        f"за {elapsed:.1f} с"
+    )
+    return {
+        'success': True,
+        'processed': job.rows_processed,
+        'success_count': job.rows_written,
+        'updated_count': job.rows_updated,
+        'error_count': job.rows_failed,
+        'errors': job.errors,
+        'elapsed': round(elapsed, 4),
+        'rows_per_second': round(importer.processed / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def execute_ingestion_job(job: IngestionJob, context) -> Dict[str, Any]:
+    """
+    Обработчик задачи импорта для воркера очереди (см. databaseadmin.jobs).
+    Прогресс - доля прочитанных байт файла, отмена проверяется после каждой части.
+    """
+    importer = CsvImporter(job.import_model(), dedupe=job.dedupe)
+    importer.new_series = set(job.pending_refresh.get('new_series', []))
+    importer.touched_series = set(job.pending_refresh.get('series', []))
+    importer.touched_attributes = set(job.pending_refresh.get('attributes', []))
+
+    try:
+        with open(job.file_path, 'rb') as file:
+            result = _ingest(job, importer, file, context)
+    except (Exception, JobCancelled):
+        # Записанные части остаются в БД: пересчитываем для них effective_timestamps сразу,
+        # файл сохраняется для возобновления, если задача не отменена
+        try:
+            _refresh(job, importer)
+        except Exception as exc:
+            logging.error(f"Не удалось пересчитать значения после импорта #{job.pk}: {exc}")
+        if IngestionJob.objects.filter(pk=job.pk, cancel_requested=True).exists():
+            _remove_file(job.file_path)
+        raise
+
+    _remove_file(job.file_path)
+    return result
@@ -0,0 +1,256 @@
+"""
+Фоновые задачи: очередь в таблицах задач (TrainingJob и др.) и воркер,
+который забирает задачи из очереди и выполняет каждую в отдельном процессе.
+Запуск воркера: python manage.py run_worker
+"""
+import os
+import time
+import signal
+import logging
+import traceback
+import multiprocessing
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Метка модели задачи -> обработчик handler(job, context) -> result
+JOB_HANDLERS: Dict[str, str] = {
+    'databaseadmin.TrainingJob': 'databaseadmin.training.execute_training_job',
+    'databaseadmin.IngestionJob': 'databaseadmin.ingestion.execute_ingestion_job',
+}
+
+
+class JobCancelled(BaseException):
+    """
+    Выбрасывается внутри обработчика, когда задачу попросили отменить.
+    Наследуется от BaseException, чтобы не перехватываться блоками except Exception в обработчиках.
+    """
+
+
+class JobContext:
+    """
+    Передаётся обработчику задачи: отчёт о прогрессе и проверка отмены.
+    """
+
+    def __init__(self, job_model: Type, job_id: int):
+        self.job_model = job_model
+        self.job_id = job_id
+
+    def _queryset(self):
+        return self.job_model.objects.filter(pk=self.job_id)
+
+    def progress(self, percent: int, message: str = '', **fields: Any) -> None:
+        """Сохраняет прогресс задачи и прерывает её, если запрошена отмена"""
+        self._queryset().update(progress=percent, message=message, heartbeat_at=timezone.now(), **fields)
+        self.check_cancelled()
+
+    def check_cancelled(self) -> None:
+        if self._queryset().filter(cancel_requested=True).exists():
+            raise JobCancelled()
+
+    def finish(self, status: str, **fields: Any) -> None:
+        self._queryset().update(status=status, finished_at=timezone.now(), **fields)
+
+
+def _job_process_main(model_label: str, job_id: int, handler_path: str) -> None:
+    """Точка входа дочернего процесса, выполняющего одну задачу"""
+    # Обработчики сигналов воркера унаследованы при fork, terminate() должен завершать процесс
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if not apps.ready:
+        import django
+        django.setup()
+
+    job_model = apps.get_model(model_label)
+    handler = import_string(handler_path)
+    context = JobContext(job_model, job_id)
+
+    try:
+        job = job_model.objects.get(pk=job_id)
+        result = handler(job, context)
+    except JobCancelled:
+        context.finish(job_model.STATUS_CANCELLED, message='Задача отменена')
+    except Exception as e:
+        logging.error(f"Ошибка при выполнении задачи {model_label} #{job_id}: {str(e)}")
+        logging.error(traceback.format_exc())
+        context.finish(job_model.STATUS_FAILED, error=getattr(e, 'message', str(e)))
+    else:
+        context.finish(job_model.STATUS_SUCCEEDED, result=result, progress=100, message='Готово')
+    finally:
+        connections.close_all()
+
+
+def _get_mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+
+
+class Worker:
+    """
+    Воркер очереди задач. Одновременно выполняет до concurrency задач,
+    каждую в отдельном процессе, следит за отменой и зависшими задачами.
+    """
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 2.0,
+                 stale_after: float = 300.0, cancel_grace: float = 10.0,
+                 handlers: Optional[Dict[str, str]] = None,
+                 log: Optional[Callable[[str], None]] = None):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.cancel_grace = cancel_grace
+        self.handlers = handlers or JOB_HANDLERS
+        self.log = log or logging.info
+        self.running: Dict[Tuple[str, int], multiprocessing.process.BaseProcess] = {}
+        self.cancel_seen: Dict[Tuple[str, int], float] = {}
+        self.stopping = False
+        self._mp = _get_mp_context()
+
+    def stop(self, *args: Any) -> None:
+        self.stopping = True
+
+    def run(self, once: bool = False) -> None:
+        """Основной цикл. При once=True завершается, когда очередь пуста"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.log(f"Воркер запущен (pid {os.getpid()}, параллельно задач: {self.concurrency})")
+
+        try:
+            while not self.stopping:
+                self._reap()
+                self._heartbeat()
+                self._handle_cancellations()
+                self._requeue_stale()
+
+                started = 0
+                while len(self.running) < self.concurrency and not self.stopping:
+                    if not self._start_next():
+                        break
+                    started += 1
+
+                if once and not self.running and not started:
+                    break
+                time.sleep(self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def _job_models(self) -> List[Tuple[str, Type]]:
+        return [(label, apps.get_model(label)) for label in self.handlers]
+
+    def _claim(self, job_model: Type) -> Optional[Any]:
+        with transaction.atomic():
+            job = (job_model.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(status=job_model.STATUS_QUEUED, cancel_requested=False)
+                   .order_by('created_at')
+                   .first())
+            if job is None:
+                return None
+            now = timezone.now()
+            job.status = job_model.STATUS_RUNNING
+            job.started_at = job.started_at or now
+            job.heartbeat_at = now
+            job.worker_pid = os.getpid()
+            job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'worker_pid'])
+            return job
+
+    def _start_next(self) -> bool:
+        for label, job_model in self._job_models():
+            job = self._claim(job_model)
+            if job is None:
+                continue
+
+            # Дочерний процесс не должен наследовать открытые соединения с БД
+            connections.close_all()
+            process = self._mp.Process(
+                target=_job_process_main,
+                args=(label, job.pk, self.handlers[label]),
+                name=f"{label}#{job.pk}",
+            )
+            process.start()
+            self.running[(label, job.pk)] = process
+            self.log(f"Задача {label} #{job.pk} запущена в процессе {process.pid}")
+            return True
+        return False
+
+    def _reap(self) -> None:
+        for key, process in list(self.running.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            label, job_id = key
+            job_model = apps.get_model(label)
+            job = job_model.objects.filter(pk=job_id).first()
+
+            if job is not None and job.status == job_model.STATUS_RUNNING:
+                # Процесс завершился, не записав результат (убит или упал)
+                if job.cancel_requested:
+                    JobContext(job_model, job_id).finish(job_model.STATUS_CANCELLED, message='Задача отменена')
+                else:
+                    JobContext(job_model, job_id).finish(
+                        job_model.STATUS_FAILED,
+                        error=f'Процесс задачи завершился с кодом {process.exitcode}'
+                    )
+
+            self.log(f"Задача {label} #{job_id} завершена (код {process.exitcode})")
+            del self.running[key]
+            self.cancel_seen.pop(key, None)
+
+    def _ids_by_model(self) -> Dict[str, List[int]]:
+        ids: Dict[str, List[int]] = {}
+        for label, job_id in self.running:
+            ids.setdefault(label, []).append(job_id)
+        return ids
+
+    def _heartbeat(self) -> None:
+        now = timezone.now()
+        for label, ids in self._ids_by_model().items():
+            apps.get_model(label).objects.filter(pk__in=ids).update(heartbeat_at=now)
+
+    def _handle_cancellations(self) -> None:
+        now = time.monotonic()
+        for label, ids in self._ids_by_model().items():
+            cancelled = apps.get_model(label).objects.filter(
+                pk__in=ids, cancel_requested=True).values_list('pk', flat=True)
+            for job_id in cancelled:
+                key = (label, job_id)
+                first_seen = self.cancel_seen.setdefault(key, now)
+                # Даём обработчику время остановиться самостоятельно на ближайшей контрольной точке
+                if now - first_seen >= self.cancel_grace and self.running[key].is_alive():
+                    self.log(f"Принудительная остановка задачи {label} #{job_id}")
+                    self.running[key].terminate()
+
+    def _requeue_stale(self) -> None:
+        """Возвращает в очередь задачи воркеров, которые перестали отправлять heartbeat"""
+        threshold = timezone.now() - timedelta(seconds=self.stale_after)
+        for label, job_model in self._job_models():
+            own_ids = [job_id for (l, job_id) in self.running if l == label]
+            stale = (job_model.objects
+                     .filter(status=job_model.STATUS_RUNNING, heartbeat_at__lt=threshold)
+                     .exclude(pk__in=own_ids))
+            stale.filter(cancel_requested=True).update(
+                status=job_model.STATUS_CANCELLED, finished_at=timezone.now(), message='Задача отменена')
+            requeued = stale.update(status=job_model.STATUS_QUEUED, worker_pid=None,
+                                    message='Перезапуск после остановки воркера')
+            if requeued:
+                self.log(f"Возвращено в очередь зависших задач {label}: {requeued}")
+
+    def _shutdown(self) -> None:
+        """Останавливает выполняющиеся задачи и возвращает их в очередь"""
+        for (label, job_id), process in self.running.items():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            job_model = apps.get_model(label)
+            unfinished = job_model.objects.filter(pk=job_id, status=job_model.STATUS_RUNNING)
+            unfinished.filter(cancel_requested=True).update(
+                status=job_model.STATUS_CANCELLED, finished_at=timezone.now(), message='Задача отменена')
+            unfinished.update(status=job_model.STATUS_QUEUED, worker_pid=None,
+                              message='Перезапуск после остановки воркера')
+        self.running.clear()
+        self.log("Воркер остановлен")
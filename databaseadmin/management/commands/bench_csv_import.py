@@ -0,0 +1,104 @@
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from databaseadmin.importers import IMPORT_METHODS, import_csv
+from databaseadmin.models import Attribute, Product, TimeSeries, Timestamp
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _import_legacy(path: str) -> int:
+    """Прежний импорт: строка за строкой, get() на каждый внешний ключ и create()"""
+    created = 0
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        for row in csv.DictReader(file):
+            values = {key: value.strip() for key, value in row.items() if value}
+            for field_name, model in (('time_series', TimeSeries), ('attribute', Attribute)):
+                value = values[field_name]
+                values[field_name] = (model.objects.get(pk=int(value)) if value.isdigit()
+                                      else model.objects.get(name=value))
+            Timestamp.objects.create(**values)
+            created += 1
+    return created
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает скорость импорта таймстемпов из CSV (строк в секунду): прежний построчный импорт "
+            "и databaseadmin.importers (bulk_create и COPY). Данные записываются во временной транзакции "
+            "и откатываются")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--series', type=int, default=100)
+        parser.add_argument('--legacy-rows', type=int, default=20_000,
+                            help='Строк для прежнего импорта (0 - не замерять)')
+
+    def _write_csv(self, path: str, rows: int, series_ids, attribute_name: str) -> None:
+        rng = np.random.default_rng(0)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write('﻿')
+            writer = csv.writer(file)
+            writer.writerow(['time_series', 'attribute', 'value', 'start_dt'])
+            for first in range(0, rows, 100_000):
+                count = min(100_000, rows - first)
+                positions = np.arange(first, first + count)
+                days = positions // len(series_ids)
+                dates = np.datetime64('2000-01-01', 'D') + days
+                values = np.round(rng.normal(100, 10, count), 2)
+                writer.writerows(
+                    (series_ids[position % len(series_ids)], attribute_name, value, f"{date}T00:00:00Z")
+                    for position, date, value in zip(positions, dates, values)
+                )
+
+    def _run(self, name: str, rows: int, func) -> None:
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                imported = func()
+                elapsed = time.perf_counter() - started
+                raise _Rollback()
+        except _Rollback:
+            pass
+        self.stdout.write(f"{name:>8} {rows:>10} {imported:>10} {elapsed:>9.2f} {rows / elapsed:>12.0f}")
+
+    def handle(self, *args, **options):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        legacy_path = path + '.legacy'
+        try:
+            with transaction.atomic():
+                product = Product.objects.create(name='bench_csv_import')
+                attribute = Attribute.objects.create(name='bench_csv_import_price', data_type='float')
+                series_ids = [
+                    series.pk for series in TimeSeries.objects.bulk_create(
+                        TimeSeries(name=f'bench_csv_import_{i}', product=product) for i in range(options['series'])
+                    )
+                ]
+                self._write_csv(path, options['rows'], series_ids, attribute.name)
+                self.stdout.write(f"Файл: {os.path.getsize(path) / 2**20:.0f} МБ")
+                self.stdout.write(f"{'method':>8} {'rows':>10} {'imported':>10} {'time, s':>9} {'rows/s':>12}")
+
+                if options['legacy_rows']:
+                    self._write_csv(legacy_path, options['legacy_rows'], series_ids, attribute.name)
+                    self._run('legacy', options['legacy_rows'], lambda: _import_legacy(legacy_path))
+
+                for method in IMPORT_METHODS:
+                    def run(method=method):
+                        with open(path, 'rb') as file:
+                            return import_csv(Timestamp, file, method=method)['success_count']
+                    self._run(method, options['rows'], run)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            for file_path in (path, legacy_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
@@ -0,0 +1,85 @@
+import time
+from datetime import timezone as dt_timezone
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from databaseadmin.data_access import fetch_daily_values
+from databaseadmin.models import Attribute, Product, TimeSeries, Timestamp
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _load_legacy(time_series, feature_attribute, target_attribute):
+    """Прежняя выборка из обучения: два запроса ORM, float() в Python, выравнивание через множества"""
+    feature_timestamps = Timestamp.objects.filter(
+        time_series=time_series, attribute=feature_attribute).order_by('start_dt')
+    target_timestamps = Timestamp.objects.filter(
+        time_series=time_series, attribute=target_attribute).order_by('start_dt')
+
+    feature_data = {ts.start_dt.date(): float(ts.value) for ts in feature_timestamps if ts.value and ts.value.strip()}
+    target_data = {ts.start_dt.date(): float(ts.value) for ts in target_timestamps if ts.value and ts.value.strip()}
+    common_dates = sorted(set(feature_data.keys()) & set(target_data.keys()))
+
+    all_price = pd.Series({pd.Timestamp(date): float(feature_data[date]) for date in common_dates})
+    all_traffic = pd.Series({pd.Timestamp(date): float(target_data[date]) for date in common_dates})
+    return all_price, all_traffic
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает выборку признака и целевого атрибута для обучения: ORM и один SQL-запрос. "
+            "Тестовые данные создаются во временной транзакции и откатываются")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def _best_time(self, func, repeat: int) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def _bench(self, size: int, repeat: int) -> None:
+        product = Product.objects.create(name='bench_data_access')
+        feature = Attribute.objects.create(name='bench_price', data_type='float')
+        target = Attribute.objects.create(name='bench_traffic', data_type='float')
+        series = TimeSeries.objects.create(name='bench_data_access', product=product)
+
+        rng = np.random.default_rng(size)
+        dates = pd.date_range('1800-01-01', periods=size, freq='D', tz=dt_timezone.utc).to_pydatetime()
+        Timestamp.objects.bulk_create(
+            [Timestamp(time_series=series, attribute=feature, value=str(value), start_dt=date)
+             for date, value in zip(dates, rng.normal(100, 5, size))]
+            + [Timestamp(time_series=series, attribute=target, value=str(value), start_dt=date)
+               for date, value in zip(dates, rng.normal(1000, 50, size))],
+            batch_size=5000
+        )
+
+        legacy_price, legacy_traffic = _load_legacy(series, feature, target)
+        frame = fetch_daily_values(series.pk, [feature.pk, target.pk])
+        pd.testing.assert_series_equal(legacy_price, frame.series(0), check_freq=False)
+        pd.testing.assert_series_equal(legacy_traffic, frame.series(1), check_freq=False)
+
+        legacy_time = self._best_time(lambda: _load_legacy(series, feature, target), repeat)
+        sql_time = self._best_time(lambda: fetch_daily_values(series.pk, [feature.pk, target.pk]), repeat)
+
+        self.stdout.write(
+            f"{size:>10} {legacy_time * 1000:>12.1f} {sql_time * 1000:>12.1f} {legacy_time / sql_time:>8.1f}x"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'points':>10} {'orm, ms':>12} {'sql, ms':>12} {'speedup':>9}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    self._bench(size, options['repeat'])
+                    raise _Rollback()
+            except _Rollback:
+                pass
@@ -0,0 +1,85 @@
+import time
+from typing import List
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+
+from databaseadmin.models import Attribute, Product, TimeSeries, Timestamp
+from databaseadmin.views.utils import EXPORT_METHODS, export_fields, export_to_csv
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _export_legacy(queryset):
+    """Прежний экспорт: страницы по 1000 объектов с select_related и getattr по каждому полю"""
+    for field in Timestamp._meta.fields:
+        if field.is_relation and field.many_to_one:
+            queryset = queryset.select_related(field.name)
+    header: List[str] = [export_name for _, export_name in export_fields(Timestamp)]
+    yield header
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(timestamp_id__gt=last_pk).order_by('timestamp_id')[:1000])
+        if not chunk:
+            break
+        last_pk = chunk[-1].timestamp_id
+        for obj in chunk:
+            row = []
+            for field in Timestamp._meta.fields:
+                value = getattr(obj, field.name)
+                if isinstance(value, models.Model):
+                    value = value.pk
+                row.append(value)
+            yield row
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает скорость экспорта таймстемпов в CSV (строк в секунду) прежним способом и способами "
+            "export_to_csv. Тестовые данные создаются во временной транзакции и откатываются")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+        parser.add_argument('--methods', nargs='+', choices=('legacy', *EXPORT_METHODS),
+                            default=['legacy', *EXPORT_METHODS])
+
+    def _bench(self, rows: int, methods: List[str]) -> None:
+        product = Product.objects.create(name='bench_export')
+        attribute = Attribute.objects.create(name='bench_export_price', data_type='float')
+        series = TimeSeries.objects.create(name='bench_export', product=product)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO ts_schema.timestamps (time_series_id, attribute_id, value, value_num, start_dt)
+                SELECT %s, %s, v::text, v, '2000-01-01'::timestamptz + g * interval '1 hour'
+                FROM generate_series(1, %s) g, round((random() * 1000)::numeric, 2) v
+            """, [series.pk, attribute.pk, rows])
+            cursor.execute("ANALYZE ts_schema.timestamps")
+
+        queryset = Timestamp.objects.filter(time_series=series).order_by('start_dt')
+        for method in methods:
+            started = time.perf_counter()
+            size = 0
+            if method == 'legacy':
+                exported = sum(1 for _ in _export_legacy(queryset)) - 1
+            else:
+                lines = 0
+                for data in export_to_csv(queryset, method=method).streaming_content:
+                    size += len(data)
+                    lines += data.count(b'\n')
+                exported = lines - 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{rows:>10} {method:>8} {elapsed:>9.2f} {exported / elapsed:>12.0f} "
+                f"{size / 2**20 / elapsed if size else 0:>8.1f}"
+            )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>10} {'method':>8} {'time, s':>9} {'rows/s':>12} {'MB/s':>8}")
+        for rows in options['rows']:
+            try:
+                with transaction.atomic():
+                    self._bench(rows, options['methods'])
+                    raise _Rollback()
+            except _Rollback:
+                pass
@@ -0,0 +1,144 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from databaseadmin.hierarchy import rebuild_closure
+from databaseadmin.models import Attribute, Product, TimeSeries, Timestamp
+
+
+class _Rollback(Exception):
+    pass
+
+
+# Прежний запрос get_hierarchy_data: рекурсия от каждого ряда, фильтр по корню в конце
+LEGACY_HIERARCHY_DATA_SQL = """
+    WITH RECURSIVE ts_hierarchy AS (
+        SELECT ts_root.time_series_id AS root_time_series_id, ts.time_series_id, ts.parent_time_series_id, 1 AS depth
+        FROM ts_schema.time_series ts_root
+        INNER JOIN ts_schema.time_series ts ON ts_root.time_series_id = ts.time_series_id
+        UNION ALL
+        SELECT th.root_time_series_id, ts.time_series_id, ts.parent_time_series_id, th.depth + 1
+        FROM ts_schema.time_series ts
+        INNER JOIN ts_hierarchy th ON th.parent_time_series_id = ts.time_series_id
+    )
+    , all_timestamps AS (
+        SELECT th.root_time_series_id, t.timestamp_id, t.time_series_id AS initial_time_series_id,
+               t.attribute_id, t.value, t.start_dt, t.end_dt, th.depth
+        FROM ts_schema.timestamps t
+        INNER JOIN ts_hierarchy th ON t.time_series_id = th.time_series_id
+    )
+    SELECT DISTINCT ON (root_time_series_id, attribute_id, start_dt, end_dt) *
+    FROM all_timestamps
+    WHERE root_time_series_id = %s
+    ORDER BY root_time_series_id, attribute_id, start_dt, end_dt, depth ASC
+"""
+
+
+def _legacy_hierarchy_data(series_id: int) -> List[Any]:
+    with connection.cursor() as cursor:
+        cursor.execute(LEGACY_HIERARCHY_DATA_SQL, [series_id])
+        return cursor.fetchall()
+
+
+def _legacy_hierarchy(series: TimeSeries) -> Dict[str, Any]:
+    """Прежний get_hierarchy: запрос детей для каждого узла"""
+    return {
+        'id': series.time_series_id,
+        'name': series.name,
+        'product': series.product.name,
+        'children': [_legacy_hierarchy(child) for child in TimeSeries.objects.filter(parent_time_series=series)],
+    }
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает запросы к иерархии рядов: рекурсивные CTE и обход по узлам против таблицы замыкания. "
+            "Тестовое дерево создаётся во временной транзакции и откатывается")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=10_000)
+        parser.add_argument('--branching', type=int, default=5)
+        parser.add_argument('--points', type=int, default=5, help='Таймстемпов на ряд')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def _best_time(self, func, repeat: int) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def _build_tree(self, nodes: int, branching: int, points: int) -> List[TimeSeries]:
+        product = Product.objects.create(name='bench_hierarchy')
+        attribute = Attribute.objects.create(name='bench_value', data_type='float')
+
+        created: List[TimeSeries] = []
+        level = TimeSeries.objects.bulk_create([TimeSeries(name='node 0', product=product)])
+        created.extend(level)
+        while len(created) < nodes:
+            next_level = []
+            for parent in level:
+                for _ in range(branching):
+                    if len(created) + len(next_level) >= nodes:
+                        break
+                    next_level.append(TimeSeries(
+                        name=f'node {len(created) + len(next_level)}', product=product, parent_time_series=parent))
+            level = TimeSeries.objects.bulk_create(next_level)
+            created.extend(level)
+
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        Timestamp.objects.bulk_create(
+            [Timestamp(time_series=series, attribute=attribute, value=str(position),
+                       start_dt=start + timedelta(days=position + index % 3))
+             for index, series in enumerate(created) for position in range(points)],
+            batch_size=5000
+        )
+        return created
+
+    def _report(self, name: str, legacy: float, closure: float) -> None:
+        self.stdout.write(f"{name:>26} {legacy * 1000:>12.1f} {closure * 1000:>12.1f} {legacy / closure:>8.1f}x")
+
+    def _bench(self, options) -> None:
+        repeat = options['repeat']
+        tree = self._build_tree(options['nodes'], options['branching'], options['points'])
+        root, leaf = tree[0], tree[-1]
+
+        started = time.perf_counter()
+        links = rebuild_closure()
+        self.stdout.write(f"Узлов: {len(tree)}, связей в таблице замыкания: {links}, "
+                          f"перестройка {(time.perf_counter() - started) * 1000:.1f} мс")
+
+        legacy_rows = sorted(row[1] for row in _legacy_hierarchy_data(leaf.pk))
+        closure_rows = sorted(row['timestamp_id'] for row in leaf.get_hierarchy_data())
+        assert legacy_rows == closure_rows, "get_hierarchy_data: результаты не совпадают"
+
+        self.stdout.write(f"{'query':>26} {'legacy, ms':>12} {'closure, ms':>12} {'speedup':>9}")
+        self._report(
+            'get_hierarchy_data (leaf)',
+            self._best_time(lambda: _legacy_hierarchy_data(leaf.pk), repeat),
+            self._best_time(leaf.get_hierarchy_data, repeat),
+        )
+
+        subtree_root = tree[1]
+        assert _legacy_hierarchy(subtree_root) == subtree_root.get_hierarchy(), "get_hierarchy: результаты не совпадают"
+        self._report(
+            'get_hierarchy (subtree)',
+            self._best_time(lambda: _legacy_hierarchy(subtree_root), 1),
+            self._best_time(subtree_root.get_hierarchy, repeat),
+        )
+        self._report(
+            'get_hierarchy (root)',
+            self._best_time(lambda: _legacy_hierarchy(root), 1),
+            self._best_time(root.get_hierarchy, repeat),
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._bench(options)
+                raise _Rollback()
+        except _Rollback:
+            pass
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from databaseadmin.forecasting import LagFeatureCache, make_lag_diff_features
+
+
+def _make_exogs_legacy(ts_price: pd.Series, max_lags: int) -> pd.DataFrame:
+    """Прежняя реализация: вставка столбцов в DataFrame по одному"""
+    exog = pd.DataFrame(index=ts_price.index)
+    for lag in range(1, max_lags + 1):
+        exog[f'lag_diff_{lag}'] = ts_price - ts_price.shift(lag)
+    return exog.dropna()
+
+
+class Command(BaseCommand):
+    help = "Сравнивает построение лаговых признаков: прежняя реализация, NumPy и кэш"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+        parser.add_argument('--max-lags', type=int, default=30)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _best_time(self, func, repeat: int) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def handle(self, *args, **options):
+        max_lags = options['max_lags']
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'points':>10} {'legacy, ms':>12} {'numpy, ms':>12} {'cached, ms':>12} {'speedup':>9}")
+        for size in options['sizes']:
+            index = pd.date_range('2000-01-01', periods=size, freq='h')
+            price = pd.Series(np.random.default_rng(size).normal(100, 5, size), index=index)
+
+            legacy = _make_exogs_legacy(price, max_lags)
+            vectorized = make_lag_diff_features(price, max_lags)
+            pd.testing.assert_frame_equal(legacy, vectorized)
+
+            cache = LagFeatureCache()
+            cache.get(price, max_lags)
+
+            legacy_time = self._best_time(lambda: _make_exogs_legacy(price, max_lags), repeat)
+            numpy_time = self._best_time(lambda: make_lag_diff_features(price, max_lags), repeat)
+            cached_time = self._best_time(lambda: cache.get(price, max_lags), repeat)
+
+            self.stdout.write(
+                f"{size:>10} {legacy_time * 1000:>12.2f} {numpy_time * 1000:>12.2f} "
+                f"{cached_time * 1000:>12.2f} {legacy_time / numpy_time:>8.1f}x"
+            )
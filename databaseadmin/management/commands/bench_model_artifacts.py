@@ -0,0 +1,105 @@
+import os
+import pickle
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from databaseadmin.artifacts import load_compact_forecaster, save_compact_forecaster
+from databaseadmin.forecasting import SARIMAXAutoForecaster
+from databaseadmin.models import ForecastingModel
+
+
+def _load_pickle(path: str):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _synthetic_forecaster(size: int):
+    """Обучает модель на синтетическом дневном ряде длины size, возвращает (модель, ряд признака)"""
+    rng = np.random.default_rng(size)
+    index = pd.date_range('2000-01-01', periods=size, freq='D')
+    price = pd.Series(100 + np.cumsum(rng.normal(size=size)), index=index)
+    traffic = pd.Series(1000 - 3 * price.to_numpy() + rng.normal(scale=5, size=size), index=index)
+
+    train_size = int(size * 0.8)
+    forecaster = SARIMAXAutoForecaster(
+        arima_orders=[(1, 1, 1)],
+        seasonal_orders=[(0, 1, 1, 7)],
+        max_lags=30,
+        top_k_features=10,
+        train_ratio=0.8
+    )
+    forecaster.fit(traffic.iloc[:train_size], price.iloc[:train_size])
+    return forecaster, price
+
+
+class Command(BaseCommand):
+    help = "Сравнивает размер и время загрузки моделей: pickle и компактный формат .npz"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2_000, 10_000],
+                            help='Длины синтетических рядов')
+        parser.add_argument('--model-id', type=int, nargs='*', default=[],
+                            help='Сравнить сохранённые pickle-модели (прогноз по model_<id>_all_data.csv)')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def _best_time(self, func, repeat: int) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def _cases(self, options):
+        for size in options['sizes']:
+            forecaster, price = _synthetic_forecaster(size)
+            yield f'synthetic {size}', forecaster, price
+
+        for model_id in options['model_id']:
+            forecasting_model = ForecastingModel.objects.filter(model_id=model_id).first()
+            if forecasting_model is None or not forecasting_model.model_file_path:
+                raise CommandError(f"Модель {model_id} не найдена или не обучена")
+            if not forecasting_model.model_file_path.endswith('.pkl'):
+                raise CommandError(f"Модель {model_id} уже сохранена не в pickle")
+
+            model_dir = os.path.dirname(forecasting_model.model_file_path)
+            data = pd.read_csv(os.path.join(model_dir, f'model_{model_id}_all_data.csv'), parse_dates=['date'])
+            price = pd.Series(data[forecasting_model.feature_attribute.name].to_numpy(dtype=float),
+                              index=pd.DatetimeIndex(data['date']))
+            yield f'model {model_id}', _load_pickle(forecasting_model.model_file_path), price
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        warnings.filterwarnings('ignore')
+
+        self.stdout.write(
+            f"{'case':>16} {'pickle, KB':>11} {'npz, KB':>9} {'pickle load, ms':>16} "
+            f"{'npz load, ms':>13} {'max |diff|':>11}"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, forecaster, price in self._cases(options):
+                pickle_path = os.path.join(tmp_dir, 'model.pkl')
+                compact_path = os.path.join(tmp_dir, 'model.npz')
+                with open(pickle_path, 'wb') as f:
+                    pickle.dump(forecaster, f)
+                save_compact_forecaster(forecaster, compact_path)
+
+                expected = _load_pickle(pickle_path).predict(price)
+                actual = load_compact_forecaster(compact_path).predict(price)
+                if not expected.index.equals(actual.index):
+                    raise CommandError(f"{name}: индексы прогнозов не совпадают")
+                max_diff = float(np.max(np.abs(expected.to_numpy() - actual.to_numpy())))
+
+                pickle_time = self._best_time(lambda: _load_pickle(pickle_path), repeat)
+                compact_time = self._best_time(lambda: load_compact_forecaster(compact_path), repeat)
+
+                self.stdout.write(
+                    f"{name:>16} {os.path.getsize(pickle_path) / 1024:>11.1f} "
+                    f"{os.path.getsize(compact_path) / 1024:>9.1f} {pickle_time * 1000:>16.2f} "
+                    f"{compact_time * 1000:>13.2f} {max_diff:>11.2e}"
+                )
@@ -0,0 +1,187 @@
+import json
+import statistics
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+PLAIN_TABLE = 'ts_schema.bench_timestamps'
+PARTITIONED_TABLE = 'ts_schema.bench_timestamps_partitioned'
+START_DATE = date(2000, 1, 1)
+
+# Горячие запросы к timestamps: выборка для обучения, последние значения для прогноза детей,
+# разрешение иерархии (DISTINCT ON по цепочке предков) и число атрибутов ряда для дерева
+QUERIES = {
+    'training': """
+        SELECT start_dt, attribute_id, value FROM {table}
+        WHERE time_series_id = %s AND attribute_id = ANY(%s)
+        ORDER BY start_dt
+    """,
+    'recent 30 days': """
+        SELECT start_dt, value FROM {table}
+        WHERE time_series_id = %s AND attribute_id = %s AND start_dt >= %s
+        ORDER BY start_dt
+    """,
+    'hierarchy': """
+        SELECT DISTINCT ON (t.attribute_id, t.start_dt, t.end_dt) t.timestamp_id, t.attribute_id, t.value, t.start_dt
+        FROM unnest(%s::integer[]) WITH ORDINALITY AS a(time_series_id, depth)
+        INNER JOIN {table} t ON t.time_series_id = a.time_series_id
+        ORDER BY t.attribute_id, t.start_dt, t.end_dt, a.depth
+    """,
+    'attribute count': """
+        SELECT count(DISTINCT attribute_id) FROM {table} WHERE time_series_id = %s
+    """,
+}
+
+# Набор индексов обычной таблицы на каждом этапе; последний этап - секционированная таблица
+VARIANTS = {
+    'fk indexes': [
+        "CREATE INDEX bench_timestamps_series ON {table} (time_series_id)",
+        "CREATE INDEX bench_timestamps_attribute ON {table} (attribute_id)",
+    ],
+    'composite': [
+        "CREATE INDEX bench_timestamps_composite ON {table} (time_series_id, attribute_id, start_dt)",
+    ],
+    'covering': [
+        "CREATE INDEX bench_timestamps_covering ON {table} (time_series_id, attribute_id, start_dt) INCLUDE (value)",
+    ],
+}
+
+
+def _scan_nodes(plan: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Узлы чтения таблицы из плана: вид сканирования и индекс"""
+    nodes = []
+    if 'Scan' in plan['Node Type'] and 'Function' not in plan['Node Type']:
+        nodes.append((plan['Node Type'], plan.get('Index Name', '')))
+    for child in plan.get('Plans', []):
+        nodes.extend(_scan_nodes(child))
+    return nodes
+
+
+def _summarize_plan(plan: Dict[str, Any]) -> str:
+    """Виды сканирования с индексом, для секций - с числом просмотренных секций"""
+    nodes = _scan_nodes(plan)
+    summary = []
+    for node_type in sorted({node_type for node_type, _ in nodes}, key=[node for node, _ in nodes].index):
+        indexes = [index for current, index in nodes if current == node_type]
+        summary.append(f"{node_type} x{len(indexes)}" if len(indexes) > 1 else f"{node_type} {indexes[0]}".strip())
+    return ', '.join(summary)
+
+
+class Command(BaseCommand):
+    help = ("Сравнивает планы и время горячих запросов к timestamps при разных индексах и секционировании "
+            "на синтетической таблице (например, --rows 50000000). Таблицы bench_timestamps* удаляются после замера")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5_000_000)
+        parser.add_argument('--series', type=int, default=1000)
+        parser.add_argument('--attributes', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=20, help='Запусков каждого запроса (по разным рядам)')
+
+    def _fill(self, cursor, series: int, attributes: int, days: int) -> None:
+        # Строки пишутся по дням, как приходят данные: таймстемпы одного ряда разбросаны по таблице
+        cursor.execute(f"CREATE TABLE {PLAIN_TABLE} (LIKE ts_schema.timestamps INCLUDING DEFAULTS INCLUDING IDENTITY)")
+        batch_days = max(1, 1_000_000 // (series * attributes))
+        for first_day in range(0, days, batch_days):
+            cursor.execute(f"""
+                INSERT INTO {PLAIN_TABLE} (time_series_id, attribute_id, value, start_dt)
+                SELECT s, a, round((random() * 1000)::numeric, 2)::text, %s::timestamptz + d * interval '1 day'
+                FROM generate_series(%s, %s) d, generate_series(1, %s) s, generate_series(1, %s) a
+                ORDER BY d, s, a
+            """, [START_DATE, first_day, min(first_day + batch_days, days) - 1, series, attributes])
+            self.stdout.write(f"\rЗаписано дней: {min(first_day + batch_days, days)}/{days}", ending='')
+        self.stdout.write('')
+
+    def _fill_partitioned(self, cursor, days: int) -> None:
+        cursor.execute(f"""
+            CREATE TABLE {PARTITIONED_TABLE} (LIKE {PLAIN_TABLE} INCLUDING DEFAULTS)
+            PARTITION BY RANGE (start_dt)
+        """)
+        last_year = (START_DATE + timedelta(days=days)).year
+        for year in range(START_DATE.year, last_year + 1):
+            cursor.execute(f"""
+                CREATE TABLE {PARTITIONED_TABLE}_{year} PARTITION OF {PARTITIONED_TABLE}
+                FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')
+            """)
+        cursor.execute(f"INSERT INTO {PARTITIONED_TABLE} SELECT * FROM {PLAIN_TABLE}")
+        cursor.execute(f"""
+            CREATE INDEX bench_timestamps_partitioned_covering ON {PARTITIONED_TABLE}
+            (time_series_id, attribute_id, start_dt) INCLUDE (value)
+        """)
+
+    def _size(self, cursor, table: str) -> Tuple[int, int]:
+        cursor.execute("""
+            SELECT coalesce(sum(pg_table_size(relid)), pg_table_size(%s::regclass)),
+                   coalesce(sum(pg_indexes_size(relid)), pg_indexes_size(%s::regclass))
+            FROM pg_partition_tree(%s::regclass)
+        """, [table, table, table])
+        return cursor.fetchone()
+
+    def _measure(self, cursor, table: str, params: List[Dict[str, list]]) -> None:
+        cursor.execute(f"VACUUM ANALYZE {table}")
+        table_size, index_size = self._size(cursor, table)
+        self.stdout.write(f"  таблица {table_size / 2**20:.0f} МБ, индексы {index_size / 2**20:.0f} МБ")
+
+        for name, sql in QUERIES.items():
+            query = sql.format(table=table)
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params[0][name])
+            plan = cursor.fetchone()[0]
+            plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+            buffers = plan.get('Shared Hit Blocks', 0) + plan.get('Shared Read Blocks', 0)
+
+            timings = []
+            for run_params in params:
+                started = time.perf_counter()
+                cursor.execute(query, run_params[name])
+                cursor.fetchall()
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"  {name:>16} {statistics.median(timings) * 1000:>9.2f} мс {buffers:>8} буф.  {_summarize_plan(plan)}"
+            )
+
+    def handle(self, *args, **options):
+        series, attributes = options['series'], options['attributes']
+        days = max(1, options['rows'] // (series * attributes))
+        last_day = START_DATE + timedelta(days=days - 1)
+
+        rng = np.random.default_rng(0)
+        params = []
+        for _ in range(options['repeat']):
+            series_id = int(rng.integers(1, series + 1))
+            attribute_id = int(rng.integers(1, attributes + 1))
+            chain = [series_id] + [int(value) for value in rng.integers(1, series + 1, size=2)]
+            params.append({
+                'training': [series_id, [1, min(2, attributes)]],
+                'recent 30 days': [series_id, attribute_id, last_day - timedelta(days=30)],
+                'hierarchy': [chain],
+                'attribute count': [series_id],
+            })
+
+        with connection.cursor() as cursor:
+            try:
+                self.stdout.write(f"Рядов: {series}, атрибутов: {attributes}, дней: {days}, "
+                                  f"строк: {series * attributes * days}")
+                started = time.perf_counter()
+                self._fill(cursor, series, attributes, days)
+                self.stdout.write(f"Заполнение: {time.perf_counter() - started:.1f} с")
+
+                previous: List[str] = []
+                for variant, statements in VARIANTS.items():
+                    for index_name in previous:
+                        cursor.execute(f"DROP INDEX ts_schema.{index_name}")
+                    started = time.perf_counter()
+                    for statement in statements:
+                        cursor.execute(statement.format(table=PLAIN_TABLE))
+                    previous = [statement.split()[2] for statement in statements]
+                    self.stdout.write(f"{variant} (построение индексов {time.perf_counter() - started:.1f} с)")
+                    self._measure(cursor, PLAIN_TABLE, params)
+
+                started = time.perf_counter()
+                self._fill_partitioned(cursor, days)
+                self.stdout.write(f"partitioned by year + covering ({time.perf_counter() - started:.1f} с)")
+                self._measure(cursor, PARTITIONED_TABLE, params)
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {PARTITIONED_TABLE}, {PLAIN_TABLE}")
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from databaseadmin.bulk import WRITE_MODES, WRITE_MODE_REPLACE
+from databaseadmin.forecasting import make_forecasts_for_children
+
+
+class Command(BaseCommand):
+    help = "Прогнозирует все дочерние ряды (или всё поддерево) ряда модели прогнозирования"
+
+    def add_arguments(self, parser):
+        parser.add_argument('model_id', type=int, help='ID модели прогнозирования')
+        parser.add_argument('--descendants', action='store_true',
+                            help='Прогнозировать всех потомков, а не только непосредственных детей')
+        parser.add_argument('--write-mode', choices=WRITE_MODES, default=WRITE_MODE_REPLACE,
+                            help='replace - заменить прогнозы, upsert - обновить/добавить по дате')
+        parser.add_argument('--jobs', type=int, default=None,
+                            help='Число процессов (по умолчанию FORECASTING_N_JOBS)')
+        parser.add_argument('--json', action='store_true', help='Вывести полный результат в JSON')
+
+    def handle(self, *args, **options):
+        result = make_forecasts_for_children(
+            options['model_id'],
+            include_descendants=options['descendants'],
+            write_mode=options['write_mode'],
+            n_jobs=options['jobs'],
+        )
+
+        if not result['success']:
+            raise CommandError(result['error'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+            return
+
+        for item in result['results']:
+            if item['success']:
+                self.stdout.write(f"{item['time_series_id']} {item['time_series_name']}: {item['forecast_count']} точек")
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"{item['time_series_id']} {item['time_series_name']}: {item['error']}"))
+
+        timings = result['timings']
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['message']} Загрузка {timings['load']} с, прогноз {timings['predict']} с, "
+            f"запись {timings['write']} с ({result['rows_per_second']} строк/с)"
+        ))
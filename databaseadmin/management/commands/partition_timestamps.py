@@ -0,0 +1,203 @@
+"""
+Секционирование таблицы timestamps по диапазонам start_dt (PARTITION BY RANGE).
+
+Первый запуск переносит данные в секционированную таблицу с тем же именем: секции
+по годам или месяцам (UTC) покрывают данные и --ahead периодов вперёд, строки вне
+диапазона попадают в секцию timestamps_default. Индексы и внешние ключи пересоздаются
+по определениям из каталога с прежними именами, первичный ключ становится
+(timestamp_id, start_dt) - ключ секционирования обязан входить в уникальные индексы.
+Таблица блокируется на всё время переноса.
+
+Повторные запуски добавляют недостающие секции вперёд, перенося в них строки из
+timestamps_default. Интервал должен совпадать с выбранным при первом запуске.
+"""
+from datetime import datetime, timezone as dt_timezone
+from typing import List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+TABLE = 'ts_schema.timestamps'
+DEFAULT_PARTITION = 'timestamps_default'
+MAX_PARTITIONS = 1000
+
+
+def _period_start(moment: datetime, interval: str) -> datetime:
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, 1 if interval == 'year' else moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_period(start: datetime, interval: str) -> datetime:
+    if interval == 'year':
+        return start.replace(year=start.year + 1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def _periods(first: datetime, last: datetime, interval: str) -> List[Tuple[datetime, datetime]]:
+    """Периоды [начало, конец), покрывающие first..last"""
+    periods = []
+    start = _period_start(first, interval)
+    while start <= last:
+        end = _next_period(start, interval)
+        periods.append((start, end))
+        start = end
+        if len(periods) > MAX_PARTITIONS:
+            raise CommandError(
+                f"Больше {MAX_PARTITIONS} секций: выберите --interval year или ограничьте диапазон через --from"
+            )
+    return periods
+
+
+def _partition_name(start: datetime, interval: str) -> str:
+    return f"timestamps_{start:%Y}" if interval == 'year' else f"timestamps_{start:%Y_%m}"
+
+
+def _literal(moment: datetime) -> str:
+    return f"'{moment.isoformat()}'"
+
+
+class Command(BaseCommand):
+    help = "Секционирует timestamps по start_dt или добавляет недостающие секции"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', choices=('year', 'month'), default='year')
+        parser.add_argument('--ahead', type=int, default=2, help='Сколько периодов создать наперёд')
+        parser.add_argument('--from', dest='start', type=datetime.fromisoformat, default=None,
+                            help='Начало первой секции (YYYY-MM-DD); более ранние строки попадут в timestamps_default')
+        parser.add_argument('--dry-run', action='store_true', help='Только вывести SQL')
+
+    def _execute(self, cursor, sql: str) -> None:
+        if self.dry_run:
+            self.stdout.write(sql.strip() + ';')
+        else:
+            cursor.execute(sql)
+
+    def _is_partitioned(self, cursor) -> bool:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        return cursor.fetchone()[0] == 'p'
+
+    def _existing_partitions(self, cursor) -> List[str]:
+        cursor.execute("""
+            SELECT c.relname FROM pg_inherits i
+            INNER JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, [TABLE])
+        return [row[0] for row in cursor.fetchall()]
+
+    def _target_periods(self, first: Optional[datetime], last: Optional[datetime], interval: str,
+                        ahead: int, start: Optional[datetime]) -> List[Tuple[datetime, datetime]]:
+        now = timezone.now()
+        end = now
+        for _ in range(ahead):
+            end = _next_period(_period_start(end, interval), interval)
+        first = min(first or now, now)
+        last = max(last or now, end)
+        if start is not None:
+            first = start if start.tzinfo else start.replace(tzinfo=dt_timezone.utc)
+        return _periods(first, last, interval)
+
+    def _convert(self, cursor, options) -> None:
+        interval = options['interval']
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT min(start_dt), max(start_dt), count(*) FROM {TABLE}")
+        first, last, rows = cursor.fetchone()
+
+        cursor.execute("""
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = %s::regclass AND NOT indisprimary
+            ORDER BY indexrelid
+        """, [TABLE])
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            ORDER BY conname
+        """, [TABLE])
+        foreign_keys = cursor.fetchall()
+
+        self._execute(cursor, f"""
+            CREATE TABLE ts_schema.timestamps_partitioned
+                (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING IDENTITY)
+                PARTITION BY RANGE (start_dt)
+        """)
+        periods = self._target_periods(first, last, interval, options['ahead'], options['start'])
+        for start, end in periods:
+            self._execute(cursor, f"""
+                CREATE TABLE ts_schema.{_partition_name(start, interval)}
+                    PARTITION OF ts_schema.timestamps_partitioned
+                    FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})
+            """)
+        self._execute(cursor, f"CREATE TABLE ts_schema.{DEFAULT_PARTITION} "
+                              f"PARTITION OF ts_schema.timestamps_partitioned DEFAULT")
+
+        self._execute(cursor, f"INSERT INTO ts_schema.timestamps_partitioned SELECT * FROM {TABLE}")
+        self._execute(cursor, f"DROP TABLE {TABLE}")
+        self._execute(cursor, "ALTER TABLE ts_schema.timestamps_partitioned RENAME TO timestamps")
+        self._execute(cursor, "ALTER SEQUENCE ts_schema.timestamps_partitioned_timestamp_id_seq "
+                              "RENAME TO timestamps_timestamp_id_seq")
+        self._execute(cursor, f"""
+            SELECT setval(pg_get_serial_sequence('{TABLE}', 'timestamp_id'),
+                          COALESCE(max(timestamp_id), 0) + 1, false)
+            FROM {TABLE}
+        """)
+
+        self._execute(cursor, f"ALTER TABLE {TABLE} ADD CONSTRAINT timestamps_pkey PRIMARY KEY (timestamp_id, start_dt)")
+        for definition in index_definitions:
+            self._execute(cursor, definition)
+        for name, definition in foreign_keys:
+            self._execute(cursor, f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}')
+        self._execute(cursor, f"ANALYZE {TABLE}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"timestamps секционирована: {len(periods)} секций по {interval} и {DEFAULT_PARTITION}, {rows} строк"
+        ))
+
+    def _extend(self, cursor, options) -> None:
+        interval = options['interval']
+        existing = set(self._existing_partitions(cursor))
+        cursor.execute(f"SELECT min(start_dt), max(start_dt) FROM ts_schema.{DEFAULT_PARTITION}")
+        first, last = cursor.fetchone()
+
+        created = 0
+        for start, end in self._target_periods(first, last, interval, options['ahead'], options['start']):
+            name = _partition_name(start, interval)
+            if name in existing:
+                continue
+            # Строки периода из секции по умолчанию переносятся в новую секцию, иначе её нельзя создать
+            self._execute(cursor, f"""
+                CREATE TEMP TABLE timestamps_moved ON COMMIT DROP AS
+                SELECT * FROM ts_schema.{DEFAULT_PARTITION}
+                WHERE start_dt >= {_literal(start)} AND start_dt < {_literal(end)}
+            """)
+            self._execute(cursor, f"""
+                DELETE FROM ts_schema.{DEFAULT_PARTITION}
+                WHERE start_dt >= {_literal(start)} AND start_dt < {_literal(end)}
+            """)
+            self._execute(cursor, f"""
+                CREATE TABLE ts_schema.{name} PARTITION OF {TABLE}
+                    FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})
+            """)
+            self._execute(cursor, f"INSERT INTO {TABLE} SELECT * FROM timestamps_moved")
+            self._execute(cursor, "DROP TABLE timestamps_moved")
+            created += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Добавлено секций: {created}"))
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    if self._is_partitioned(cursor):
+                        self._extend(cursor, options)
+                    else:
+                        self._convert(cursor, options)
+                    if self.dry_run:
+                        transaction.set_rollback(True)
+        except CommandError:
+            raise
+        except Exception as exc:
+            raise CommandError(f"Не удалось секционировать timestamps: {exc}") from exc
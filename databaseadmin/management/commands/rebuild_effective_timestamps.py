@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from databaseadmin.effective import is_enabled, rebuild
+
+
+class Command(BaseCommand):
+    help = "Перестраивает материализованные таймстемпы иерархии (effective_timestamps)"
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Таблица effective_timestamps перестроена: {rows} строк"))
+        if not is_enabled():
+            self.stdout.write(self.style.WARNING(
+                "EFFECTIVE_TIMESTAMPS_ENABLED выключена: таблица не будет обновляться при изменениях"
+            ))
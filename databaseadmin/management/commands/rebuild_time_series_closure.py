@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from databaseadmin.hierarchy import rebuild_closure
+
+
+class Command(BaseCommand):
+    help = "Перестраивает таблицу замыкания иерархии временных рядов (time_series_closure)"
+
+    def handle(self, *args, **options):
+        links = rebuild_closure()
+        self.stdout.write(self.style.SUCCESS(f"Таблица замыкания перестроена: {links} связей"))
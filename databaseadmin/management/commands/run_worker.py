@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from databaseadmin.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Запускает воркер очереди фоновых задач (обучение моделей и др.)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Сколько задач выполнять одновременно (каждая в своём процессе)')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Интервал опроса очереди, секунд')
+        parser.add_argument('--stale-after', type=float, default=300.0,
+                            help='Через сколько секунд без heartbeat задача другого воркера считается зависшей')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить задачи из очереди и завершиться')
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            stale_after=options['stale_after'],
+            log=lambda message: self.stdout.write(message),
+        )
+        worker.run(once=options['once'])
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from databaseadmin.data_access import series_store_enabled
+from databaseadmin.series_store import series_store
+
+
+class Command(BaseCommand):
+    help = ("Обновляет колоночные снимки значений рядов (SERIES_STORE_DIR): дописывает новые таймстемпы, "
+            "изменённые снимки перестраивает")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--series', type=int, nargs='+', default=[], help='ID рядов')
+        parser.add_argument('--attributes', type=int, nargs='+', default=None,
+                            help='ID атрибутов (по умолчанию все атрибуты рядов)')
+        parser.add_argument('--all', action='store_true', help='Все пары (ряд, атрибут) с таймстемпами')
+        parser.add_argument('--rebuild', action='store_true', help='Перестроить снимки целиком')
+        parser.add_argument('--prune', action='store_true', help='Удалить снимки пар без таймстемпов')
+
+    def handle(self, *args, **options):
+        if not (options['series'] or options['all'] or options['prune']):
+            raise CommandError("Укажите --series, --all или --prune")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT DISTINCT time_series_id, attribute_id FROM ts_schema.timestamps")
+            existing = set(cursor.fetchall())
+
+        keys = set()
+        if options['all']:
+            keys = existing
+        elif options['series']:
+            keys = {
+                key for key in existing
+                if key[0] in options['series'] and (options['attributes'] is None or key[1] in options['attributes'])
+            }
+            if options['attributes'] is not None:
+                keys |= {(series_id, attribute_id)
+                         for series_id in options['series'] for attribute_id in options['attributes']}
+
+        if keys:
+            started = time.perf_counter()
+            stats = series_store.sync(keys, rebuild=options['rebuild'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Снимков: {len(keys)} (без изменений {stats['unchanged']}, дописано {stats['appended']}, "
+                f"перестроено {stats['rebuilt']}), прочитано строк: {stats['rows']}, "
+                f"{time.perf_counter() - started:.1f} с"
+            ))
+
+        if options['prune']:
+            removed = series_store.remove(key for key in series_store.keys() if key not in existing)
+            self.stdout.write(self.style.SUCCESS(f"Удалено снимков: {removed}"))
+
+        if not series_store_enabled():
+            self.stdout.write(self.style.WARNING(
+                "SERIES_STORE_ENABLED выключена: обучение и прогнозы читают значения из БД"
+            ))
@@ -0,0 +1,100 @@
+# Generated by Django 5.1.6 on 2025-04-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0003_remove_trained_model_field"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrainingJob",
+            fields=[
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("succeeded", "Завершена"),
+                            ("failed", "Ошибка"),
+                            ("cancelled", "Отменена"),
+                        ],
+                        default="queued",
+                        max_length=16,
+                        verbose_name="status",
+                    ),
+                ),
+                (
+                    "progress",
+                    models.PositiveSmallIntegerField(default=0, verbose_name="progress"),
+                ),
+                (
+                    "message",
+                    models.TextField(blank=True, default="", verbose_name="message"),
+                ),
+                (
+                    "result",
+                    models.JSONField(blank=True, null=True, verbose_name="result"),
+                ),
+                (
+                    "error",
+                    models.TextField(blank=True, null=True, verbose_name="error"),
+                ),
+                (
+                    "cancel_requested",
+                    models.BooleanField(default=False, verbose_name="cancel_requested"),
+                ),
+                (
+                    "worker_pid",
+                    models.IntegerField(blank=True, null=True, verbose_name="worker_pid"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created_at"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="started_at"),
+                ),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="heartbeat_at"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(blank=True, null=True, verbose_name="finished_at"),
+                ),
+                (
+                    "job_id",
+                    models.AutoField(
+                        primary_key=True, serialize=False, verbose_name="job_id"
+                    ),
+                ),
+                (
+                    "forecasting_model",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="training_jobs",
+                        to="databaseadmin.forecastingmodel",
+                        verbose_name="forecasting_model",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Training Job",
+                "verbose_name_plural": "Training Jobs",
+                "db_table": "training_jobs",
+                "managed": True,
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"], name="training_jobs_status_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.6 on 2025-04-26 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0004_trainingjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimeSeriesClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField(verbose_name="depth")),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="databaseadmin.timeseries",
+                        verbose_name="ancestor",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="databaseadmin.timeseries",
+                        verbose_name="descendant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Time Series Closure",
+                "verbose_name_plural": "Time Series Closure",
+                "db_table": "time_series_closure",
+                "managed": True,
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "depth"], name="ts_closure_descendant_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("ancestor", "descendant"),
+                        name="time_series_closure_pair_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO time_series_closure (ancestor_id, descendant_id, depth)
+                WITH RECURSIVE paths AS (
+                    SELECT time_series_id AS ancestor_id, time_series_id AS descendant_id, 0 AS depth
+                    FROM time_series
+
+                    UNION ALL
+
+                    SELECT p.ancestor_id, ts.time_series_id, p.depth + 1
+                    FROM paths p
+                    INNER JOIN time_series ts ON ts.parent_time_series_id = p.descendant_id
+                )
+                SELECT ancestor_id, descendant_id, depth FROM paths
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
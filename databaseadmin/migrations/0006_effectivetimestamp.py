@@ -0,0 +1,74 @@
+# Generated by Django 5.1.6 on 2025-04-27 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0005_timeseriesclosure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EffectiveTimestamp",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("value", models.TextField(verbose_name="value")),
+                ("start_dt", models.DateTimeField(verbose_name="start_dt")),
+                (
+                    "end_dt",
+                    models.DateTimeField(blank=True, null=True, verbose_name="end_dt"),
+                ),
+                (
+                    "source_timestamp_id",
+                    models.IntegerField(verbose_name="source_timestamp_id"),
+                ),
+                (
+                    "source_time_series_id",
+                    models.IntegerField(verbose_name="source_time_series_id"),
+                ),
+                ("depth", models.PositiveIntegerField(verbose_name="depth")),
+                (
+                    "attribute",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effective_timestamps",
+                        to="databaseadmin.attribute",
+                        verbose_name="attribute",
+                    ),
+                ),
+                (
+                    "time_series",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="effective_timestamps",
+                        to="databaseadmin.timeseries",
+                        verbose_name="time_series",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Effective Timestamp",
+                "verbose_name_plural": "Effective Timestamps",
+                "db_table": "effective_timestamps",
+                "managed": True,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("time_series", "attribute", "start_dt", "end_dt"),
+                        name="effective_timestamps_point_uniq",
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+    ]
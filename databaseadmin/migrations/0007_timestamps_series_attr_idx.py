@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2025-04-28 12:00
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в timestamps (CREATE INDEX CONCURRENTLY)
+    atomic = False
+
+    dependencies = [
+        ("databaseadmin", "0006_effectivetimestamp"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="timestamp",
+            index=models.Index(
+                fields=["time_series", "attribute", "start_dt"],
+                name="timestamps_series_attr_idx",
+            ),
+        ),
+        # Индекс внешнего ключа time_series_id покрыт составным индексом. AlterField пересоздал бы
+        # ограничение FOREIGN KEY с проверкой всей таблицы, поэтому индекс удаляется напрямую
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="timestamp",
+                    name="time_series",
+                    field=models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="databaseadmin.timeseries",
+                        verbose_name="time_series",
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    sql='DROP INDEX CONCURRENTLY IF EXISTS "timestamps_time_series_id_0e1e2029"',
+                    reverse_sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS "timestamps_time_series_id_0e1e2029" '
+                    'ON "timestamps" ("time_series_id")',
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.6 on 2025-04-29 12:00
+
+from django.db import migrations, models
+
+# Типы атрибутов, значения которых дублируются числом (Attribute.NUMERIC_DATA_TYPES на момент миграции)
+NUMERIC_DATA_TYPES = "'float', 'double', 'real', 'numeric', 'decimal', 'number', 'integer', 'int', 'bigint'"
+
+# Приведение текста к double precision, которое вместо ошибки «out of range» ('1e999', '1e-400')
+# возвращает NULL: иначе одна такая строка прервала бы заполнение value_num и всю миграцию.
+# Миграция 0013 повторяет CREATE OR REPLACE для баз, где 0008 применена до появления функции
+TO_DOUBLE_OR_NULL = """
+    CREATE OR REPLACE FUNCTION to_double_or_null(value text) RETURNS double precision
+    LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    BEGIN
+        RETURN value::double precision;
+    EXCEPTION WHEN numeric_value_out_of_range OR invalid_text_representation THEN
+        RETURN NULL;
+    END
+    $$
+"""
+
+NUMERIC_VALUE = r"""
+    CASE
+        WHEN btrim(t.value) ~ '^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$'
+        THEN to_double_or_null(btrim(t.value))
+    END
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0007_timestamps_series_attr_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="timestamp",
+            name="value_num",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="value_num"
+            ),
+        ),
+        migrations.AddField(
+            model_name="effectivetimestamp",
+            name="value_num",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="value_num"
+            ),
+        ),
+        migrations.RunSQL(
+            sql=TO_DOUBLE_OR_NULL,
+            reverse_sql="DROP FUNCTION IF EXISTS to_double_or_null(text)",
+        ),
+        migrations.RunSQL(
+            sql=f"""
+                UPDATE timestamps t
+                SET value_num = {NUMERIC_VALUE}
+                FROM attributes a
+                WHERE a.attribute_id = t.attribute_id
+                  AND lower(btrim(a.data_type)) IN ({NUMERIC_DATA_TYPES});
+
+                UPDATE effective_timestamps t
+                SET value_num = {NUMERIC_VALUE}
+                FROM attributes a
+                WHERE a.attribute_id = t.attribute_id
+                  AND lower(btrim(a.data_type)) IN ({NUMERIC_DATA_TYPES});
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
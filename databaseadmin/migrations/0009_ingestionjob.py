@@ -0,0 +1,166 @@
+# Generated by Django 5.1.6 on 2025-04-30 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0008_timestamp_value_num"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestionJob",
+            fields=[
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("succeeded", "Завершена"),
+                            ("failed", "Ошибка"),
+                            ("cancelled", "Отменена"),
+                        ],
+                        default="queued",
+                        max_length=16,
+                        verbose_name="status",
+                    ),
+                ),
+                (
+                    "progress",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="progress"
+                    ),
+                ),
+                (
+                    "message",
+                    models.TextField(blank=True, default="", verbose_name="message"),
+                ),
+                (
+                    "result",
+                    models.JSONField(blank=True, null=True, verbose_name="result"),
+                ),
+                (
+                    "error",
+                    models.TextField(blank=True, null=True, verbose_name="error"),
+                ),
+                (
+                    "cancel_requested",
+                    models.BooleanField(default=False, verbose_name="cancel_requested"),
+                ),
+                (
+                    "worker_pid",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="worker_pid"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created_at"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="started_at"
+                    ),
+                ),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="heartbeat_at"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="finished_at"
+                    ),
+                ),
+                (
+                    "job_id",
+                    models.AutoField(
+                        primary_key=True, serialize=False, verbose_name="job_id"
+                    ),
+                ),
+                (
+                    "model_name",
+                    models.CharField(
+                        choices=[
+                            ("product", "Product"),
+                            ("attribute", "Attribute"),
+                            ("timeseries", "TimeSeries"),
+                            ("timestamp", "Timestamp"),
+                        ],
+                        max_length=32,
+                        verbose_name="model_name",
+                    ),
+                ),
+                (
+                    "file_path",
+                    models.CharField(max_length=500, verbose_name="file_path"),
+                ),
+                (
+                    "original_name",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=255,
+                        verbose_name="original_name",
+                    ),
+                ),
+                (
+                    "file_size",
+                    models.BigIntegerField(default=0, verbose_name="file_size"),
+                ),
+                ("dedupe", models.BooleanField(default=False, verbose_name="dedupe")),
+                (
+                    "byte_offset",
+                    models.BigIntegerField(default=0, verbose_name="byte_offset"),
+                ),
+                (
+                    "line_number",
+                    models.BigIntegerField(default=0, verbose_name="line_number"),
+                ),
+                (
+                    "rows_processed",
+                    models.BigIntegerField(default=0, verbose_name="rows_processed"),
+                ),
+                (
+                    "rows_written",
+                    models.BigIntegerField(default=0, verbose_name="rows_written"),
+                ),
+                (
+                    "rows_updated",
+                    models.BigIntegerField(default=0, verbose_name="rows_updated"),
+                ),
+                (
+                    "rows_failed",
+                    models.BigIntegerField(default=0, verbose_name="rows_failed"),
+                ),
+                (
+                    "errors",
+                    models.JSONField(blank=True, default=list, verbose_name="errors"),
+                ),
+                (
+                    "pending_refresh",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="pending_refresh"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ingestion Job",
+                "verbose_name_plural": "Ingestion Jobs",
+                "db_table": "ingestion_jobs",
+                "managed": True,
+                "indexes": [
+                    models.Index(
+                        fields=["status", "created_at"],
+                        name="ingestion_jobs_status_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2025-05-01 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0009_ingestionjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingestionjob",
+            name="layout",
+            field=models.CharField(
+                choices=[("long", "long"), ("wide", "wide")],
+                default="long",
+                max_length=8,
+                verbose_name="layout",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2025-05-03 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0010_ingestionjob_layout"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CacheVersion",
+            fields=[
+                (
+                    "key",
+                    models.CharField(
+                        max_length=255,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="key",
+                    ),
+                ),
+                ("version", models.BigIntegerField(verbose_name="version")),
+            ],
+            options={
+                "verbose_name": "Cache version",
+                "verbose_name_plural": "Cache versions",
+                "db_table": "cache_versions",
+            },
+        ),
+        migrations.RunSQL(
+            sql="CREATE SEQUENCE cache_versions_seq",
+            reverse_sql="DROP SEQUENCE cache_versions_seq",
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2025-05-03 12:00
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    RemoveIndexConcurrently,
+)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Новый индекс строится без блокировки записи и до удаления прежнего, чтобы запросы
+    # не остались без индекса
+    atomic = False
+
+    dependencies = [
+        ("databaseadmin", "0011_cacheversion"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="timestamp",
+            index=models.Index(
+                fields=["time_series", "attribute", "start_dt"],
+                include=("value_num",),
+                name="timestamps_series_attr_num_idx",
+            ),
+        ),
+        RemoveIndexConcurrently(
+            model_name="timestamp",
+            name="timestamps_series_attr_idx",
+        ),
+    ]
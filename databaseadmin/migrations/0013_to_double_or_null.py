@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2025-05-04 12:00
+
+from django.db import migrations
+
+# Приведение текста к double precision, которое вместо ошибки «out of range»
+# (переполнение или потеря значимости, например '1e999', '1e-400') возвращает NULL.
+# Новые базы получают функцию ещё в 0008 (для заполнения value_num), здесь она создаётся
+# для баз, где 0008 применена раньше. Вызывается только для строк, уже прошедших проверку
+# регулярным выражением (databaseadmin.data_access.NUMERIC_VALUE_SQL): блок EXCEPTION
+# заметно дороже обычного приведения
+TO_DOUBLE_OR_NULL = """
+    CREATE OR REPLACE FUNCTION to_double_or_null(value text) RETURNS double precision
+    LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE AS $$
+    BEGIN
+        RETURN value::double precision;
+    EXCEPTION WHEN numeric_value_out_of_range OR invalid_text_representation THEN
+        RETURN NULL;
+    END
+    $$
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("databaseadmin", "0012_timestamps_series_attr_num_idx"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=TO_DOUBLE_OR_NULL,
+            reverse_sql="DROP FUNCTION IF EXISTS to_double_or_null(text)",
+        ),
+    ]
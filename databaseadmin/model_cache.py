@@ -0,0 +1,107 @@
+"""
+Кэш загруженных (распакованных из pickle) моделей прогнозирования в памяти процесса.
+Ключ - model_id и время изменения файла модели, поэтому после переобучения
+в другом процессе устаревшая запись не используется.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+
+class ModelCache:
+    """
+    LRU-кэш объектов моделей, ограниченный числом записей и суммарным размером файлов моделей.
+    Возвращаемые объекты общие для всех вызывающих - изменять их нельзя.
+    """
+
+    def __init__(self, max_items: int = 8, max_bytes: int = 512 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        # model_id -> (mtime_ns, размер файла, объект)
+        self._entries: 'OrderedDict[int, Tuple[int, int, Any]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0 and self.max_bytes > 0
+
+    def get(self, model_id: int, path: str, loader: Callable[[str], Any]) -> Optional[Any]:
+        """
+        Возвращает объект модели из кэша или загружает его через loader(path).
+        Если файла нет, запись удаляется и возвращается None.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.invalidate(model_id)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(model_id)
+            if entry is not None and entry[0] == stat.st_mtime_ns:
+                self._entries.move_to_end(model_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        model_object = loader(path)
+
+        if self.enabled and stat.st_size <= self.max_bytes:
+            with self._lock:
+                self._remove(model_id)
+                self._entries[model_id] = (stat.st_mtime_ns, stat.st_size, model_object)
+                self._bytes += stat.st_size
+                self._evict()
+
+        return model_object
+
+    def invalidate(self, model_id: int) -> None:
+        with self._lock:
+            if self._remove(model_id):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'items': len(self._entries),
+                'bytes': self._bytes,
+                'max_items': self.max_items,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'model_ids': list(self._entries),
+            }
+
+    def _remove(self, model_id: int) -> bool:
+        entry = self._entries.pop(model_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[1]
+        return True
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_items or self._bytes > self.max_bytes):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+
+model_cache = ModelCache(
+    max_items=getattr(settings, 'FORECASTING_MODEL_CACHE_SIZE', 8),
+    max_bytes=getattr(settings, 'FORECASTING_MODEL_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+)
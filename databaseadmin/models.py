@@ -1,8 +1,13 @@
 from django.db import models
-from django.db import connection
-from typing import List, Optional, TypedDict, TypeVar, Type
+from django.db import connection, transaction
+from typing import Dict, List, Optional, Tuple, TypedDict, TypeVar, Type
 from datetime import datetime
 from django.db.models import QuerySet
+from . import effective
+from .data_access import numeric_value_sql, parse_numeric_value
+from .hierarchy_cache import hierarchy_cache
+from .hierarchy_query import HierarchyQuery
+from .rollups import aggregate_subtree
 class HierarchyDict(TypedDict):
     id: int
     name: str
@@ -40,6 +45,9 @@ class Product(models.Model):
         return f"{self.name} (ID: {self.product_id})"
 
 class Attribute(models.Model):
+    # Значения атрибутов с этими типами дублируются числом в Timestamp.value_num
+    NUMERIC_DATA_TYPES = ('float', 'double', 'real', 'numeric', 'decimal', 'number', 'integer', 'int', 'bigint')
+
     attribute_id: models.AutoField = models.AutoField(primary_key=True, verbose_name="attribute_id")
     name: models.TextField = models.TextField(verbose_name="name")
     data_type: models.TextField = models.TextField(verbose_name="data_type")
@@ -56,6 +64,31 @@ class Attribute(models.Model):
     def display_name(self) -> str:
         return f"{self.name} (ID: {self.attribute_id})"
 
+    @classmethod
+    def is_numeric_type(cls, data_type: Optional[str]) -> bool:
+        return (data_type or '').strip().lower() in cls.NUMERIC_DATA_TYPES
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.is_numeric_type(self.data_type)
+
+    def to_number(self, value: Optional[str]) -> Optional[float]:
+        """Значение для value_num: число для числовых атрибутов, иначе None"""
+        return parse_numeric_value(value) if self.is_numeric else None
+
+    def refresh_value_num(self) -> int:
+        """Пересчитывает value_num таймстемпов атрибута по текущему data_type. Возвращает число изменённых строк"""
+        number = numeric_value_sql('value') if self.is_numeric else 'NULL::double precision'
+        updated = 0
+        with connection.cursor() as cursor:
+            for table in ('ts_schema.timestamps', 'ts_schema.effective_timestamps'):
+                cursor.execute(f"""
+                    UPDATE {table} SET value_num = {number}
+                    WHERE attribute_id = %s AND value_num IS DISTINCT FROM {number}
+                """, [self.attribute_id])
+                updated += cursor.rowcount
+        return updated
+
 class TimeSeries(models.Model):
     time_series_id: models.AutoField = models.AutoField(primary_key=True, verbose_name="time_series_id")
     parent_time_series: models.ForeignKey = models.ForeignKey(
@@ -77,6 +110,16 @@ class TimeSeries(models.Model):
     def display_name(self) -> str:
         return f"{self.name} (ID: {self.time_series_id})"
 
+    def clean(self) -> None:
+        """Не даёт выбрать родителем сам ряд или его потомка"""
+        from django.core.exceptions import ValidationError
+        from .hierarchy import is_descendant
+
+        parent_id = self.parent_time_series_id
+        if self.pk is not None and parent_id is not None:
+            if parent_id == self.pk or is_descendant(parent_id, self.pk):
+                raise ValidationError({'parent_time_series': 'Ряд нельзя сделать потомком самого себя'})
+
     def has_parent_forecasting_model(self) -> bool:
         """Проверяет, существует ли модель прогнозирования для родительского ряда"""
         if not self.parent_time_series:
@@ -99,58 +142,44 @@ class TimeSeries(models.Model):
             attribute_id=attribute_id
         ).order_by('start_dt')
 
+    def get_descendant_ids(self) -> List[int]:
+        """Возвращает ID всех потомков ряда (без самого ряда) по таблице замыкания"""
+        return list(TimeSeriesClosure.objects.filter(
+            ancestor_id=self.time_series_id, depth__gt=0
+        ).order_by('descendant_id').values_list('descendant_id', flat=True))
+
     @classmethod
     def get_available_series(cls: Type['TimeSeries']) -> QuerySet['TimeSeries']:
         return cls.objects.all().order_by('time_series_id')
 
-    def get_hierarchy_data(self) -> List[TimestampDict]:
-        """Получает все таймстемпы для данного временного ряда и его родительских рядов"""
+    def get_hierarchy_data(self, use_cache: bool = True) -> List[TimestampDict]:
+        """
+        Получает все таймстемпы для данного временного ряда и его родительских рядов.
+        Результат кэшируется до изменения таймстемпов ряда или его предков (hierarchy_cache).
+        """
+        if use_cache:
+            return hierarchy_cache.get_or_compute(
+                self.time_series_id, ('data',), lambda: self.get_hierarchy_data(use_cache=False))
+
+        if effective.is_enabled():
+            return self._get_effective_hierarchy_data()
+
         with connection.cursor() as cursor:
+            # Предки ряда берутся из таблицы замыкания; для каждой точки остаётся значение ближайшего ряда
             cursor.execute("""
-                WITH RECURSIVE ts_hierarchy AS (
-                    SELECT 
-                        ts_root.time_series_id AS root_time_series_id, 
-                        ts.time_series_id, 
-                        ts.parent_time_series_id, 
-                        1 AS depth 
-                    FROM ts_schema.time_series ts_root
-                    INNER JOIN ts_schema.time_series ts ON ts_root.time_series_id = ts.time_series_id
-
-                    UNION ALL
-
-                    SELECT 
-                        th.root_time_series_id, 
-                        ts.time_series_id, 
-                        ts.parent_time_series_id, 
-                        th.depth + 1 
-                    FROM ts_schema.time_series ts
-                    INNER JOIN ts_hierarchy th ON th.parent_time_series_id = ts.time_series_id
-                )
-                , all_timestamps AS (
-                    SELECT 
-                        th.root_time_series_id,
-                        t.timestamp_id,
-                        t.time_series_id AS initial_time_series_id,
-                        t.attribute_id,
-                        t.value,
-                        t.start_dt,
-                        t.end_dt,
-                        th.depth
-                    FROM ts_schema.timestamps t
-                    INNER JOIN ts_hierarchy th ON t.time_series_id = th.time_series_id
-                )
-                SELECT DISTINCT ON (root_time_series_id, attribute_id, start_dt, end_dt)
-                    root_time_series_id,
-                    timestamp_id,
-                    initial_time_series_id,
-                    attribute_id,
-                    value,
-                    start_dt,
-                    end_dt,
-                    depth
-                FROM all_timestamps
-                WHERE root_time_series_id = %s
-                ORDER BY root_time_series_id, attribute_id, start_dt, end_dt, depth ASC
+                SELECT DISTINCT ON (t.attribute_id, t.start_dt, t.end_dt)
+                    c.descendant_id AS root_time_series_id,
+                    t.timestamp_id,
+                    t.time_series_id AS initial_time_series_id,
+                    t.attribute_id,
+                    t.value,
+                    t.start_dt,
+                    t.end_dt,
+                    c.depth + 1 AS depth
+                FROM ts_schema.time_series_closure c
+                INNER JOIN ts_schema.timestamps t ON t.time_series_id = c.ancestor_id
+                WHERE c.descendant_id = %s
+                ORDER BY t.attribute_id, t.start_dt, t.end_dt, c.depth ASC, t.timestamp_id DESC
             """, [self.time_series_id])
             
             if cursor.description is None:
@@ -162,40 +191,169 @@ class TimeSeries(models.Model):
                 for row in cursor.fetchall()
             ]
 
+    def _get_effective_hierarchy_data(self) -> List[TimestampDict]:
+        """То же, что get_hierarchy_data, из материализованной таблицы effective_timestamps"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    time_series_id AS root_time_series_id,
+                    source_timestamp_id AS timestamp_id,
+                    source_time_series_id AS initial_time_series_id,
+                    attribute_id,
+                    value,
+                    start_dt,
+                    end_dt,
+                    depth
+                FROM ts_schema.effective_timestamps
+                WHERE time_series_id = %s
+                ORDER BY attribute_id, start_dt, end_dt
+            """, [self.time_series_id])
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]  # type: ignore
+
+    def query_hierarchy_data(self) -> 'HierarchyQuery':
+        """То же, что get_hierarchy_data, но с фильтрами, сортировкой и страницами на стороне БД"""
+        return HierarchyQuery(self.time_series_id)
+
+    def aggregate_subtree(self, attribute_id: int, func: str = 'sum', bucket: str = 'day',
+                          start: Optional[datetime] = None, end: Optional[datetime] = None,
+                          include_self: bool = True) -> List[Dict[str, object]]:
+        """Агрегат атрибута по ряду и всем его потомкам по периодам (см. rollups.aggregate_subtree)"""
+        return aggregate_subtree(self.time_series_id, attribute_id, func=func, bucket=bucket,
+                                 start=start, end=end, include_self=include_self)
+
+    @staticmethod
+    def _build_hierarchy(rows: List[Tuple[int, Optional[int], str, str]], root_ids: List[int]) -> List[HierarchyDict]:
+        """Собирает вложенную структуру из строк (id, parent_id, name, product)"""
+        nodes: Dict[int, HierarchyDict] = {}
+        children_of: Dict[Optional[int], List[int]] = {}
+        for series_id, parent_id, name, product in rows:
+            nodes[series_id] = {'id': series_id, 'name': name, 'product': product, 'children': []}
+            children_of.setdefault(parent_id, []).append(series_id)
+
+        for parent_id, child_ids in children_of.items():
+            if parent_id in nodes:
+                nodes[parent_id]['children'] = [nodes[child_id] for child_id in child_ids]
+
+        return [nodes[root_id] for root_id in root_ids if root_id in nodes]
+
     def get_hierarchy(self) -> HierarchyDict:
-        """Возвращает иерархическую структуру временных рядов"""
-        hierarchy: HierarchyDict = {
+        """Возвращает иерархическую структуру временных рядов (одним запросом по таблице замыкания)"""
+        rows = list(TimeSeries.objects.filter(
+            ancestor_links__ancestor_id=self.time_series_id
+        ).order_by('ancestor_links__depth', 'time_series_id').values_list(
+            'time_series_id', 'parent_time_series_id', 'name', 'product__name'
+        ))
+        hierarchy = self._build_hierarchy(rows, [self.time_series_id])
+        if hierarchy:
+            return hierarchy[0]
+        return {
             'id': self.time_series_id,
             'name': self.name,
             'product': self.product.name,
             'children': []
         }
-        
-        children: QuerySet['TimeSeries'] = TimeSeries.objects.filter(parent_time_series=self)
-        for child in children:
-            hierarchy['children'].append(child.get_hierarchy())
-            
-        return hierarchy
 
     @classmethod
     def get_root_hierarchy(cls: Type['TimeSeries']) -> List[HierarchyDict]:
         """Возвращает иерархию всех корневых временных рядов"""
-        root_series: QuerySet['TimeSeries'] = cls.objects.filter(parent_time_series__isnull=True)
-        return [series.get_hierarchy() for series in root_series]
+        rows = list(cls.objects.order_by('time_series_id').values_list(
+            'time_series_id', 'parent_time_series_id', 'name', 'product__name'
+        ))
+        root_ids = [series_id for series_id, parent_id, _, _ in rows if parent_id is None]
+        return cls._build_hierarchy(rows, root_ids)
+
+
+class TimeSeriesClosure(models.Model):
+    """
+    Таблица замыкания иерархии рядов: строка на каждую пару (предок, потомок),
+    включая пару ряда с самим собой (depth = 0).
+    Поддерживается сигналами TimeSeries (см. databaseadmin.hierarchy),
+    полная перестройка - manage.py rebuild_time_series_closure.
+    """
+    ancestor: models.ForeignKey = models.ForeignKey(
+        TimeSeries, on_delete=models.CASCADE, related_name='descendant_links', verbose_name="ancestor"
+    )
+    descendant: models.ForeignKey = models.ForeignKey(
+        TimeSeries, on_delete=models.CASCADE, related_name='ancestor_links', verbose_name="descendant"
+    )
+    depth: models.PositiveIntegerField = models.PositiveIntegerField(verbose_name="depth")
+
+    class Meta:
+        db_table = 'time_series_closure'
+        verbose_name = "Time Series Closure"
+        verbose_name_plural = "Time Series Closure"
+        managed = True
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='time_series_closure_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='ts_closure_descendant_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+class TimestampQuerySet(models.QuerySet):
+    # Больше удалённых точек effective_timestamps пересчитываются целиком по рядам и атрибутам
+    EFFECTIVE_POINTS_LIMIT = 10_000
+
+    def delete(self) -> Tuple[int, Dict[str, int]]:
+        """
+        Удаляет таймстемпы, пересчитывает effective_timestamps их рядов и потомков
+        и сбрасывает кэш иерархии.
+        Сигнал post_delete для Timestamp не подключён (см. signals.py), поэтому зависящие
+        от таймстемпов данные обновляют delete() набора и модели: так их вызывает и админка.
+        """
+        with transaction.atomic():
+            rows = self.order_by()
+            series_ids = list(rows.values_list('time_series_id', flat=True).distinct())
+            points = None
+            if effective.is_enabled():
+                points = list(rows.values_list('attribute_id', 'start_dt').distinct()[:self.EFFECTIVE_POINTS_LIMIT + 1])
+                if len(points) > self.EFFECTIVE_POINTS_LIMIT:
+                    attribute_ids = list(rows.values_list('attribute_id', flat=True).distinct())
+                    points = None
+            result = super().delete()
+            if effective.is_enabled():
+                if points is not None:
+                    effective.refresh(series_ids, points=points)
+                else:
+                    effective.refresh(series_ids, attribute_ids=attribute_ids)
+            hierarchy_cache.invalidate_series(*series_ids)
+        return result
+
 
 class Timestamp(models.Model):
     timestamp_id: models.AutoField = models.AutoField(primary_key=True, verbose_name="timestamp_id")
-    time_series: models.ForeignKey = models.ForeignKey(TimeSeries, on_delete=models.CASCADE, verbose_name="time_series")
+    # Отдельный индекс по ряду не нужен: time_series_id - первый столбец составного индекса
+    time_series: models.ForeignKey = models.ForeignKey(
+        TimeSeries, on_delete=models.CASCADE, db_index=False, verbose_name="time_series"
+    )
     attribute: models.ForeignKey = models.ForeignKey(Attribute, on_delete=models.CASCADE, verbose_name="attribute")
     value: models.TextField = models.TextField(verbose_name="value")
+    # Числовое значение для числовых атрибутов (Attribute.is_numeric), вычисляется из value при сохранении
+    value_num: models.FloatField = models.FloatField(null=True, blank=True, editable=False, verbose_name="value_num")
     start_dt: models.DateTimeField = models.DateTimeField(verbose_name="start_dt")
     end_dt: models.DateTimeField = models.DateTimeField(null=True, blank=True, verbose_name="end_dt")
 
+    objects = TimestampQuerySet.as_manager()
+
     class Meta:
         db_table = 'timestamps'
         verbose_name = "Timestamp"
         verbose_name_plural = "Timestamps"
         managed = True
+        indexes = [
+            # Запросы обучения, прогнозов, иерархии и дерева выбирают ряд и атрибут по порядку start_dt;
+            # value_num в INCLUDE позволяет читать числовые значения только из индекса (Index Only Scan).
+            # value (text без ограничения длины) в индекс не входит: строка индекса ограничена ~2.7 КБ
+            models.Index(
+                fields=['time_series', 'attribute', 'start_dt'],
+                include=['value_num'],
+                name='timestamps_series_attr_num_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.time_series.name} - {self.attribute.name}: {self.value}"
@@ -203,6 +361,59 @@ class Timestamp(models.Model):
     def display_name(self) -> str:
         return f"{self.time_series.name} - {self.attribute.name}: {self.value} (ID: {self.timestamp_id})"
 
+    def save(self, *args, **kwargs) -> None:
+        if self.attribute_id is not None:
+            self.value_num = self.attribute.to_number(self.value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'value' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'value_num'}
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs) -> Tuple[int, Dict[str, int]]:
+        """Удаляет таймстемп, пересчитывает его точку в effective_timestamps и сбрасывает кэш иерархии"""
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            effective.refresh([self.time_series_id], points=[(self.attribute_id, self.start_dt)])
+            hierarchy_cache.invalidate_series(self.time_series_id)
+        return result
+
+class EffectiveTimestamp(models.Model):
+    """
+    Материализованные таймстемпы иерархии: для каждого ряда и точки (attribute, start_dt, end_dt)
+    значение ближайшего ряда среди самого ряда и его предков, как в get_hierarchy_data.
+    Ведётся только при EFFECTIVE_TIMESTAMPS_ENABLED (см. databaseadmin.effective),
+    полная перестройка - manage.py rebuild_effective_timestamps.
+    """
+    time_series: models.ForeignKey = models.ForeignKey(
+        TimeSeries, on_delete=models.CASCADE, related_name='effective_timestamps', verbose_name="time_series"
+    )
+    attribute: models.ForeignKey = models.ForeignKey(
+        Attribute, on_delete=models.CASCADE, related_name='effective_timestamps', verbose_name="attribute"
+    )
+    value: models.TextField = models.TextField(verbose_name="value")
+    value_num: models.FloatField = models.FloatField(null=True, blank=True, editable=False, verbose_name="value_num")
+    start_dt: models.DateTimeField = models.DateTimeField(verbose_name="start_dt")
+    end_dt: models.DateTimeField = models.DateTimeField(null=True, blank=True, verbose_name="end_dt")
+    source_timestamp_id: models.IntegerField = models.IntegerField(verbose_name="source_timestamp_id")
+    source_time_series_id: models.IntegerField = models.IntegerField(verbose_name="source_time_series_id")
+    depth: models.PositiveIntegerField = models.PositiveIntegerField(verbose_name="depth")
+
+    class Meta:
+        db_table = 'effective_timestamps'
+        verbose_name = "Effective Timestamp"
+        verbose_name_plural = "Effective Timestamps"
+        managed = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=['time_series', 'attribute', 'start_dt', 'end_dt'],
+                name='effective_timestamps_point_uniq',
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.time_series_id} - {self.attribute_id} @ {self.start_dt}: {self.value}"
+
 class ForecastingModel(models.Model):
     model_id = models.AutoField(primary_key=True, verbose_name="model_id")
     time_series = models.ForeignKey('TimeSeries', on_delete=models.CASCADE, verbose_name="time_series")
@@ -222,9 +433,15 @@ class ForecastingModel(models.Model):
         return f"ForecastingModel {self.model_id} ({self.time_series.name})"
     
     def save_model_object(self, model_object):
-        """Сохраняет объект модели в файл вместо бинарного поля"""
+        """
+        Сохраняет объект модели в файл вместо бинарного поля.
+        SARIMAXAutoForecaster при FORECASTING_MODEL_FORMAT = 'compact' сохраняется
+        в компактном формате .npz (см. databaseadmin.artifacts), остальное - через pickle.
+        """
         import os
         import pickle
+        import logging
+        from django.conf import settings
         
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         temp_dir = os.path.join(base_dir, 'models')
@@ -233,21 +450,227 @@ class ForecastingModel(models.Model):
         model_dir = os.path.join(temp_dir, f'model_dir_{self.model_id}')
         os.makedirs(model_dir, exist_ok=True)
         
-        file_path = os.path.join(model_dir, f'model_{self.model_id}.pkl')
+        pickle_path = os.path.join(model_dir, f'model_{self.model_id}.pkl')
+        compact_path = os.path.join(model_dir, f'model_{self.model_id}.npz')
+        file_path = None
+        
+        if getattr(settings, 'FORECASTING_MODEL_FORMAT', 'compact') == 'compact':
+            from .artifacts import save_compact_forecaster
+            from .forecasting import SARIMAXAutoForecaster
+            
+            if isinstance(model_object, SARIMAXAutoForecaster) and model_object.best_model_ is not None:
+                try:
+                    save_compact_forecaster(model_object, compact_path)
+                    file_path = compact_path
+                except ValueError as e:
+                    logging.warning(f"Модель {self.model_id} сохраняется через pickle: {str(e)}")
+        
+        if file_path is None:
+            with open(pickle_path, 'wb') as f:
+                pickle.dump(model_object, f)
+            file_path = pickle_path
         
-        with open(file_path, 'wb') as f:
-            pickle.dump(model_object, f)
+        # Файл в другом формате от предыдущего обучения больше не актуален
+        for stale_path in (pickle_path, compact_path):
+            if stale_path != file_path and os.path.exists(stale_path):
+                os.remove(stale_path)
+        
+        from .model_cache import model_cache
+        model_cache.invalidate(self.model_id)
         
         self.model_file_path = file_path
         self.save(update_fields=['model_file_path'])
     
-    def load_model_object(self):
-        """Загружает объект модели из файла"""
+    def load_model_object(self, use_cache: bool = True):
+        """
+        Загружает объект модели из файла (.npz - компактный формат, иначе pickle).
+        По умолчанию объект берётся из кэша процесса (см. databaseadmin.model_cache)
+        и является общим для всех вызывающих - его нельзя изменять.
+        """
         import pickle
         import os
         
-        if self.model_file_path and os.path.exists(self.model_file_path):
-            with open(self.model_file_path, 'rb') as f:
+        def load(path):
+            if path.endswith('.npz'):
+                from .artifacts import load_compact_forecaster
+                return load_compact_forecaster(path)
+            with open(path, 'rb') as f:
                 return pickle.load(f)
         
-        return None
\ No newline at end of file
+        if not self.model_file_path:
+            return None
+        
+        if use_cache:
+            from .model_cache import model_cache
+            return model_cache.get(self.model_id, self.model_file_path, load)
+        
+        if os.path.exists(self.model_file_path):
+            return load(self.model_file_path)
+        
+        return None
+
+class BackgroundJob(models.Model):
+    """
+    Базовая модель фоновой задачи, выполняемой воркером (manage.py run_worker).
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_SUCCEEDED, 'Завершена'),
+        (STATUS_FAILED, 'Ошибка'),
+        (STATUS_CANCELLED, 'Отменена'),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name="status")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="progress")
+    message = models.TextField(blank=True, default='', verbose_name="message")
+    result = models.JSONField(null=True, blank=True, verbose_name="result")
+    error = models.TextField(null=True, blank=True, verbose_name="error")
+    cancel_requested = models.BooleanField(default=False, verbose_name="cancel_requested")
+    worker_pid = models.IntegerField(null=True, blank=True, verbose_name="worker_pid")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="created_at")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="started_at")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="heartbeat_at")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="finished_at")
+
+    class Meta:
+        abstract = True
+
+    def request_cancel(self) -> None:
+        """Отменяет задачу в очереди или просит воркер остановить выполняющуюся"""
+        from django.utils import timezone
+
+        if self.status == self.STATUS_QUEUED:
+            self.status = self.STATUS_CANCELLED
+            self.finished_at = timezone.now()
+        self.cancel_requested = True
+        self.save(update_fields=['status', 'finished_at', 'cancel_requested'])
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.pk,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+class TrainingJob(BackgroundJob):
+    job_id = models.AutoField(primary_key=True, verbose_name="job_id")
+    forecasting_model = models.ForeignKey('ForecastingModel', on_delete=models.CASCADE,
+                                          related_name='training_jobs', verbose_name="forecasting_model")
+
+    class Meta:
+        db_table = 'training_jobs'
+        verbose_name = "Training Job"
+        verbose_name_plural = "Training Jobs"
+        managed = True
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='training_jobs_status_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"TrainingJob {self.job_id} (model {self.forecasting_model_id}, {self.status})"
+
+    def to_dict(self) -> dict:
+        data = super().to_dict()
+        data['model_id'] = self.forecasting_model_id
+        return data
+
+class IngestionJob(BackgroundJob):
+    """
+    Фоновый импорт CSV из файла в каталоге INGESTION_STAGING_DIR (databaseadmin.ingestion).
+    Файл записывается частями, каждая в своей транзакции вместе с контрольной точкой
+    (byte_offset, line_number), поэтому прерванная задача продолжается с последней записанной части.
+    """
+    MODEL_CHOICES = [
+        ('product', 'Product'),
+        ('attribute', 'Attribute'),
+        ('timeseries', 'TimeSeries'),
+        ('timestamp', 'Timestamp'),
+    ]
+
+    job_id = models.AutoField(primary_key=True, verbose_name="job_id")
+    model_name = models.CharField(max_length=32, choices=MODEL_CHOICES, verbose_name="model_name")
+    file_path = models.CharField(max_length=500, verbose_name="file_path")
+    original_name = models.CharField(max_length=255, blank=True, default='', verbose_name="original_name")
+    file_size = models.BigIntegerField(default=0, verbose_name="file_size")
+    dedupe = models.BooleanField(default=False, verbose_name="dedupe")
+    # long - строка на таймстемп, wide - строка на (ряд, start_dt) со столбцом на атрибут (databaseadmin.wide_format)
+    layout = models.CharField(max_length=8, choices=[('long', 'long'), ('wide', 'wide')], default='long',
+                              verbose_name="layout")
+    # Контрольная точка: позиция в файле и число прочитанных строк файла (с заголовком) после последней записанной части
+    byte_offset = models.BigIntegerField(default=0, verbose_name="byte_offset")
+    line_number = models.BigIntegerField(default=0, verbose_name="line_number")
+    rows_processed = models.BigIntegerField(default=0, verbose_name="rows_processed")
+    rows_written = models.BigIntegerField(default=0, verbose_name="rows_written")
+    rows_updated = models.BigIntegerField(default=0, verbose_name="rows_updated")
+    rows_failed = models.BigIntegerField(default=0, verbose_name="rows_failed")
+    errors = models.JSONField(default=list, blank=True, verbose_name="errors")
+    # Ряды, для которых после импорта нужно пересчитать effective_timestamps и сбросить кэш иерархии
+    pending_refresh = models.JSONField(default=dict, blank=True, verbose_name="pending_refresh")
+
+    class Meta:
+        db_table = 'ingestion_jobs'
+        verbose_name = "Ingestion Job"
+        verbose_name_plural = "Ingestion Jobs"
+        managed = True
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='ingestion_jobs_status_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"IngestionJob {self.job_id} ({self.model_name}, {self.original_name}, {self.status})"
+
+    def import_model(self) -> type:
+        """Модель, в которую импортируется файл"""
+        from django.apps import apps
+
+        return apps.get_model('databaseadmin', self.model_name)
+
+    def to_dict(self) -> dict:
+        data = super().to_dict()
+        data.update({
+            'model': self.model_name,
+            'original_name': self.original_name,
+            'file_size': self.file_size,
+            'dedupe': self.dedupe,
+            'layout': self.layout,
+            'byte_offset': self.byte_offset,
+            'line_number': self.line_number,
+            'processed': self.rows_processed,
+            'success_count': self.rows_written,
+            'updated_count': self.rows_updated,
+            'error_count': self.rows_failed,
+            'errors': self.errors,
+        })
+        return data
+
+
+class CacheVersion(models.Model):
+    """
+    Версия данных для ключей кэша и ETag (см. databaseadmin.cache_versions).
+    Хранится в БД, чтобы изменение в одном процессе видели все веб-процессы и воркер.
+    """
+    key = models.CharField(max_length=255, primary_key=True, verbose_name="key")
+    version = models.BigIntegerField(verbose_name="version")
+
+    class Meta:
+        db_table = 'cache_versions'
+        verbose_name = "Cache version"
+        verbose_name_plural = "Cache versions"
+
+    def __str__(self) -> str:
+        return f"{self.key}: {self.version}"
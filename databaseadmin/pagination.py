@@ -0,0 +1,334 @@
+"""
+Постраничный вывод без OFFSET и полного COUNT(*): курсоры по ключам сортировки
+(keyset pagination) и оценка числа строк по плану запроса.
+"""
+import base64
+import json
+import math
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models
+from django.db.models import Q, QuerySet
+
+# Ниже этого порога оценку планировщика заменяет точный COUNT(*)
+EXACT_COUNT_THRESHOLD = 1_000
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Кодирует значения ключей сортировки строки в строку для URL"""
+    def encode(value: Any) -> Any:
+        if isinstance(value, datetime):
+            return {'dt': value.isoformat()}
+        if isinstance(value, date):
+            return {'d': value.isoformat()}
+        return value
+
+    payload = json.dumps([encode(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> List[Any]:
+    """
+    Обратное преобразование для encode_cursor.
+
+    Raises:
+        ValueError: Если курсор повреждён
+    """
+    def decode(value: Any) -> Any:
+        if isinstance(value, dict):
+            if 'dt' in value:
+                return datetime.fromisoformat(value['dt'])
+            if 'd' in value:
+                return date.fromisoformat(value['d'])
+        return value
+
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(payload)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Некорректный курсор: {str(e)}")
+    if not isinstance(values, list):
+        raise ValueError("Некорректный курсор")
+    return [decode(value) for value in values]
+
+
+def keyset_condition(keys: Sequence[Tuple[str, bool]], values: Sequence[Any]) -> Tuple[str, List[Any]]:
+    """
+    Условие «строка идёт после курсора» для сортировки keys = [(выражение, по убыванию), ...].
+    При разных направлениях сортировки сравнение кортежей не подходит, поэтому условие
+    раскрывается: k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...
+    Выражения ключей не должны принимать NULL.
+    """
+    if len(keys) != len(values):
+        raise ValueError("Курсор не соответствует сортировке")
+
+    clauses = []
+    params: List[Any] = []
+    for position, (expression, descending) in enumerate(keys):
+        parts = [f"{prefix_expression} = %s" for prefix_expression, _ in keys[:position]]
+        parts.append(f"{expression} {'<' if descending else '>'} %s")
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:position + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def estimate_count(sql: str, params: Sequence[Any]) -> int:
+    """Оценка числа строк запроса по плану (EXPLAIN), без его выполнения"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimate_table_count(table: str) -> Optional[int]:
+    """
+    Оценка числа строк таблицы по pg_class.reltuples; None, если таблица ещё не анализировалась.
+    Как и планировщик, пересчитывает плотность строк со времени ANALYZE на текущий размер таблицы.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT CASE WHEN reltuples < 0 THEN NULL
+                        WHEN relpages = 0 THEN reltuples::bigint
+                        ELSE (reltuples / relpages
+                              * (pg_relation_size(oid) / current_setting('block_size')::int))::bigint
+                   END
+            FROM pg_class
+            WHERE oid = to_regclass(%s)
+        """, [table])
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return int(row[0])
+
+
+def count_rows(sql: str, params: Sequence[Any], threshold: int = EXACT_COUNT_THRESHOLD) -> Tuple[int, bool]:
+    """
+    Число строк запроса: оценка планировщика, а если она меньше threshold - точный COUNT(*).
+    Возвращает (число, является ли оно оценкой).
+    """
+    estimate = estimate_count(sql, params)
+    if estimate >= threshold:
+        return estimate, True
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM ({sql}) AS counted", params)
+        return cursor.fetchone()[0], False
+
+
+class KeysetPage:
+    """
+    Страница результатов с курсорами на соседние страницы.
+    Повторяет используемую в шаблонах часть интерфейса django.core.paginator.Page.
+    """
+
+    def __init__(self, object_list: List[Any], number: int, per_page: int,
+                 has_next: bool, has_previous: bool,
+                 next_cursor: Optional[str], previous_cursor: Optional[str],
+                 count: Optional[int] = None, count_is_estimate: bool = False):
+        self.object_list = object_list
+        self.number = number
+        self.per_page = per_page
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_is_estimate = count_is_estimate
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+    def next_page_number(self) -> int:
+        return self.number + 1
+
+    def previous_page_number(self) -> int:
+        return max(1, self.number - 1)
+
+    @property
+    def num_pages(self) -> Optional[int]:
+        if self.count is None:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def start_index(self) -> int:
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.per_page + 1
+
+    def end_index(self) -> int:
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+def keyset_filter(keys: Sequence[Tuple[str, bool]], values: Sequence[Any]) -> Optional[Q]:
+    """
+    Условие ORM «строка идёт после курсора» для сортировки keys = [(поле, по убыванию), ...],
+    вариант keyset_condition для QuerySet. Поля могут принимать NULL: как и в PostgreSQL,
+    NULL идёт после всех значений при сортировке по возрастанию и перед ними - по убыванию.
+    Возвращает None, если после курсора строк быть не может.
+    """
+    if len(keys) != len(values):
+        raise ValueError("Курсор не соответствует сортировке")
+
+    condition: Optional[Q] = None
+    prefix = Q()
+    for (field, descending), value in zip(keys, values):
+        if value is None:
+            after = Q(**{f"{field}__isnull": False}) if descending else None
+            equal = Q(**{f"{field}__isnull": True})
+        else:
+            after = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+            if not descending:
+                after |= Q(**{f"{field}__isnull": True})
+            equal = Q(**{field: value})
+        if after is not None:
+            clause = prefix & after
+            condition = clause if condition is None else condition | clause
+        prefix &= equal
+    return condition
+
+
+def _key_value(row: Any, field: str) -> Any:
+    """Значение ключа сортировки строки: экземпляра модели или словаря values()"""
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод QuerySet (в том числе values()) по курсорам вместо OFFSET,
+    с оценкой числа строк вместо COUNT(*).
+
+    Ключи - поля сортировки QuerySet (order_by, например из apply_sorting) и первичный ключ,
+    который делает порядок однозначным. Соседние страницы выбираются по курсору (значения ключей
+    первой или последней строки), поэтому не зависят от глубины страницы. Переход к произвольной
+    странице без курсора выполняется через OFFSET. Если сортировка идёт по полю, значения которого
+    нельзя сравнивать (JSON), все страницы выбираются через OFFSET.
+
+    Число строк без фильтров берётся из pg_class.reltuples, с фильтрами - из плана запроса (EXPLAIN);
+    если оценка меньше exact_count_threshold, выполняется точный COUNT(*).
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int = 50,
+                 exact_count_threshold: int = EXACT_COUNT_THRESHOLD):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.exact_count_threshold = exact_count_threshold
+        self.keys = self._keys()
+
+    def _keys(self) -> Optional[List[Tuple[str, bool]]]:
+        """Ключи сортировки [(attname, по убыванию), ...] или None, если курсоры неприменимы"""
+        opts = self.queryset.model._meta
+        keys: List[Tuple[str, bool]] = []
+        for item in self.queryset.query.order_by:
+            if not isinstance(item, str) or item == '?' or '__' in item:
+                return None
+            name = item.lstrip('-')
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except Exception:
+                return None
+            if not field.concrete or isinstance(field, models.JSONField):
+                return None
+            if field.attname not in (key for key, _ in keys):
+                keys.append((field.attname, item.startswith('-')))
+        if opts.pk.attname not in (key for key, _ in keys):
+            keys.append((opts.pk.attname, False))
+        return keys
+
+    def count(self) -> Tuple[int, bool]:
+        """Число строк: (число, является ли оно оценкой)"""
+        queryset = self.queryset.order_by()
+        if not queryset.query.where:
+            estimate = estimate_table_count(queryset.model._meta.db_table)
+            if estimate is not None and estimate >= self.exact_count_threshold:
+                return estimate, True
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0, False
+        return count_rows(sql, params, self.exact_count_threshold)
+
+    def page(self, number: int = 1, cursor: Optional[str] = None, backwards: bool = False,
+             with_count: bool = True) -> KeysetPage:
+        """
+        Возвращает одну страницу, как HierarchyQuery.page.
+
+        Без курсора страница number выбирается через OFFSET. С курсором - строки сразу после
+        (backwards=True - перед) строкой курсора; number тогда только подписывает страницу.
+
+        Raises:
+            ValueError: Курсор повреждён или не соответствует сортировке
+        """
+        count, count_is_estimate = self.count() if with_count else (None, False)
+        if self.keys is None:
+            cursor = None
+
+        queryset = self.queryset
+        offset = 0
+        if cursor:
+            keys = [(field, descending != backwards) for field, descending in self.keys]
+            condition = keyset_filter(keys, decode_cursor(cursor))
+            queryset = queryset.filter(condition) if condition is not None else queryset.none()
+        else:
+            backwards = False
+            keys = self.keys or []
+            number = max(1, number)
+            if count is not None and not count_is_estimate:
+                number = min(number, max(1, -(-count // self.per_page)))
+            offset = (number - 1) * self.per_page
+        if keys:
+            queryset = queryset.order_by(*(f"{'-' if descending else ''}{field}" for field, descending in keys))
+
+        rows = list(queryset[offset:offset + self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor) or offset > 0
+            if not cursor and not has_more and count_is_estimate and (rows or offset == 0):
+                # Последняя страница от начала выборки: число строк известно точно
+                count, count_is_estimate = offset + len(rows), False
+
+        cursors = [encode_cursor([_key_value(row, field) for field, _ in self.keys]) for row in rows] \
+            if self.keys is not None else []
+        return KeysetPage(
+            object_list=rows,
+            number=max(1, number),
+            per_page=self.per_page,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=cursors[-1] if cursors else None,
+            previous_cursor=cursors[0] if cursors else None,
+            count=count,
+            count_is_estimate=count_is_estimate,
+        )
+
+    def get_page(self, number: Any = 1, cursor: Optional[str] = None, backwards: bool = False) -> KeysetPage:
+        """Как page, но некорректный номер страницы или курсор из URL не вызывает ошибку (как Paginator.get_page)"""
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        try:
+            return self.page(number, cursor or None, backwards)
+        except ValueError:
+            return self.page(number)
@@ -0,0 +1,69 @@
+"""
+Агрегация атрибута по поддереву временного ряда (сам ряд и все потомки)
+с разбиением по периодам. Считается одним запросом на стороне БД, потомки
+берутся из таблицы замыкания.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import connection
+
+from .data_access import value_number_sql
+
+AGGREGATE_FUNCTIONS = ('sum', 'avg', 'min', 'max', 'count')
+BUCKETS = ('day', 'week', 'month')
+
+
+def aggregate_subtree(time_series_id: int, attribute_id: int, func: str = 'sum', bucket: str = 'day',
+                      start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      include_self: bool = True) -> List[Dict[str, Any]]:
+    """
+    Сворачивает значения атрибута во всех рядах поддерева по периодам.
+
+    Args:
+        func: sum, avg, min, max или count (число числовых значений)
+        bucket: day, week или month; границы периодов - в часовом поясе settings.TIME_ZONE
+        start, end: Ограничение start_dt: start <= start_dt < end
+        include_self: Учитывать ли значения самого ряда, а не только потомков
+
+    Returns:
+        Список по периодам: bucket (начало периода), value, points (числовых значений),
+        series (рядов с данными), skipped (пустых и нечисловых значений)
+
+    Raises:
+        ValueError: Неизвестная функция или период
+    """
+    if func not in AGGREGATE_FUNCTIONS:
+        raise ValueError(f"Неизвестная функция агрегации: {func}. Допустимо: {', '.join(AGGREGATE_FUNCTIONS)}")
+    if bucket not in BUCKETS:
+        raise ValueError(f"Неизвестный период: {bucket}. Допустимо: {', '.join(BUCKETS)}")
+
+    conditions = ''
+    params: List[Any] = [bucket, settings.TIME_ZONE, time_series_id, 0 if include_self else 1, attribute_id]
+    if start is not None:
+        conditions += "\n              AND t.start_dt >= %s"
+        params.append(start)
+    if end is not None:
+        conditions += "\n              AND t.start_dt < %s"
+        params.append(end)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT
+                date_trunc(%s, t.start_dt, %s) AS bucket,
+                {func}(v.num) AS value,
+                count(v.num) AS points,
+                count(DISTINCT t.time_series_id) FILTER (WHERE v.num IS NOT NULL) AS series,
+                count(*) - count(v.num) AS skipped
+            FROM ts_schema.time_series_closure c
+            INNER JOIN ts_schema.timestamps t ON t.time_series_id = c.descendant_id
+            CROSS JOIN LATERAL (SELECT {value_number_sql('t')} AS num) v
+            WHERE c.ancestor_id = %s
+              AND c.depth >= %s
+              AND t.attribute_id = %s{conditions}
+            GROUP BY 1
+            ORDER BY 1
+        """, params)
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -0,0 +1,357 @@
+"""
+Локальный колоночный снимок значений атрибутов рядов (Arrow IPC) для обучения,
+прогнозов детей и расчёта эластичности.
+
+Для каждой пары (ряд, атрибут) в SERIES_STORE_DIR/<time_series_id>/<attribute_id>/ лежат
+сегменты *.arrow (timestamp_id, start_dt, num, empty) и meta.json с водяным знаком -
+наибольшим timestamp_id в снимке - и отпечатком строк до него (число строк и сумма xmin).
+Сегменты читаются через memory map, без копирования в память процесса.
+
+Перед чтением снимки сверяются с БД одним агрегатным запросом. Если строки до водяного
+знака не менялись, новые строки (timestamp_id выше знака) дописываются отдельным сегментом.
+Изменение или удаление строк, как и вставка с меньшим timestamp_id, меняет отпечаток -
+тогда снимок перестраивается целиком. Изменённая строка получает новый xmin, поэтому
+отпечаток не зависит от сигналов и замечает и правки в обход приложения (кроме повторной
+правки строки в той же транзакции, что её создала, после чтения снимка в этой транзакции).
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection
+
+from .data_access import DailyFrame, daily_frame, split_attribute_series, value_number_sql
+
+Key = Tuple[int, int]
+
+META_FILE = 'meta.json'
+META_VERSION = 1
+# Больше сегментов - снимок сливается в один файл при следующей записи
+MAX_SEGMENTS = 8
+
+FINGERPRINT_SQL = """
+    SELECT
+        k.time_series_id,
+        k.attribute_id,
+        count(t.timestamp_id) FILTER (WHERE t.timestamp_id <= k.watermark),
+        coalesce(sum(t.xmin::text::bigint) FILTER (WHERE t.timestamp_id <= k.watermark), 0),
+        count(t.timestamp_id) FILTER (WHERE t.timestamp_id > k.watermark)
+    FROM unnest(%s::integer[], %s::integer[], %s::bigint[]) AS k(time_series_id, attribute_id, watermark)
+    LEFT JOIN ts_schema.timestamps t
+        ON t.time_series_id = k.time_series_id AND t.attribute_id = k.attribute_id
+    GROUP BY k.time_series_id, k.attribute_id
+"""
+
+ROWS_SQL = f"""
+    SELECT
+        t.time_series_id,
+        t.attribute_id,
+        t.timestamp_id,
+        (extract(epoch FROM t.start_dt) * 1000000)::bigint,
+        {value_number_sql('t')},
+        btrim(t.value) = '',
+        t.xmin::text::bigint
+    FROM unnest(%s::integer[], %s::integer[], %s::bigint[]) AS k(time_series_id, attribute_id, watermark)
+    INNER JOIN ts_schema.timestamps t
+        ON t.time_series_id = k.time_series_id
+       AND t.attribute_id = k.attribute_id
+       AND t.timestamp_id > k.watermark
+    ORDER BY t.time_series_id, t.attribute_id, t.timestamp_id
+"""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise ImportError("Для хранилища снимков рядов (SERIES_STORE_ENABLED) установите pyarrow")
+    return pyarrow
+
+
+def _schema():
+    pa = _pyarrow()
+    return pa.schema([
+        ('timestamp_id', pa.int64()),
+        ('start_dt', pa.timestamp('us', tz='UTC')),
+        ('num', pa.float64()),
+        ('empty', pa.bool_()),
+    ])
+
+
+def read_snapshot(directory: str, meta: Optional[Dict[str, Any]] = None):
+    """
+    Таблица pyarrow снимка из каталога пары (ряд, атрибут), сегменты отображаются в память.
+    Формат файлов читает и calculating_elasticity/db_interaction.read_from_store (без Django).
+    """
+    pa = _pyarrow()
+    if meta is None:
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+    tables = [
+        pa.ipc.open_file(pa.memory_map(os.path.join(directory, segment), 'r')).read_all()
+        for segment in meta['segments']
+    ]
+    if not tables:
+        return _schema().empty_table()
+    return pa.concat_tables(tables)
+
+
+class SeriesStore:
+    """Снимки значений атрибутов рядов в каталоге root"""
+
+    def __init__(self, root: str):
+        self.root = str(root)
+
+    def _directory(self, key: Key) -> str:
+        return os.path.join(self.root, str(key[0]), str(key[1]))
+
+    def _load_meta(self, key: Key) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self._directory(key), META_FILE), encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('version') == META_VERSION else None
+
+    def _write_segment(self, directory: str, arrays: Dict[str, np.ndarray]) -> str:
+        pa = _pyarrow()
+        schema = _schema()
+        table = pa.table({
+            'timestamp_id': pa.array(arrays['timestamp_id'], pa.int64()),
+            'start_dt': pa.array(arrays['start_us'], pa.int64()).cast(schema.field('start_dt').type),
+            'num': pa.array(arrays['num'], pa.float64(), from_pandas=True),
+            'empty': pa.array(arrays['empty'], pa.bool_()),
+        }, schema=schema)
+
+        name = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.arrow"
+        temporary = os.path.join(directory, f".{name}.tmp")
+        with pa.OSFile(temporary, 'wb') as sink:
+            with pa.ipc.new_file(sink, schema) as writer:
+                writer.write_table(table)
+        os.replace(temporary, os.path.join(directory, name))
+        return name
+
+    def _write_meta(self, directory: str, meta: Dict[str, Any]) -> None:
+        temporary = os.path.join(directory, f".{META_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(temporary, 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(temporary, os.path.join(directory, META_FILE))
+
+    def _remove_unlisted(self, directory: str, segments: Sequence[str]) -> None:
+        for name in os.listdir(directory):
+            if name.endswith('.arrow') and name not in segments:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+    def _store(self, key: Key, meta: Optional[Dict[str, Any]], arrays: Dict[str, np.ndarray]) -> None:
+        """Дописывает строки к снимку (meta) или создаёт снимок заново (meta=None)"""
+        directory = self._directory(key)
+        os.makedirs(directory, exist_ok=True)
+
+        segments = list(meta['segments']) if meta else []
+        rows = meta['rows'] if meta else 0
+        xmin_sum = meta['xmin_sum'] if meta else 0
+        watermark = meta['watermark'] if meta else 0
+        if len(arrays['timestamp_id']):
+            segments.append(self._write_segment(directory, arrays))
+            rows += len(arrays['timestamp_id'])
+            xmin_sum += int(arrays['xmin'].sum())
+            watermark = max(watermark, int(arrays['timestamp_id'].max()))
+
+        if len(segments) > MAX_SEGMENTS:
+            table = read_snapshot(directory, {'segments': segments})
+            segments = [self._write_segment(directory, {
+                'timestamp_id': table.column('timestamp_id').to_numpy(),
+                'start_us': table.column('start_dt').cast('int64').to_numpy(),
+                'num': table.column('num').to_numpy(zero_copy_only=False),
+                'empty': table.column('empty').to_numpy(zero_copy_only=False),
+            })]
+
+        self._write_meta(directory, {
+            'version': META_VERSION,
+            'time_series_id': key[0],
+            'attribute_id': key[1],
+            'watermark': watermark,
+            'rows': rows,
+            'xmin_sum': xmin_sum,
+            'segments': segments,
+            'synced_at': time.time(),
+        })
+        if meta is None or len(segments) == 1:
+            self._remove_unlisted(directory, segments)
+
+    def sync(self, keys: Iterable[Key], rebuild: bool = False) -> Dict[str, int]:
+        """
+        Приводит снимки пар (ряд, атрибут) в соответствие с БД.
+
+        Returns:
+            Число пар без изменений, дописанных и перестроенных, и число прочитанных из БД строк
+        """
+        keys = sorted(set(keys))
+        metas = {key: None if rebuild else self._load_meta(key) for key in keys}
+
+        watermarks: Dict[Key, int] = {}
+        stats = {'unchanged': 0, 'appended': 0, 'rebuilt': 0, 'rows': 0}
+        known = [key for key in keys if metas[key] is not None]
+        if known:
+            with connection.cursor() as cursor:
+                cursor.execute(FINGERPRINT_SQL, [
+                    [key[0] for key in known], [key[1] for key in known],
+                    [metas[key]['watermark'] for key in known],
+                ])
+                fingerprints = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+            for key in known:
+                rows, xmin_sum, new_rows = fingerprints[key]
+                meta = metas[key]
+                if rows != meta['rows'] or int(xmin_sum) != meta['xmin_sum']:
+                    metas[key] = None
+                elif new_rows:
+                    watermarks[key] = meta['watermark']
+                else:
+                    stats['unchanged'] += 1
+        for key in keys:
+            if metas[key] is None:
+                watermarks[key] = -1
+
+        if not watermarks:
+            return stats
+
+        pending = sorted(watermarks)
+        with connection.cursor() as cursor:
+            cursor.execute(ROWS_SQL, [
+                [key[0] for key in pending], [key[1] for key in pending], [watermarks[key] for key in pending],
+            ])
+            rows = cursor.fetchall()
+        stats['rows'] = len(rows)
+
+        table = np.array(rows, dtype=float).reshape(-1, 7)
+        series_ids = table[:, 0].astype('int64')
+        attribute_ids = table[:, 1].astype('int64')
+        # Строки упорядочены по ключу: границы групп - смена ряда или атрибута
+        boundaries = np.flatnonzero((np.diff(series_ids) != 0) | (np.diff(attribute_ids) != 0)) + 1
+        groups = {
+            (int(series_ids[positions[0]]), int(attribute_ids[positions[0]])): positions
+            for positions in np.split(np.arange(len(table)), boundaries) if len(positions)
+        }
+
+        empty_positions = np.arange(0)
+        for key in pending:
+            positions = groups.get(key, empty_positions)
+            self._store(key, metas[key], {
+                'timestamp_id': table[positions, 2].astype('int64'),
+                'start_us': table[positions, 3].astype('int64'),
+                'num': table[positions, 4],
+                'empty': table[positions, 5].astype(bool),
+                'xmin': table[positions, 6].astype('int64'),
+            })
+            stats['appended' if metas[key] is not None else 'rebuilt'] += 1
+
+        logging.debug(f"series_store: {stats}")
+        return stats
+
+    def read(self, time_series_id: int, attribute_id: int):
+        """Таблица pyarrow снимка без сверки с БД (пустая, если снимка нет)"""
+        key = (time_series_id, attribute_id)
+        for _ in range(2):
+            meta = self._load_meta(key)
+            if meta is None:
+                return _schema().empty_table()
+            try:
+                return read_snapshot(self._directory(key), meta)
+            except FileNotFoundError:
+                # Сегмент удалён параллельным слиянием - meta.json уже новый
+                continue
+        raise RuntimeError(f"Снимок {key} изменяется слишком часто")
+
+    def _columns(self, time_series_id: int, attribute_id: int) -> Tuple[np.ndarray, ...]:
+        table = self.read(time_series_id, attribute_id)
+        return (
+            table.column('timestamp_id').to_numpy(),
+            table.column('start_dt').cast('int64').to_numpy(),
+            table.column('num').to_numpy(zero_copy_only=False),
+            table.column('empty').to_numpy(zero_copy_only=False),
+        )
+
+    def daily_values(self, time_series_id: int, attribute_ids: Sequence[int]) -> DailyFrame:
+        """То же, что data_access.fetch_daily_values, по снимкам (после сверки с БД)"""
+        attribute_ids = list(attribute_ids)
+        self.sync((time_series_id, attribute_id) for attribute_id in attribute_ids)
+
+        day_us = 86_400 * 1_000_000
+        per_attribute = []
+        for attribute_id in attribute_ids:
+            timestamp_ids, start_us, num, empty = self._columns(time_series_id, attribute_id)
+            keep = ~empty
+            timestamp_ids, start_us, num = timestamp_ids[keep], start_us[keep], num[keep]
+            days = np.floor_divide(start_us, day_us)
+            # Последнее значение дня: наибольшие start_dt, затем timestamp_id
+            order = np.lexsort((timestamp_ids, start_us, days))
+            days, num = days[order], num[order]
+            last = np.r_[days[1:] != days[:-1], True] if len(days) else np.array([], dtype=bool)
+            per_attribute.append((days[last], num[last]))
+
+        k = len(attribute_ids)
+        all_days = np.unique(np.concatenate([days for days, _ in per_attribute])) if k else np.array([])
+        table = np.full((len(all_days), 3 + k), np.nan)
+        table[:, 0] = all_days
+        table[:, 1:3] = 0
+        for position, (days, num) in enumerate(per_attribute):
+            rows = np.searchsorted(all_days, days)
+            table[rows, 1] += 1
+            table[rows, 2] += np.isnan(num)
+            table[rows, 3 + position] = num
+        return daily_frame(table, k)
+
+    def attribute_series(self, time_series_ids: Sequence[int],
+                         attribute_id: int) -> Tuple[Dict[int, pd.Series], Dict[int, int]]:
+        """То же, что data_access.fetch_attribute_series, по снимкам (после сверки с БД)"""
+        series_ids = sorted(set(time_series_ids))
+        self.sync((series_id, attribute_id) for series_id in series_ids)
+
+        parts = []
+        for series_id in series_ids:
+            timestamp_ids, start_us, num, _ = self._columns(series_id, attribute_id)
+            order = np.lexsort((timestamp_ids, start_us))
+            parts.append((np.full(len(order), series_id, dtype='int64'), start_us[order], num[order]))
+        if not parts or not sum(len(part[0]) for part in parts):
+            return {}, {}
+        return split_attribute_series(*(np.concatenate(column) for column in zip(*parts)))
+
+    def keys(self) -> List[Key]:
+        """Пары (ряд, атрибут), для которых есть снимки"""
+        keys = []
+        if not os.path.isdir(self.root):
+            return keys
+        for series_dir in os.listdir(self.root):
+            if not series_dir.isdigit():
+                continue
+            for attribute_dir in os.listdir(os.path.join(self.root, series_dir)):
+                if attribute_dir.isdigit():
+                    keys.append((int(series_dir), int(attribute_dir)))
+        return keys
+
+    def remove(self, keys: Iterable[Key]) -> int:
+        removed = 0
+        for key in keys:
+            directory = self._directory(key)
+            if os.path.isdir(directory):
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+            try:
+                os.rmdir(os.path.dirname(directory))
+            except OSError:
+                pass
+        return removed
+
+
+series_store = SeriesStore(settings.SERIES_STORE_DIR)
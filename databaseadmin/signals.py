@@ -0,0 +1,137 @@
+"""
+Обработчики сигналов моделей. Подключаются в DatabaseadminConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import effective, hierarchy
+from .hierarchy_cache import hierarchy_cache
+from .models import Attribute, ForecastingModel, TimeSeries, Timestamp
+from .tree import bump_tree_version
+
+
+@receiver(pre_save, sender=TimeSeries)
+def remember_time_series_parent(sender, instance: TimeSeries, raw: bool = False, **kwargs) -> None:
+    """Запоминает прежнего родителя и не даёт создать цикл в иерархии"""
+    instance._closure_old_parent_id = None
+    instance._closure_exists = False
+    if raw or instance.pk is None:
+        return
+
+    stored = list(TimeSeries.objects.filter(pk=instance.pk).values_list('parent_time_series_id', flat=True))
+    if not stored:
+        return
+    instance._closure_exists = True
+    old_parent = instance._closure_old_parent_id = stored[0]
+
+    new_parent = instance.parent_time_series_id
+    if new_parent != old_parent and new_parent is not None:
+        if new_parent == instance.pk or hierarchy.is_descendant(new_parent, instance.pk):
+            raise hierarchy.HierarchyCycleError("Ряд нельзя сделать потомком самого себя")
+
+
+@receiver(post_save, sender=TimeSeries)
+def update_time_series_closure(sender, instance: TimeSeries, created: bool, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    if created or not getattr(instance, '_closure_exists', True):
+        hierarchy.insert_node(instance.pk, instance.parent_time_series_id)
+    elif instance.parent_time_series_id != getattr(instance, '_closure_old_parent_id', instance.parent_time_series_id):
+        hierarchy.move_subtree(instance.pk, instance.parent_time_series_id)
+
+
+@receiver(post_save, sender=TimeSeries)
+def refresh_time_series_effective(sender, instance: TimeSeries, created: bool, raw: bool = False, **kwargs) -> None:
+    """Новый или перенесённый ряд наследует значения новых предков (после обновления замыкания)"""
+    if raw:
+        return
+    old_parent_id = getattr(instance, '_closure_old_parent_id', instance.parent_time_series_id)
+    if created or instance.parent_time_series_id != old_parent_id:
+        effective.refresh([instance.pk])
+
+
+@receiver(pre_delete, sender=TimeSeries)
+def detach_time_series_closure(sender, instance: TimeSeries, **kwargs) -> None:
+    instance._effective_children = (
+        list(TimeSeries.objects.filter(parent_time_series=instance).values_list('pk', flat=True))
+        if effective.is_enabled() else []
+    )
+    hierarchy.remove_node(instance.pk)
+
+
+@receiver(post_delete, sender=TimeSeries)
+def refresh_orphans_effective(sender, instance: TimeSeries, **kwargs) -> None:
+    """Бывшие дети удалённого ряда больше не наследуют его значения и значения его предков"""
+    effective.refresh(getattr(instance, '_effective_children', []))
+
+
+@receiver(post_save, sender=TimeSeries)
+@receiver(post_delete, sender=TimeSeries)
+@receiver(post_save, sender=ForecastingModel)
+@receiver(post_delete, sender=ForecastingModel)
+def invalidate_time_series_tree(sender, **kwargs) -> None:
+    """Меняет версию дерева (ETag ответов timeseries_tree_json)"""
+    bump_tree_version()
+
+
+@receiver(pre_save, sender=Timestamp)
+def remember_timestamp_point(sender, instance: Timestamp, raw: bool = False, **kwargs) -> None:
+    """Запоминает прежнюю точку изменяемого таймстемпа для пересчёта effective_timestamps"""
+    instance._effective_old_point = None
+    if raw or instance.pk is None or not effective.is_enabled():
+        return
+    instance._effective_old_point = (
+        Timestamp.objects.filter(pk=instance.pk)
+        .values_list('time_series_id', 'attribute_id', 'start_dt')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Timestamp)
+def refresh_timestamp_effective(sender, instance: Timestamp, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    series_ids = [instance.time_series_id]
+    points = [(instance.attribute_id, instance.start_dt)]
+    old_point = getattr(instance, '_effective_old_point', None)
+    if old_point is not None:
+        series_ids.append(old_point[0])
+        points.append(old_point[1:])
+    effective.refresh(series_ids, points=points)
+
+
+@receiver(post_save, sender=Timestamp)
+def invalidate_timestamp_hierarchy(sender, instance: Timestamp, raw: bool = False, **kwargs) -> None:
+    """
+    Сбрасывает кэш иерархии ряда и его потомков.
+    Обработчика post_delete для Timestamp нет намеренно: с ним Django загружает в память
+    каждую удаляемую строку (и при каскадном удалении ряда или атрибута), чтобы отправить
+    сигнал. Удаление таймстемпов сбрасывает кэш в Timestamp.delete и TimestampQuerySet.delete.
+    """
+    if not raw:
+        hierarchy_cache.invalidate_series(instance.time_series_id)
+
+
+@receiver(post_save, sender=TimeSeries)
+@receiver(post_delete, sender=TimeSeries)
+def invalidate_time_series_hierarchy(sender, instance: TimeSeries, **kwargs) -> None:
+    hierarchy_cache.invalidate_series(instance.pk)
+
+
+@receiver(pre_save, sender=Attribute)
+def remember_attribute_data_type(sender, instance: Attribute, raw: bool = False, **kwargs) -> None:
+    instance._old_data_type = None
+    if raw or instance.pk is None:
+        return
+    instance._old_data_type = (
+        Attribute.objects.filter(pk=instance.pk).values_list('data_type', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Attribute)
+def refresh_attribute_value_num(sender, instance: Attribute, created: bool, raw: bool = False, **kwargs) -> None:
+    """Смена типа данных атрибута с числового на нечисловой и обратно пересчитывает value_num его таймстемпов"""
+    if raw or created or getattr(instance, '_old_data_type', None) is None:
+        return
+    if Attribute.is_numeric_type(instance._old_data_type) != instance.is_numeric:
+        instance.refresh_value_num()
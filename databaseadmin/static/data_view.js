@@ -37,24 +37,25 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function handleFile(file) {
-        // Проверяем тип файла
-        if (!file.name.endsWith('.csv')) {
+        // Проверяем тип файла (Parquet принимается для таймстемпов в широком формате)
+        const isParquet = file.name.endsWith('.parquet') && acceptsWideFormat();
+        if (!file.name.endsWith('.csv') && !isParquet) {
             showError('Пожалуйста, выберите CSV файл');
             return;
         }
 
-        // Проверяем размер файла (10 МБ)
-        if (file.size > 10 * 1024 * 1024) {
-            showError('Размер файла не должен превышать 10 МБ');
-            return;
-        }
-
         // Показываем информацию о файле
         document.getElementById('fileName').textContent = file.name;
         document.getElementById('fileSize').textContent = formatFileSize(file.size);
         document.getElementById('fileType').textContent = file.type;
         fileInfo.style.display = 'block';
 
+        // Parquet не показываем в предпросмотре, заголовок проверит сервер
+        if (isParquet) {
+            uploadFile(file);
+            return;
+        }
+
         // Читаем файл для предпросмотра
         const reader = new FileReader();
         reader.onload = function(e) {
@@ -64,7 +65,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 uploadFile(file);
             }
         };
-        reader.readAsText(file);
+        // Для предпросмотра достаточно начала файла, большие файлы целиком не читаем
+        reader.readAsText(file.slice(0, 64 * 1024));
+    }
+
+    function acceptsWideFormat() {
+        return Boolean(fileInput && fileInput.accept.includes('.parquet'));
     }
 
     function formatFileSize(bytes) {
@@ -79,8 +85,12 @@ document.addEventListener('DOMContentLoaded', function() {
         const lines = content.split('\n').slice(0, 6); // Берем первые 5 строк для предпросмотра
         const headers = lines[0].split(',').map(h => h.trim());
         
-        // Проверяем наличие всех обязательных полей
-        const missingFields = requiredFields.filter(field => !headers.includes(field));
+        // Проверяем наличие всех обязательных полей; в широком формате таймстемпов
+        // вместо столбцов attribute и value - столбцы ряда, start_dt и по столбцу на атрибут
+        const isWide = acceptsWideFormat() && headers.includes('start_dt') &&
+            (headers.includes('time_series') || headers.includes('time_series_id')) &&
+            !headers.includes('attribute') && !headers.includes('attribute_id');
+        const missingFields = isWide ? [] : requiredFields.filter(field => !headers.includes(field));
         
         return {
             headers: headers,
@@ -128,6 +138,10 @@ document.addEventListener('DOMContentLoaded', function() {
         const formData = new FormData();
         formData.append('file', file);
         formData.append('csrfmiddlewaretoken', getCookie('csrftoken'));
+        const dedupeCheckbox = document.getElementById('dedupeUpload');
+        if (dedupeCheckbox && dedupeCheckbox.checked) {
+            formData.append('dedupe', '1');
+        }
 
         const xhr = new XMLHttpRequest();
         currentUpload = xhr;
@@ -155,6 +169,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 if (xhr.status === 200) {
                     showResults(response);
+                } else if (xhr.status === 202) {
+                    // Большой файл импортируется в фоне: опрашиваем статус задачи
+                    pollIngestionJob(response.status_url);
                 } else {
                     showError(response.error || `Ошибка сервера: ${xhr.status}`);
                     console.error('Server error:', response);
@@ -195,6 +212,43 @@ document.addEventListener('DOMContentLoaded', function() {
         uploadProgress.appendChild(cancelButton);
     }
 
+    function pollIngestionJob(statusUrl) {
+        const progressBar = document.getElementById('progressBar');
+        const progressPercent = document.getElementById('progressPercent');
+        const uploadProgress = document.getElementById('uploadProgress');
+        uploadProgress.querySelectorAll('button').forEach(button => button.remove());
+        uploadProgress.style.display = 'block';
+
+        fetch(statusUrl, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(job => {
+                if (job.error && !job.status) {
+                    uploadProgress.style.display = 'none';
+                    showError(job.error);
+                    return;
+                }
+                progressBar.style.width = job.progress + '%';
+                progressPercent.textContent = `${job.progress}% (импорт: ${job.message || 'в очереди'})`;
+
+                if (job.status === 'queued' || job.status === 'running') {
+                    setTimeout(() => pollIngestionJob(statusUrl), 2000);
+                    return;
+                }
+                uploadProgress.style.display = 'none';
+                if (job.status === 'succeeded') {
+                    showResults(job.result || job);
+                } else {
+                    // Записанные до ошибки части остаются в БД, задачу с ошибкой можно продолжить (resume)
+                    showError(`${job.error || job.message || 'Импорт завершён со статусом ' + job.status}. ` +
+                              `Записано строк: ${job.success_count}, обработано до строки ${job.line_number}`);
+                }
+            })
+            .catch(e => {
+                uploadProgress.style.display = 'none';
+                showError(`Ошибка при получении статуса импорта: ${e.message}`);
+            });
+    }
+
     function showResults(response) {
         const results = document.getElementById('importResults');
         const errors = document.getElementById('importErrors');
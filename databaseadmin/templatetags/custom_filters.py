@@ -96,6 +96,10 @@ def get_attr(obj, attr):
     """
     if not obj or not attr:
         return ""
+
+    if isinstance(obj, dict) and '.' not in attr and attr not in obj:
+        # Строки values() (list_values): подпись внешнего ключа лежит под <поле>__name или <поле>__pk
+        return obj.get(f"{attr}__name", obj.get(f"{attr}__pk", ""))
     
     if '.' in attr:
         parts = attr.split('.')
@@ -149,6 +153,13 @@ def get_related_id(obj, field_name):
     """
     if not obj or not field_name or not field_name.endswith('_id'):
         return ""
+
+    if isinstance(obj, dict):
+        return obj.get(field_name, "")
+
+    # Значение столбца внешнего ключа есть в самой строке, связанный объект не загружается
+    if hasattr(obj, field_name):
+        return getattr(obj, field_name)
     
     related_field = field_name[:-3] 
     
@@ -157,7 +168,4 @@ def get_related_id(obj, field_name):
         if related_obj:
             return related_obj.pk
     
-    if hasattr(obj, field_name):
-        return getattr(obj, field_name)
-    
     return "" 
\ No newline at end of file
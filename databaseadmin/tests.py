@@ -1,3 +1,289 @@
-from django.test import TestCase
+import importlib.util
+import io
+import tempfile
+from unittest import skipUnless
+from datetime import datetime, timedelta, timezone
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .data_access import numeric_value_sql, parse_numeric_value, value_number_sql
+from .importers import import_csv
+from .ingestion import create_ingestion_job, execute_ingestion_job
+from .models import Attribute, ForecastingModel, IngestionJob, Product, TimeSeries, Timestamp
+from .views.utils import export_to_parquet
+
+
+class TimeSeriesTreeQueryCountTests(TestCase):
+    """Дерево рядов читается фиксированным числом запросов независимо от размера иерархии"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='product')
+        cls.attribute = Attribute.objects.create(name='price', data_type='float')
+        cls.user = User.objects.create_user('tree', password='tree')
+
+    def _build_tree(self, roots: int, children: int, grandchildren: int) -> TimeSeries:
+        first_root = None
+        for r in range(roots):
+            root = TimeSeries.objects.create(name=f'root {r}', product=self.product)
+            first_root = first_root or root
+            ForecastingModel.objects.create(
+                time_series=root, feature_attribute=self.attribute, target_attribute=self.attribute)
+            for c in range(children):
+                child = TimeSeries.objects.create(name=f'child {r}.{c}', product=self.product,
+                                                  parent_time_series=root)
+                for g in range(grandchildren):
+                    TimeSeries.objects.create(name=f'grandchild {r}.{c}.{g}', product=self.product,
+                                              parent_time_series=child)
+        return first_root
+
+    def test_tree_json_level_is_one_query(self):
+        root = self._build_tree(roots=3, children=4, grandchildren=2)
+        url = reverse('timeseries_tree_json')
+
+        for params in ({}, {'parent_id': root.pk}, {'depth': 3}):
+            # Версия дерева для ETag и сами узлы
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+
+        data = self.client.get(url, {'parent_id': root.pk}).json()
+        self.assertEqual(len(data), 4)
+        self.assertTrue(all(node['children'] is True for node in data))
+        self.assertEqual({node['data']['parent_forecasting_model_id'] for node in data},
+                         {root.forecastingmodel_set.get().model_id})
+
+        nested = self.client.get(url, {'depth': 3}).json()
+        self.assertEqual(len(nested), 3)
+        self.assertEqual(len(nested[0]['children']), 4)
+        self.assertEqual(len(nested[0]['children'][0]['children']), 2)
+        self.assertIs(nested[0]['children'][0]['children'][0]['children'], False)
+
+    def test_tree_json_etag(self):
+        root = self._build_tree(roots=1, children=2, grandchildren=0)
+        url = reverse('timeseries_tree_json')
+
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        # Версия хранится в БД, а не в кэше процесса: очистка кэша её не меняет
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        TimeSeries.objects.create(name='new child', product=self.product, parent_time_series=root)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_tree_page_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+        url = reverse('time_series_tree')
+
+        self._build_tree(roots=1, children=1, grandchildren=1)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+        self._build_tree(roots=4, children=5, grandchildren=3)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['time_series']), 5)
+        self.assertEqual(response.context['time_series'][-1]['total_descendants'], 20)
+
+
+class DataViewQueryCountTests(TestCase):
+    """Страницы таблиц data_view читаются фиксированным числом запросов независимо от числа строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='product')
+        cls.attribute = Attribute.objects.create(name='price', data_type='float')
+        cls.user = User.objects.create_user('data', password='data')
+
+    def _add_rows(self, count: int) -> None:
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        root = TimeSeries.objects.create(name='root', product=self.product)
+        series = TimeSeries.objects.bulk_create(
+            TimeSeries(name=f'series {i}', product=self.product, parent_time_series=root) for i in range(count))
+        Timestamp.objects.bulk_create(
+            Timestamp(time_series=series[i % len(series)], attribute=self.attribute,
+                      value=str(i), start_dt=start + timedelta(hours=i))
+            for i in range(count)
+        )
+
+    def _query_count(self, url: str, params: dict) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_page_query_count_does_not_grow(self):
+        self.client.force_login(self.user)
+        pages = [
+            (reverse('timeseries_view'), {}),
+            (reverse('timestamp_view'), {}),
+            (reverse('timestamp_view'), {'sort_by[]': ['time_series', 'start_dt'], 'order[]': ['desc', 'asc']}),
+        ]
+
+        self._add_rows(2)
+        expected = [self._query_count(url, params) for url, params in pages]
+
+        self._add_rows(120)
+        for (url, params), queries in zip(pages, expected):
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, params)
+            self.assertEqual(len(response.context['page_obj']), 50)
+
+        response = self.client.get(reverse('timestamp_view'))
+        self.assertContains(response, '<td>series 0</td>', html=True)
+        with self.assertNumQueries(expected[1]):
+            response = self.client.get(reverse('timestamp_view'),
+                                       {'cursor': response.context['page_obj'].next_cursor, 'page': 2})
+        self.assertEqual(response.context['page_obj'].start_index(), 51)
+
+
+class NumericValueTests(TestCase):
+    """Приведение value к числу в SQL и в Python даёт одинаковый результат и не падает на числах вне диапазона"""
+
+    VALUES = ['2.5', ' -3e2 ', '1e999', '-1e999', '1e-400', '0e-400', '1e-310', 'abc', '']
+
+    def test_sql_matches_python(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {numeric_value_sql('v')} FROM unnest(%s::text[]) WITH ORDINALITY AS t(v, n) ORDER BY n",
+                [self.VALUES])
+            from_sql = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(from_sql, [parse_numeric_value(value) for value in self.VALUES])
+        self.assertEqual(from_sql[:5], [2.5, -300.0, None, None, None])
+
+    def test_overflowing_value_does_not_break_queries(self):
+        product = Product.objects.create(name='product')
+        series = TimeSeries.objects.create(name='series', product=product)
+        attribute = Attribute.objects.create(name='price', data_type='float')
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for hours, value in enumerate(['1', '1e999', '2']):
+            Timestamp.objects.create(time_series=series, attribute=attribute, value=value,
+                                     start_dt=start + timedelta(hours=hours))
+        self.assertIsNone(Timestamp.objects.get(value='1e999').value_num)
+
+        # Строка, записанная в обход приложения: value_num пуст, число разбирается из value
+        Timestamp.objects.update(value_num=None)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT sum({value_number_sql()}) FROM ts_schema.timestamps WHERE time_series_id = %s",
+                           [series.pk])
+            self.assertEqual(cursor.fetchone()[0], 3.0)
+
+
+class InterruptingContext:
+    """Контекст задачи, прерывающий её после первых interrupt_after частей"""
+
+    def __init__(self, interrupt_after: int = 0):
+        self.remaining = interrupt_after
+
+    def progress(self, percent: int, message: str = '', **fields) -> None:
+        if self.remaining == 0:
+            raise RuntimeError('interrupted')
+        self.remaining -= 1
+
+
+class CsvImportTests(TestCase):
+    """Ошибочная строка пачки попадает в отчёт с номером строки, остальные строки записываются"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(name='product')
+        cls.series = TimeSeries.objects.create(name='series', product=cls.product)
+        cls.attribute = Attribute.objects.create(name='price', data_type='float')
+        cls.existing = Timestamp.objects.create(time_series=cls.series, attribute=cls.attribute, value='1',
+                                                start_dt=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    def test_copy_failure_falls_back_to_rows(self):
+        new_id = self.existing.pk + 1000
+        data = (
+            'timestamp_id,time_series,attribute,value,start_dt\n'
+            f'{self.existing.pk},{self.series.pk},{self.attribute.pk},2,2024-01-02T00:00:00Z\n'
+            f'{new_id},{self.series.pk},{self.attribute.pk},3,2024-01-03T00:00:00Z\n'
+        )
+        result = import_csv(Timestamp, io.BytesIO(data.encode()), method='copy')
+
+        self.assertEqual((result['success_count'], result['error_count']), (1, 1))
+        self.assertTrue(result['errors'][0].startswith('Строка 2: duplicate key'), result['errors'])
+        self.assertEqual(Timestamp.objects.get(pk=new_id).value, '3')
+        self.assertEqual(Timestamp.objects.get(pk=self.existing.pk).value, '1')
+
+    @override_settings(TIME_ZONE='Europe/Moscow')
+    def test_naive_dates_use_time_zone(self):
+        data = (
+            'time_series,attribute,value,start_dt\n'
+            f'{self.series.pk},{self.attribute.pk},2,2024-01-02T10:00:00\n'
+            f'{self.series.pk},{self.attribute.pk},3,2024-01-03T10:00:00Z\n'
+            f'{self.series.pk},{self.attribute.pk},4,2024-01-04 10:00:00+01:00\n'
+        )
+        result = import_csv(Timestamp, io.BytesIO(data.encode()))
+
+        self.assertEqual(result['success_count'], 3, result['errors'])
+        self.assertEqual(dict(Timestamp.objects.exclude(pk=self.existing.pk).values_list('value', 'start_dt')), {
+            '2': datetime(2024, 1, 2, 7, tzinfo=timezone.utc),
+            '3': datetime(2024, 1, 3, 10, tzinfo=timezone.utc),
+            '4': datetime(2024, 1, 4, 9, tzinfo=timezone.utc),
+        })
+
+    def test_resumed_ingestion_reports_failing_row(self):
+        first_id = self.existing.pk + 1000
+        data = (
+            'timestamp_id,time_series,attribute,value,start_dt\n'
+            f'{first_id},{self.series.pk},{self.attribute.pk},2,2024-01-02T00:00:00Z\n'
+            f'{self.existing.pk},{self.series.pk},{self.attribute.pk},3,2024-01-03T00:00:00Z\n'
+            f'{first_id + 1},{self.series.pk},{self.attribute.pk},4,2024-01-04T00:00:00Z\n'
+        )
+        with tempfile.TemporaryDirectory() as staging, \
+                override_settings(INGESTION_STAGING_DIR=staging, INGESTION_CHUNK_ROWS=1, CSV_IMPORT_METHOD='copy'):
+            job = create_ingestion_job(Timestamp, SimpleUploadedFile('data.csv', data.encode()))
+            # Задача прерывается после первой части и продолжается с контрольной точки
+            with self.assertRaises(RuntimeError):
+                execute_ingestion_job(job, InterruptingContext())
+            job = IngestionJob.objects.get(pk=job.pk)
+            self.assertEqual(job.rows_written, 1)
+
+            result = execute_ingestion_job(job, InterruptingContext(interrupt_after=10))
+
+        self.assertEqual((result['success_count'], result['error_count']), (2, 1))
+        self.assertTrue(result['errors'][0].startswith('Строка 3: duplicate key'), result['errors'])
+        self.assertEqual(sorted(Timestamp.objects.values_list('value', flat=True)), ['1', '2', '4'])
+
+
+@skipUnless(importlib.util.find_spec('pyarrow'), 'нужен pyarrow')
+class ParquetExportTests(TestCase):
+    """Широкий Parquet не теряет значения числовых атрибутов, которые не приводятся к числу"""
+
+    def _export(self) -> dict:
+        import pyarrow.parquet
+
+        response = export_to_parquet(Timestamp.objects.all())
+        table = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        return {field.name: (str(field.type), table.column(field.name).to_pylist()) for field in table.schema}
+
+    def test_non_numeric_values_are_exported_as_text(self):
+        product = Product.objects.create(name='product')
+        series = TimeSeries.objects.create(name='series', product=product)
+        price = Attribute.objects.create(name='price', data_type='float')
+        volume = Attribute.objects.create(name='volume', data_type='float')
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for hours, (price_value, volume_value) in enumerate([('1.5', '10'), ('abc', '20'), ('1e999', '')]):
+            Timestamp.objects.create(time_series=series, attribute=price, value=price_value,
+                                     start_dt=start + timedelta(hours=hours))
+            Timestamp.objects.create(time_series=series, attribute=volume, value=volume_value,
+                                     start_dt=start + timedelta(hours=hours))
+        # Строка, записанная в обход приложения: число разбирается из value
+        Timestamp.objects.filter(attribute=volume, value='20').update(value_num=None)
+
+        columns = self._export()
+        self.assertEqual(columns['price'], ('string', ['1.5', 'abc', '1e999']))
+        self.assertEqual(columns['volume'], ('double', [10.0, 20.0, None]))
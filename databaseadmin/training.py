@@ -0,0 +1,246 @@
+"""
+Обучение моделей прогнозирования.
+Используется как синхронным API-эндпоинтом, так и фоновым обработчиком задач.
+"""
+import os
+import time
+import logging
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+from django.conf import settings
+
+from .forecasting import SARIMAXAutoForecaster
+from .data_access import fetch_daily_values
+from .models import ForecastingModel, TrainingJob
+
+ProgressCallback = Callable[[int, str], None]
+
+
+class TrainingError(Exception):
+    """Ошибка обучения, которую можно показать пользователю (status - HTTP-код ответа)"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _noop_progress(percent: int, message: str) -> None:
+    pass
+
+
+def run_training(forecasting_model: ForecastingModel,
+                 progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """
+    Загружает данные модели, подбирает параметры SARIMAX, оценивает качество
+    на отложенной выборке, обучает финальную модель и сохраняет её.
+
+    Args:
+        forecasting_model: Модель прогнозирования для обучения
+        progress: Функция progress(percent, message) для отчёта о ходе обучения
+
+    Returns:
+        Словарь с результатами обучения (формат ответа API)
+
+    Raises:
+        TrainingError: Если данных недостаточно или обучение не удалось
+    """
+    progress = progress or _noop_progress
+    model_id = forecasting_model.model_id
+
+    time_series = forecasting_model.time_series
+    feature_attribute = forecasting_model.feature_attribute
+    target_attribute = forecasting_model.target_attribute
+
+    progress(5, 'Загрузка данных')
+
+    frame = fetch_daily_values(time_series.time_series_id,
+                               [feature_attribute.attribute_id, target_attribute.attribute_id])
+
+    if frame.invalid_count:
+        error_msg = f"Ошибка при преобразовании данных: нечисловых значений - {frame.invalid_count}"
+        logging.error(error_msg)
+        raise TrainingError(error_msg)
+
+    if not frame.attribute_days.all():
+        raise TrainingError('Недостаточно данных для обучения модели')
+
+    if not len(frame.dates):
+        raise TrainingError('Нет общих дат между атрибутами')
+
+    if len(frame.dates) < 30:
+        raise TrainingError(
+            f'Недостаточно данных для обучения модели (нужно минимум 30 точек, найдено {len(frame.dates)})'
+        )
+
+    common_dates_ts = frame.index
+    all_price = frame.series(0)
+    all_traffic = frame.series(1)
+
+    progress(15, 'Сохранение данных модели')
+
+    try:
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        temp_dir = os.path.join(project_root, 'models')
+        os.makedirs(temp_dir, exist_ok=True)
+
+        model_dir = os.path.join(temp_dir, f'model_dir_{model_id}')
+        os.makedirs(model_dir, exist_ok=True)
+
+        all_data_filename = os.path.join(model_dir, f'model_{model_id}_all_data.csv')
+
+        df_all = pd.DataFrame({
+            'date': [date.strftime('%Y-%m-%d') for date in common_dates_ts],
+            f'{feature_attribute.name}': all_price.values,
+            f'{target_attribute.name}': all_traffic.values
+        })
+
+        df_all.to_csv(all_data_filename, index=False)
+
+        logging.info(f"Данные для модели {model_id} сохранены в директории {model_dir}")
+    except Exception as e:
+        logging.error(f"Ошибка при сохранении данных: {str(e)}")
+        logging.error(traceback.format_exc())
+        model_dir = None
+
+    timings: Dict[str, Optional[float]] = {'search': None, 'evaluation': None, 'refit': None}
+
+    try:
+        forecaster = SARIMAXAutoForecaster(
+            arima_orders=[(1,1,1), (2,1,2), (1,1,0), (0,1,1)],
+            seasonal_orders=[(1,1,1,7), (0,1,1,7)],
+            max_lags=30,
+            top_k_features=10,
+            train_ratio=0.8,
+            n_jobs=settings.FORECASTING_N_JOBS,
+            feature_selector=settings.FORECASTING_FEATURE_SELECTOR
+        )
+
+        train_size = int(len(common_dates_ts) * 0.8)
+        train_dates_ts = common_dates_ts[:train_size]
+        test_dates_ts = common_dates_ts[train_size:]
+
+        train_price = all_price.loc[train_dates_ts]
+        train_traffic = all_traffic.loc[train_dates_ts]
+
+        test_price = all_price.loc[test_dates_ts]
+        test_traffic = all_traffic.loc[test_dates_ts]
+
+        progress(20, 'Подбор параметров модели')
+        logging.info(f"Начало обучения модели ID {model_id} с помощью SARIMAXAutoForecaster")
+        forecaster.fit(train_traffic, train_price)
+        timings['search'] = forecaster.search_time_
+        logging.info(f"Модель ID {model_id} успешно обучена за {forecaster.search_time_:.1f} с")
+
+        try:
+            progress(70, 'Оценка качества на тестовой выборке')
+            logging.info("Начинаем оценку качества прогнозирования на тестовой выборке")
+
+            evaluation_started = time.perf_counter()
+            combined_price = pd.concat([train_price, test_price])
+
+            predictions = forecaster.predict(combined_price)
+
+            test_predictions = predictions.loc[test_dates_ts] if test_dates_ts[0] in predictions.index else None
+
+            if test_predictions is None or len(test_predictions) != len(test_traffic):
+                logging.warning(f"Прогнозные даты не совпадают с тестовыми! Корректируем индексы.")
+                logging.warning(f"Прогнозные даты: {predictions.index}")
+                logging.warning(f"Тестовые даты: {test_traffic.index}")
+
+                common_idx = pd.DatetimeIndex(
+                    predictions.index.intersection(test_traffic.index.to_list())
+                )
+                if len(common_idx) > 0:
+                    test_predictions = predictions.loc[common_idx]
+                    test_traffic_adj = test_traffic.loc[common_idx]
+                    mape = forecaster.get_mape(test_traffic_adj, test_predictions)
+                else:
+                    if len(predictions) >= len(test_traffic):
+                        adjusted_predictions = pd.Series(
+                            predictions.values[-len(test_traffic):],
+                            index=test_traffic.index
+                        )
+                        mape = forecaster.get_mape(test_traffic, adjusted_predictions)
+                    else:
+                        raise ValueError("Не удалось сопоставить прогнозные и тестовые данные")
+            else:
+                mape = forecaster.get_mape(test_traffic, test_predictions)
+
+            logging.info(f"MAPE на тестовой выборке: {mape:.2f}%")
+            timings['evaluation'] = time.perf_counter() - evaluation_started
+
+            # Порядки и признаки уже выбраны, поэтому финальная модель обучается одним fit
+            progress(80, 'Обучение финальной модели на всех данных')
+            logging.info("Обучаем финальную модель на всех данных")
+            final_forecaster = forecaster.refit(all_traffic, all_price)
+            timings['refit'] = final_forecaster.refit_time_
+
+            progress(95, 'Сохранение модели')
+            forecasting_model.save_model_object(final_forecaster)
+
+        except Exception as eval_error:
+            logging.error(f"Ошибка при оценке качества модели: {str(eval_error)}")
+            logging.error(traceback.format_exc())
+            mape = None
+
+            progress(95, 'Сохранение модели')
+            forecasting_model.save_model_object(forecaster)
+
+        best_order = forecaster.best_order_
+        best_seasonal_order = forecaster.best_seasonal_order_
+
+        model_info = forecaster.summary()
+        logging.info(f"Дополнительная информация о модели: {model_info}")
+
+    except Exception as e:
+        error_msg = f"Ошибка при обучении модели: {str(e)}"
+        logging.error(error_msg)
+        logging.error(traceback.format_exc())
+        raise TrainingError(error_msg, status=500)
+
+    result: Dict[str, Any] = {
+        'status': 'success',
+        'message': 'Модель успешно обучена',
+        'model_id': model_id,
+        'model_type': 'sarimax',
+        'model_params': {
+            'order': str(best_order) if best_order else "неизвестно",
+            'seasonal_order': str(best_seasonal_order) if best_seasonal_order else "неизвестно"
+        },
+        'candidates': forecaster.get_cv_results(),
+        'timings': {
+            name: round(value, 3) if value is not None else None
+            for name, value in timings.items()
+        }
+    }
+
+    if mape is not None:
+        result['mape'] = round(mape, 2)
+        result['training_points'] = len(train_dates_ts)
+        result['test_points'] = len(test_dates_ts)
+
+    try:
+        if model_dir and os.path.exists(model_dir):
+            result['data_storage'] = {
+                'model_dir': model_dir,
+                'files': {
+                    'all_data': f'model_{model_id}_all_data.csv',
+                    'model_file': os.path.basename(forecasting_model.model_file_path or f'model_{model_id}.pkl')
+                }
+            }
+    except Exception:
+        pass
+
+    return result
+
+
+def execute_training_job(job: TrainingJob, context) -> Dict[str, Any]:
+    """
+    Обработчик задачи обучения для воркера очереди (см. databaseadmin.jobs).
+    Прогресс обучения сохраняется в задаче, отмена проверяется на каждом этапе.
+    """
+    return run_training(job.forecasting_model, progress=context.progress)
@@ -0,0 +1,156 @@
+"""
+Дерево временных рядов для страницы дерева и JSON API.
+
+Узлы уровня (или поддерева до заданной глубины) читаются одним запросом:
+признак наличия детей и модели прогнозирования вычисляются подзапросами EXISTS,
+глубина берётся из таблицы замыкания.
+
+Версия дерева хранится в БД (databaseadmin.cache_versions), чтобы её видели все процессы,
+и меняется сигналами при изменении рядов и моделей прогнозирования; из неё строится ETag
+ответов API. Изменения в обход сигналов (QuerySet.update, bulk_create, правка в БД)
+версию не меняют.
+"""
+from typing import Any, Dict, List, Optional
+
+from django.db.models import Count, Exists, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+from . import cache_versions
+from .models import ForecastingModel, TimeSeries, Timestamp
+
+TREE_VERSION_KEY = 'tree'
+MAX_TREE_DEPTH = 20
+
+
+def tree_version() -> int:
+    """Текущая версия дерева"""
+    return cache_versions.get_version(TREE_VERSION_KEY)
+
+
+def bump_tree_version() -> None:
+    cache_versions.bump(TREE_VERSION_KEY)
+
+
+def _latest_model_id(series_ref: str) -> Subquery:
+    return Subquery(
+        ForecastingModel.objects
+        .filter(time_series=OuterRef(series_ref))
+        .order_by('-model_id')
+        .values('model_id')[:1]
+    )
+
+
+def annotated_series() -> QuerySet:
+    """Ряды с признаком наличия детей, названием продукта и id моделей ряда и его родителя"""
+    return TimeSeries.objects.annotate(
+        has_children=Exists(TimeSeries.objects.filter(parent_time_series=OuterRef('pk'))),
+        product_name=F('product__name'),
+        forecasting_model_id=_latest_model_id('pk'),
+        parent_forecasting_model_id=_latest_model_id('parent_time_series'),
+    )
+
+
+def _json_node(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': row['time_series_id'],
+        'text': row['name'],
+        'children': row['has_children'],
+        'data': {
+            'has_forecasting_model': row['forecasting_model_id'] is not None,
+            'forecasting_model_id': row['forecasting_model_id'],
+            'parent_forecasting_model_id': row['parent_forecasting_model_id'],
+        },
+    }
+
+
+def fetch_tree_level(parent_id: Optional[int] = None, depth: int = 1) -> List[Dict[str, Any]]:
+    """
+    Дочерние ряды parent_id (корни, если None) в формате jsTree, одним запросом.
+
+    При depth > 1 в 'children' загруженных узлов вложены их дети, вплоть до depth уровней;
+    у узлов последнего уровня 'children' - признак наличия детей (подгружаются отдельно).
+    """
+    depth = max(1, min(depth, MAX_TREE_DEPTH))
+    if parent_id is None:
+        nodes = annotated_series().filter(
+            ancestor_links__ancestor__parent_time_series__isnull=True,
+            ancestor_links__depth__lt=depth,
+        ).annotate(level=F('ancestor_links__depth') + 1)
+    else:
+        nodes = annotated_series().filter(
+            ancestor_links__ancestor_id=parent_id,
+            ancestor_links__depth__gte=1,
+            ancestor_links__depth__lte=depth,
+        ).annotate(level=F('ancestor_links__depth'))
+
+    rows = nodes.order_by('level', 'time_series_id').values(
+        'time_series_id', 'name', 'parent_time_series_id', 'level',
+        'has_children', 'forecasting_model_id', 'parent_forecasting_model_id',
+    )
+
+    by_id: Dict[int, Dict[str, Any]] = {}
+    top_level: List[Dict[str, Any]] = []
+    for row in rows:
+        node = _json_node(row)
+        if row['has_children'] and row['level'] < depth:
+            node['children'] = []
+        by_id[row['time_series_id']] = node
+
+        parent = by_id.get(row['parent_time_series_id'])
+        if row['level'] == 1:
+            top_level.append(node)
+        elif parent is not None:
+            parent['children'].append(node)
+    return top_level
+
+
+def fetch_forest() -> List[Dict[str, Any]]:
+    """
+    Всё дерево рядов для страницы дерева одним запросом: для каждого узла
+    продукт, число атрибутов с данными, модели прогнозирования узла и родителя,
+    дети и общее число потомков.
+    """
+    attribute_count = Subquery(
+        Timestamp.objects
+        .filter(time_series=OuterRef('pk'))
+        .order_by()
+        .values('time_series')
+        .annotate(count=Count('attribute', distinct=True))
+        .values('count')
+    )
+    rows = annotated_series().annotate(
+        attribute_count=Coalesce(attribute_count, 0),
+    ).order_by('time_series_id').values(
+        'time_series_id', 'name', 'parent_time_series_id', 'product_name', 'attribute_count',
+        'forecasting_model_id', 'parent_forecasting_model_id',
+    )
+
+    nodes: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        nodes[row['time_series_id']] = {
+            'id': row['time_series_id'],
+            'name': row['name'],
+            'product': row['product_name'] or 'Не указан',
+            'attribute_count': row['attribute_count'],
+            'has_forecasting_model': row['forecasting_model_id'] is not None,
+            'parent_has_forecasting_model': row['parent_forecasting_model_id'] is not None,
+            'parent_forecasting_model_id': row['parent_forecasting_model_id'],
+            'parent_id': row['parent_time_series_id'],
+            'children': [],
+        }
+
+    roots: List[Dict[str, Any]] = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent_id'])
+        if parent is None:
+            roots.append(node)
+        else:
+            parent['children'].append(node)
+
+    def count_descendants(node: Dict[str, Any]) -> int:
+        node['total_descendants'] = sum(1 + count_descendants(child) for child in node['children'])
+        return node['total_descendants']
+
+    for root in roots:
+        count_descendants(root)
+    return roots
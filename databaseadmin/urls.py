@@ -15,8 +15,19 @@ from .views.api_views import (
     create_forecasting_model, 
     train_forecasting_model, 
     get_time_series_attributes, 
+    aggregate_time_series_subtree,
     delete_forecasting_model,
-    forecast_child_series
+    forecast_child_series,
+    forecast_children_batch,
+    model_cache_stats,
+    hierarchy_cache_stats,
+    enqueue_training_job,
+    training_job_status,
+    cancel_training_job,
+    enqueue_ingestion_job,
+    ingestion_job_status,
+    cancel_ingestion_job,
+    resume_ingestion_job
 )
 from databaseadmin.views.hierarchy_views import TimeSeriesHierarchyView
 
@@ -33,11 +44,22 @@ urlpatterns = [
     path('download-template/<str:model_name>/', download_csv_template, name='download_csv_template'),
 
     path('timeseries/hierarchy/', TimeSeriesHierarchyView.as_view(), name='time_series_hierarchy'),
+    path('api/hierarchy/cache/', hierarchy_cache_stats, name='hierarchy_cache_stats'),
     
     # API-эндпоинты
     path('api/timeseries/<int:time_series_id>/attributes/', get_time_series_attributes, name='get_time_series_attributes'),
+    path('api/timeseries/<int:time_series_id>/aggregate/', aggregate_time_series_subtree, name='aggregate_time_series_subtree'),
     path('api/forecasting/create/', create_forecasting_model, name='create_forecasting_model'),
     path('api/forecasting/train/', train_forecasting_model, name='train_forecasting_model'),
     path('api/forecasting/delete/', delete_forecasting_model, name='delete_forecasting_model'),
     path('api/forecasting/forecast-child/', forecast_child_series, name='forecast_child_series'),
+    path('api/forecasting/forecast-children/', forecast_children_batch, name='forecast_children_batch'),
+    path('api/forecasting/model-cache/', model_cache_stats, name='model_cache_stats'),
+    path('api/forecasting/jobs/', enqueue_training_job, name='enqueue_training_job'),
+    path('api/forecasting/jobs/<int:job_id>/', training_job_status, name='training_job_status'),
+    path('api/forecasting/jobs/<int:job_id>/cancel/', cancel_training_job, name='cancel_training_job'),
+    path('api/ingestion/jobs/', enqueue_ingestion_job, name='enqueue_ingestion_job'),
+    path('api/ingestion/jobs/<int:job_id>/', ingestion_job_status, name='ingestion_job_status'),
+    path('api/ingestion/jobs/<int:job_id>/cancel/', cancel_ingestion_job, name='cancel_ingestion_job'),
+    path('api/ingestion/jobs/<int:job_id>/resume/', resume_ingestion_job, name='resume_ingestion_job'),
 ]
@@ -3,12 +3,21 @@ from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 import json
-import pandas as pd
-from ..models import TimeSeries, Attribute, Timestamp, ForecastingModel
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
+from ..models import TimeSeries, Attribute, Timestamp, ForecastingModel, TrainingJob, IngestionJob
+from ..training import run_training, TrainingError
+from ..importers import IMPORT_MODELS, CsvImportError
+from ..ingestion import create_ingestion_job
+from ..bulk import WRITE_MODE_REPLACE, WRITE_MODES
+from ..model_cache import model_cache
+from ..hierarchy_cache import hierarchy_cache
 import os
 import traceback
 import logging
-from ..forecasting import SARIMAXAutoForecaster
 
 @login_required
 @require_GET
@@ -38,6 +47,72 @@ def get_time_series_attributes(request, time_series_id: int) -> JsonResponse:
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _parse_period_bound(value):
+    """Граница периода из GET-параметра: дата (YYYY-MM-DD) или дата и время в ISO 8601"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Некорректная дата: {value}")
+        moment = datetime.combine(day, time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+@login_required
+@require_GET
+def aggregate_time_series_subtree(request, time_series_id: int) -> JsonResponse:
+    """
+    API-эндпоинт для агрегирования атрибута по ряду и всем его потомкам по периодам.
+
+    GET параметры:
+        attribute_id: ID атрибута (обязательный)
+        func: sum, avg, min, max или count (по умолчанию sum)
+        bucket: day, week или month (по умолчанию day)
+        start, end: Ограничение по start_dt, end не включается
+        include_self: false - учитывать только потомков
+    """
+    time_series = TimeSeries.objects.filter(time_series_id=time_series_id).first()
+    if time_series is None:
+        return JsonResponse({'error': 'Временной ряд не найден'}, status=404)
+
+    attribute_id = request.GET.get('attribute_id')
+    if not attribute_id or not attribute_id.isdigit():
+        return JsonResponse({'error': 'Не указан attribute_id'}, status=400)
+
+    func = request.GET.get('func', 'sum')
+    bucket = request.GET.get('bucket', 'day')
+    try:
+        rows = time_series.aggregate_subtree(
+            int(attribute_id),
+            func=func,
+            bucket=bucket,
+            start=_parse_period_bound(request.GET.get('start')),
+            end=_parse_period_bound(request.GET.get('end')),
+            include_self=request.GET.get('include_self', 'true').lower() not in ('false', '0'),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'time_series_id': time_series_id,
+        'attribute_id': int(attribute_id),
+        'func': func,
+        'bucket': bucket,
+        'buckets': [
+            {
+                'bucket': row['bucket'].isoformat(),
+                'value': row['value'],
+                'points': row['points'],
+                'series': row['series'],
+                'skipped': row['skipped'],
+            }
+            for row in rows
+        ],
+    })
+
 @login_required
 @require_POST
 @csrf_exempt
@@ -115,7 +190,8 @@ def create_forecasting_model(request) -> JsonResponse:
 def train_forecasting_model(request) -> JsonResponse:
     """
     API-эндпоинт для обучения модели прогнозирования
-    Использует SARIMAXAutoForecaster
+    Использует SARIMAXAutoForecaster. Обучение выполняется в рамках запроса,
+    для долгих обучений используйте очередь задач (enqueue_training_job)
     """
     try:
         data = json.loads(request.body)
@@ -129,200 +205,10 @@ def train_forecasting_model(request) -> JsonResponse:
         except ForecastingModel.DoesNotExist:
             return JsonResponse({'error': 'Модель не найдена'}, status=404)
         
-        time_series = forecasting_model.time_series
-        feature_attribute = forecasting_model.feature_attribute
-        target_attribute = forecasting_model.target_attribute
-        
-        feature_timestamps = Timestamp.objects.filter(
-            time_series=time_series,
-            attribute=feature_attribute
-        ).order_by('start_dt')
-        
-        target_timestamps = Timestamp.objects.filter(
-            time_series=time_series, 
-            attribute=target_attribute
-        ).order_by('start_dt')
-        
-        if not feature_timestamps.exists() or not target_timestamps.exists():
-            return JsonResponse({'error': 'Недостаточно данных для обучения модели'}, status=400)
-            
-        try:
-            feature_data = {
-                ts.start_dt.date(): float(ts.value) 
-                for ts in feature_timestamps 
-                if ts.value and ts.value.strip()
-            }
-            
-            target_data = {
-                ts.start_dt.date(): float(ts.value) 
-                for ts in target_timestamps 
-                if ts.value and ts.value.strip()
-            }
-        except ValueError as e:
-            error_msg = f"Ошибка при преобразовании данных: {str(e)}"
-            logging.error(error_msg)
-            return JsonResponse({'error': error_msg}, status=400)
-        
-        common_dates = sorted(set(feature_data.keys()) & set(target_data.keys()))
-        
-        if not common_dates:
-            return JsonResponse({'error': 'Нет общих дат между атрибутами'}, status=400)
-            
-        if len(common_dates) < 30:  
-            return JsonResponse(
-                {'error': f'Недостаточно данных для обучения модели (нужно минимум 30 точек, найдено {len(common_dates)})'},
-                status=400
-            )
-            
-        common_dates_ts = pd.to_datetime(common_dates)
-        all_price = pd.Series({pd.Timestamp(date): float(feature_data[date]) for date in common_dates})
-        all_traffic = pd.Series({pd.Timestamp(date): float(target_data[date]) for date in common_dates})
-        
-        try:
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.abspath(os.path.join(current_dir, '..', '..'))
-            
-            temp_dir = os.path.join(project_root, 'models')
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            model_dir = os.path.join(temp_dir, f'model_dir_{model_id}')
-            os.makedirs(model_dir, exist_ok=True)
-                        
-            all_data_filename = os.path.join(model_dir, f'model_{model_id}_all_data.csv')
-            
-            df_all = pd.DataFrame({
-                'date': [date.strftime('%Y-%m-%d') for date in common_dates_ts],
-                f'{feature_attribute.name}': all_price.values,
-                f'{target_attribute.name}': all_traffic.values
-            })
-            
-            df_all.to_csv(all_data_filename, index=False)
-            
-            logging.info(f"Данные для модели {model_id} сохранены в директории {model_dir}")
-        except Exception as e:
-            logging.error(f"Ошибка при сохранении данных: {str(e)}")
-            logging.error(traceback.format_exc())
-            model_dir = None
-                
-        try:
-            forecaster = SARIMAXAutoForecaster(
-                arima_orders=[(1,1,1), (2,1,2), (1,1,0), (0,1,1)], 
-                seasonal_orders=[(1,1,1,7), (0,1,1,7)],            
-                max_lags=30,
-                top_k_features=10,
-                train_ratio=0.8
-            )
-            
-            train_size = int(len(common_dates) * 0.8)
-            train_dates = common_dates[:train_size]
-            test_dates = common_dates[train_size:]
-            
-            train_dates_ts = pd.to_datetime(train_dates)
-            test_dates_ts = pd.to_datetime(test_dates)
-            
-            train_price = all_price.loc[train_dates_ts]
-            train_traffic = all_traffic.loc[train_dates_ts]
-            
-            test_price = all_price.loc[test_dates_ts]
-            test_traffic = all_traffic.loc[test_dates_ts]
-            
-            logging.info(f"Начало обучения модели ID {model_id} с помощью SARIMAXAutoForecaster")
-            forecaster.fit(train_traffic, train_price)
-            logging.info(f"Модель ID {model_id} успешно обучена")
-            
-            try:
-                logging.info("Начинаем оценку качества прогнозирования на тестовой выборке")
-                
-                combined_price = pd.concat([train_price, test_price])
-                
-                predictions = forecaster.predict(combined_price)
-                
-                test_predictions = predictions.loc[test_dates_ts] if test_dates_ts[0] in predictions.index else None
-                
-                if test_predictions is None or len(test_predictions) != len(test_traffic):
-                    logging.warning(f"Прогнозные даты не совпадают с тестовыми! Корректируем индексы.")
-                    logging.warning(f"Прогнозные даты: {predictions.index}")
-                    logging.warning(f"Тестовые даты: {test_traffic.index}")
-                    
-                    common_idx = pd.DatetimeIndex(
-                        predictions.index.intersection(test_traffic.index.to_list())
-                    )
-                    if len(common_idx) > 0:
-                        test_predictions = predictions.loc[common_idx]
-                        test_traffic_adj = test_traffic.loc[common_idx]
-                        mape = forecaster.get_mape(test_traffic_adj, test_predictions)
-                    else:
-                        if len(predictions) >= len(test_traffic):
-                            adjusted_predictions = pd.Series(
-                                predictions.values[-len(test_traffic):], 
-                                index=test_traffic.index
-                            )
-                            mape = forecaster.get_mape(test_traffic, adjusted_predictions)
-                        else:
-                            raise ValueError("Не удалось сопоставить прогнозные и тестовые данные")
-                else:
-                    mape = forecaster.get_mape(test_traffic, test_predictions)
-                
-                logging.info(f"MAPE на тестовой выборке: {mape:.2f}%")
-                
-                logging.info("Обучаем финальную модель на всех данных")
-                final_forecaster = SARIMAXAutoForecaster(
-                    arima_orders=forecaster.arima_orders,
-                    seasonal_orders=forecaster.seasonal_orders,
-                    max_lags=forecaster.max_lags,
-                    top_k_features=forecaster.top_k,
-                    train_ratio=0.8
-                )
-                final_forecaster.fit(all_traffic, all_price)
-                
-                forecasting_model.save_model_object(final_forecaster)
-                
-            except Exception as eval_error:
-                logging.error(f"Ошибка при оценке качества модели: {str(eval_error)}")
-                logging.error(traceback.format_exc())
-                mape = None
-                
-                forecasting_model.save_model_object(forecaster)
-            
-            best_order = forecaster.best_order_
-            best_seasonal_order = forecaster.best_seasonal_order_
-            
-            model_info = forecaster.summary()
-            logging.info(f"Дополнительная информация о модели: {model_info}")
-            
-        except Exception as e:
-            error_msg = f"Ошибка при обучении модели: {str(e)}"
-            logging.error(error_msg)
-            logging.error(traceback.format_exc())
-            return JsonResponse({'error': error_msg}, status=500)
-        
-        result = {
-            'status': 'success',
-            'message': 'Модель успешно обучена',
-            'model_id': model_id,
-            'model_type': 'sarimax',
-            'model_params': {
-                'order': str(best_order) if best_order else "неизвестно",
-                'seasonal_order': str(best_seasonal_order) if best_seasonal_order else "неизвестно"
-            }
-        }
-        
-        if mape is not None:
-            result['mape'] = round(mape, 2)
-            result['training_points'] = len(train_dates)
-            result['test_points'] = len(test_dates)
-        
         try:
-            if model_dir and os.path.exists(model_dir):
-                result['data_storage'] = {
-                    'model_dir': model_dir,
-                    'files': {
-                        'all_data': f'model_{model_id}_all_data.csv',
-                        'model_file': f'model_{model_id}.pkl'
-                    }
-                }
-        except Exception:
-            pass
+            result = run_training(forecasting_model)
+        except TrainingError as e:
+            return JsonResponse({'error': e.message}, status=e.status)
             
         return JsonResponse(result)
     
@@ -335,6 +221,185 @@ def train_forecasting_model(request) -> JsonResponse:
         logging.error(traceback.format_exc())
         return JsonResponse({'error': error_msg}, status=500)
 
+@login_required
+@require_POST
+@csrf_exempt
+def enqueue_training_job(request) -> JsonResponse:
+    """
+    API-эндпоинт для постановки обучения модели в очередь.
+    Обучение выполняет воркер (manage.py run_worker), статус доступен по status_url.
+    Если для модели уже есть активная задача, возвращается она.
+    """
+    try:
+        data = json.loads(request.body)
+        model_id = data.get('model_id')
+
+        if not model_id:
+            return JsonResponse({'error': 'Не указан ID модели'}, status=400)
+
+        try:
+            forecasting_model = ForecastingModel.objects.get(model_id=model_id)
+        except ForecastingModel.DoesNotExist:
+            return JsonResponse({'error': 'Модель не найдена'}, status=404)
+
+        with transaction.atomic():
+            job = TrainingJob.objects.select_for_update().filter(
+                forecasting_model=forecasting_model,
+                status__in=TrainingJob.ACTIVE_STATUSES,
+                cancel_requested=False
+            ).first()
+            created = job is None
+            if created:
+                job = TrainingJob.objects.create(forecasting_model=forecasting_model)
+
+        response = job.to_dict()
+        response['status_url'] = reverse('training_job_status', args=[job.job_id])
+        return JsonResponse(response, status=202 if created else 200)
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Некорректный формат JSON'}, status=400)
+
+    except Exception as e:
+        error_msg = f"Ошибка при постановке обучения в очередь: {str(e)}"
+        logging.error(error_msg)
+        logging.error(traceback.format_exc())
+        return JsonResponse({'error': error_msg}, status=500)
+
+@login_required
+@require_GET
+def training_job_status(request, job_id: int) -> JsonResponse:
+    """
+    API-эндпоинт для получения статуса и прогресса задачи обучения
+    """
+    try:
+        job = TrainingJob.objects.get(job_id=job_id)
+    except TrainingJob.DoesNotExist:
+        return JsonResponse({'error': 'Задача не найдена'}, status=404)
+
+    return JsonResponse(job.to_dict())
+
+@login_required
+@require_POST
+@csrf_exempt
+def cancel_training_job(request, job_id: int) -> JsonResponse:
+    """
+    API-эндпоинт для отмены задачи обучения.
+    Задача в очереди отменяется сразу, выполняющаяся - останавливается воркером.
+    """
+    with transaction.atomic():
+        try:
+            job = TrainingJob.objects.select_for_update().get(job_id=job_id)
+        except TrainingJob.DoesNotExist:
+            return JsonResponse({'error': 'Задача не найдена'}, status=404)
+
+        if job.status not in TrainingJob.ACTIVE_STATUSES:
+            return JsonResponse({'error': f'Задача уже завершена (статус: {job.status})'}, status=400)
+
+        job.request_cancel()
+
+    return JsonResponse(job.to_dict())
+
+@login_required
+@require_POST
+@csrf_exempt
+def enqueue_ingestion_job(request) -> JsonResponse:
+    """
+    API-эндпоинт для фонового импорта CSV (multipart: file, model, dedupe).
+    model - product, attribute, timeseries или timestamp. Импорт выполняет воркер
+    (manage.py run_worker) частями с контрольными точками, статус доступен по status_url.
+    """
+    models_by_name = {model._meta.model_name: model for model in IMPORT_MODELS}
+    model = models_by_name.get(request.POST.get('model'))
+    if model is None:
+        return JsonResponse({'error': f"Укажите модель: {', '.join(models_by_name)}"}, status=400)
+    if 'file' not in request.FILES:
+        return JsonResponse({'error': 'Файл не найден'}, status=400)
+    if (request.FILES['file'].name or '').lower().endswith('.parquet'):
+        return JsonResponse({'error': 'Parquet импортируется сразу, через загрузку на странице таймстемпов'},
+                            status=400)
+
+    try:
+        job = create_ingestion_job(model, request.FILES['file'], dedupe=request.POST.get('dedupe') == '1')
+    except CsvImportError as e:
+        return JsonResponse({'error': str(e), **e.details}, status=400)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        error_msg = f"Ошибка при постановке импорта в очередь: {str(e)}"
+        logging.error(error_msg)
+        logging.error(traceback.format_exc())
+        return JsonResponse({'error': error_msg}, status=500)
+
+    response = job.to_dict()
+    response['status_url'] = reverse('ingestion_job_status', args=[job.job_id])
+    return JsonResponse(response, status=202)
+
+@login_required
+@require_GET
+def ingestion_job_status(request, job_id: int) -> JsonResponse:
+    """
+    API-эндпоинт для получения статуса, прогресса и контрольной точки задачи импорта
+    """
+    try:
+        job = IngestionJob.objects.get(job_id=job_id)
+    except IngestionJob.DoesNotExist:
+        return JsonResponse({'error': 'Задача не найдена'}, status=404)
+
+    return JsonResponse(job.to_dict())
+
+@login_required
+@require_POST
+@csrf_exempt
+def cancel_ingestion_job(request, job_id: int) -> JsonResponse:
+    """
+    API-эндпоинт для отмены задачи импорта.
+    Уже записанные части остаются в БД, загруженный файл удаляется.
+    """
+    with transaction.atomic():
+        try:
+            job = IngestionJob.objects.select_for_update().get(job_id=job_id)
+        except IngestionJob.DoesNotExist:
+            return JsonResponse({'error': 'Задача не найдена'}, status=404)
+
+        if job.status not in IngestionJob.ACTIVE_STATUSES:
+            return JsonResponse({'error': f'Задача уже завершена (статус: {job.status})'}, status=400)
+
+        job.request_cancel()
+
+    if job.status == IngestionJob.STATUS_CANCELLED and os.path.exists(job.file_path):
+        os.remove(job.file_path)
+    return JsonResponse(job.to_dict())
+
+@login_required
+@require_POST
+@csrf_exempt
+def resume_ingestion_job(request, job_id: int) -> JsonResponse:
+    """
+    API-эндпоинт для повторного запуска задачи импорта, завершившейся ошибкой.
+    Импорт продолжается с контрольной точки.
+    """
+    with transaction.atomic():
+        try:
+            job = IngestionJob.objects.select_for_update().get(job_id=job_id)
+        except IngestionJob.DoesNotExist:
+            return JsonResponse({'error': 'Задача не найдена'}, status=404)
+
+        if job.status != IngestionJob.STATUS_FAILED:
+            return JsonResponse({'error': f'Возобновить можно только задачу с ошибкой (статус: {job.status})'},
+                                status=400)
+        if not os.path.exists(job.file_path):
+            return JsonResponse({'error': 'Загруженный файл задачи не найден'}, status=400)
+
+        job.status = IngestionJob.STATUS_QUEUED
+        job.error = None
+        job.finished_at = None
+        job.message = f'Продолжение со строки {job.line_number + 1}'
+        job.save(update_fields=['status', 'error', 'finished_at', 'message'])
+
+    response = job.to_dict()
+    response['status_url'] = reverse('ingestion_job_status', args=[job.job_id])
+    return JsonResponse(response, status=202)
+
 @login_required
 @require_POST
 @csrf_exempt
@@ -396,6 +461,7 @@ def _delete_model_files(forecasting_model):
     """
     Вспомогательная функция для удаления файлов модели
     """
+    model_cache.invalidate(forecasting_model.model_id)
     try:
         if forecasting_model.model_file_path and os.path.exists(forecasting_model.model_file_path):
             model_dir = os.path.dirname(forecasting_model.model_file_path)
@@ -425,10 +491,14 @@ def forecast_child_series(request):
         data = json.loads(request.body)
         parent_model_id = data.get('parent_model_id')
         child_series_id = data.get('child_series_id')
+        write_mode = data.get('write_mode', WRITE_MODE_REPLACE)
         
         if not parent_model_id or not child_series_id:
             return JsonResponse({'error': 'Не указаны обязательные параметры'}, status=400)
         
+        if write_mode not in WRITE_MODES:
+            return JsonResponse({'error': f'Неизвестный режим записи: {write_mode}'}, status=400)
+        
         # Проверяем существование дочернего ряда
         try:
             child_series = TimeSeries.objects.get(time_series_id=child_series_id)
@@ -458,7 +528,8 @@ def forecast_child_series(request):
         result = make_forecast_for_child_series(
             parent_model_id=parent_model_id,
             child_series_id=child_series_id,
-            forecast_periods=forecast_periods
+            forecast_periods=forecast_periods,
+            write_mode=write_mode
         )
         
         if result['success']:
@@ -471,4 +542,58 @@ def forecast_child_series(request):
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Неверный формат JSON'}, status=400)
     except Exception as e:
-        return JsonResponse({'error': f'Произошла ошибка: {str(e)}'}, status=500) 
\ No newline at end of file
+        return JsonResponse({'error': f'Произошла ошибка: {str(e)}'}, status=500)
+
+
+@require_POST
+@login_required
+def forecast_children_batch(request):
+    """
+    API-представление для прогнозирования всех дочерних рядов (или всего поддерева)
+    ряда модели за один запрос.
+    """
+    try:
+        data = json.loads(request.body)
+        model_id = data.get('model_id')
+        include_descendants = bool(data.get('include_descendants', False))
+        write_mode = data.get('write_mode', WRITE_MODE_REPLACE)
+        
+        if not model_id:
+            return JsonResponse({'error': 'Не указан ID модели'}, status=400)
+        
+        if write_mode not in WRITE_MODES:
+            return JsonResponse({'error': f'Неизвестный режим записи: {write_mode}'}, status=400)
+        
+        if not ForecastingModel.objects.filter(model_id=model_id).exists():
+            return JsonResponse({'error': 'Модель прогнозирования не найдена'}, status=404)
+        
+        from databaseadmin.forecasting import make_forecasts_for_children
+        result = make_forecasts_for_children(
+            parent_model_id=model_id,
+            include_descendants=include_descendants,
+            write_mode=write_mode
+        )
+        
+        return JsonResponse(result, status=200 if result['success'] else 400)
+            
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Неверный формат JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'Произошла ошибка: {str(e)}'}, status=500)
+
+@require_GET
+@login_required
+def model_cache_stats(request):
+    """
+    API-эндпоинт со статистикой кэша загруженных моделей текущего процесса
+    """
+    return JsonResponse(model_cache.stats())
+
+
+@require_GET
+@login_required
+def hierarchy_cache_stats(request):
+    """
+    API-эндпоинт со статистикой кэша таймстемпов иерархии (счётчики текущего процесса)
+    """
+    return JsonResponse(hierarchy_cache.stats())
@@ -2,12 +2,17 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.http import JsonResponse, StreamingHttpResponse, HttpResponseNotFound, HttpResponse, HttpRequest
 from django.contrib.auth.decorators import login_required
-from ..models import TimeSeries, Product, Attribute, Timestamp, ForecastingModel
-from .utils import export_to_csv
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from ..models import TimeSeries, Product, Attribute, Timestamp
+from ..hierarchy_cache import hierarchy_cache
+from ..tree import fetch_forest, fetch_tree_level, tree_version
+from .utils import export_to_csv, export_to_parquet
+from ..wide_format import template_rows
 import io
 import csv
-from django.db import models
-from typing import List, Dict, Any, Optional, Type, TypeVar, Union, Set
+from django.db import models, transaction
+from typing import List, Dict, Any, Optional, Type, TypeVar, Union
 from django.db.models import Model, QuerySet
 
 T = TypeVar('T', bound=Model)
@@ -20,29 +25,31 @@ def home(request: HttpRequest) -> HttpResponse:
     return render(request, 'home.html')
 
 
+def _tree_json_etag(request: HttpRequest) -> str:
+    return f"tree-{tree_version()}-{request.GET.get('parent_id', '')}-{request.GET.get('depth', '')}"
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_tree_json_etag)
 def timeseries_tree_json(request: HttpRequest) -> JsonResponse:
     """
     Представление для получения данных о дереве временных рядов в формате JSON.
     Используется для построения динамического дерева на клиентской стороне.
+
+    GET параметры:
+        parent_id: ID родительского ряда (пусто - корневые ряды)
+        depth: Сколько уровней вернуть (по умолчанию 1, остальные подгружаются по запросу)
     """
     parent_id: Optional[Union[str, None]] = request.GET.get('parent_id')
 
-    if parent_id in (None, '', 'null', 'None'):
-        children: QuerySet[TimeSeries] = TimeSeries.objects.filter(
-            parent_time_series__isnull=True)
-    else:
-        children: QuerySet[TimeSeries] = TimeSeries.objects.filter(
-            parent_time_series_id=parent_id)
-
-    data: List[Dict[str, Any]] = []
-    for ts in children:
-        has_children: bool = TimeSeries.objects.filter(
-            parent_time_series=ts).exists()
-        data.append({
-            "id": ts.time_series_id,
-            "text": ts.name,
-            "children": has_children,
-        })
+    try:
+        depth = int(request.GET.get('depth', 1))
+        if parent_id in (None, '', 'null', 'None'):
+            data = fetch_tree_level(None, depth)
+        else:
+            data = fetch_tree_level(int(parent_id), depth)
+    except ValueError:
+        return JsonResponse({'error': 'parent_id и depth должны быть целыми числами'}, status=400)
 
     return JsonResponse(data, safe=False)
 
@@ -74,7 +81,11 @@ def delete_object(request: HttpRequest, model_name: str, pk: int) -> HttpRespons
             return redirect('home')
 
         instance: Model = get_object_or_404(model, pk=pk)
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            # Таймстемпы обновляют effective_timestamps и кэш иерархии сами (Timestamp.delete)
+            if isinstance(instance, Attribute):
+                hierarchy_cache.invalidate_all()
         messages.success(
             request, f"{model_name.capitalize()} успешно удалён(а).")
 
@@ -90,88 +101,7 @@ def time_series_tree_view(request: HttpRequest) -> HttpResponse:
     """
     Отображает страницу с древовидным представлением временных рядов.
     """
-    root_series: QuerySet[TimeSeries] = TimeSeries.objects.filter(
-        parent_time_series__isnull=True).order_by('time_series_id')
-    
-    # Собираем информацию о моделях прогнозирования
-    forecasting_models = ForecastingModel.objects.all()
-    forecasting_model_ids = {model.time_series.time_series_id: model.model_id for model in forecasting_models}
-    
-    # Словарь для хранения количества атрибутов для каждого временного ряда
-    timestamp_counts: Dict[int, int] = {}
-    
-    # Собираем информацию о доступных атрибутах для каждого временного ряда
-    all_time_series_attributes: Dict[int, Set[int]] = {}
-    
-    all_timestamps = Timestamp.objects.values('time_series_id', 'attribute_id').distinct()
-    for item in all_timestamps:
-        ts_id = item['time_series_id']
-        if ts_id not in all_time_series_attributes:
-            all_time_series_attributes[ts_id] = set()
-        all_time_series_attributes[ts_id].add(item['attribute_id'])
-        
-    for ts_id, attrs in all_time_series_attributes.items():
-        timestamp_counts[ts_id] = len(attrs)
-
-    def get_children(parent_id: int) -> List[Dict[str, Any]]:
-        children: QuerySet[TimeSeries] = TimeSeries.objects.filter(
-            parent_time_series_id=parent_id)
-        data: List[Dict[str, Any]] = []
-        for child in children:
-            attribute_count = timestamp_counts.get(child.time_series_id, 0)
-            
-            has_forecasting_model = child.time_series_id in forecasting_model_ids
-            
-            # Проверяем, есть ли у родителя модель прогнозирования
-            parent_has_forecasting_model = parent_id in forecasting_model_ids
-            parent_forecasting_model_id = forecasting_model_ids.get(parent_id, None)
-            
-            child_data: Dict[str, Any] = {
-                'id': child.time_series_id,
-                'name': child.name,
-                'product': child.product.name if child.product else 'Не указан',
-                'attribute_count': attribute_count,
-                'has_forecasting_model': has_forecasting_model,
-                'parent_has_forecasting_model': parent_has_forecasting_model,
-                'parent_forecasting_model_id': parent_forecasting_model_id,
-            }
-
-            child_children: List[Dict[str, Any]
-                                 ] = get_children(child.time_series_id)
-            child_data['children'] = child_children
-
-            total_descendants: int = len(child_children)
-            for descendant in child_children:
-                total_descendants += descendant.get('total_descendants', 0)
-            child_data['total_descendants'] = total_descendants
-
-            data.append(child_data)
-        return data
-
-    time_series: List[Dict[str, Any]] = []
-    for root in root_series:
-        attribute_count = timestamp_counts.get(root.time_series_id, 0)
-        
-        has_forecasting_model = root.time_series_id in forecasting_model_ids
-        
-        children: List[Dict[str, Any]] = get_children(root.time_series_id)
-
-        total_descendants: int = len(children)
-        for child in children:
-            total_descendants += child.get('total_descendants', 0)
-
-        time_series.append({
-            'id': root.time_series_id,
-            'name': root.name,
-            'product': root.product.name if root.product else 'Не указан',
-            'children': children,
-            'total_descendants': total_descendants,
-            'attribute_count': attribute_count,
-            'has_forecasting_model': has_forecasting_model,
-            'parent_has_forecasting_model': False,  # У корневых узлов нет родителей
-            'parent_forecasting_model_id': None,
-        })
-
+    time_series: List[Dict[str, Any]] = fetch_forest()
     return render(request, 'time_series_tree.html', {'time_series': time_series})
 
 
@@ -179,6 +109,7 @@ def time_series_tree_view(request: HttpRequest) -> HttpResponse:
 def export_single_table(request: HttpRequest, model_name: str) -> StreamingHttpResponse | HttpResponseNotFound:
     """
     Экспортирует данные из отдельной таблицы в CSV-файл.
+    Таймстемпы: ?layout=wide - широкий CSV, ?format=parquet - широкий Parquet.
     
     Args:
         request: HTTP запрос
@@ -196,7 +127,11 @@ def export_single_table(request: HttpRequest, model_name: str) -> StreamingHttpR
         return HttpResponseNotFound("Указанная модель не найдена")
     
     queryset = model.objects.all()
-    
+
+    if model is Timestamp and request.GET.get('format') == 'parquet':
+        return export_to_parquet(queryset)
+    if model is Timestamp and request.GET.get('layout') == 'wide':
+        return export_to_csv(queryset, model=model, layout='wide')
     return export_to_csv(queryset, model=model)
 
 
@@ -221,6 +156,7 @@ FIELD_EXAMPLES = {
 def download_csv_template(request: HttpRequest, model_name: str) -> HttpResponse:
     """
     Скачивание шаблона CSV для указанной модели.
+    Для таймстемпов ?layout=wide - шаблон широкого формата со столбцами существующих атрибутов.
     """
     model_map = {
         'products': Product,
@@ -236,9 +172,17 @@ def download_csv_template(request: HttpRequest, model_name: str) -> HttpResponse
     output = io.StringIO()
     writer = csv.writer(output)
 
+    if model is Timestamp and request.GET.get('layout') == 'wide':
+        header, example_row = template_rows()
+        writer.writerow(header)
+        writer.writerow(example_row)
+        response = HttpResponse(output.getvalue(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{model_name}_wide_template.csv"'
+        return response
+
     fields = []
     for field in model._meta.fields:
-        if isinstance(field, models.AutoField) or (hasattr(field, 'auto_created') and field.auto_created):
+        if isinstance(field, models.AutoField) or (hasattr(field, 'auto_created') and field.auto_created) or not field.editable:
             continue
 
         field_info = {
@@ -1,14 +1,16 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.http import JsonResponse, HttpRequest, HttpResponse, StreamingHttpResponse
-from django.db import transaction
-import csv
-import io
+from django.conf import settings
+from django.urls import reverse
+from ..importers import CsvImportError, import_csv
+from ..ingestion import create_ingestion_job, read_header
+from ..wide_format import import_wide, is_wide_header
 from ..models import Product, Attribute, TimeSeries, Timestamp
+from ..pagination import KeysetPaginator
 from ..forms import ProductForm, AttributeForm, TimeSeriesForm, TimestampForm
-from .utils import apply_filters, apply_sorting, export_to_csv, get_field_types, get_field_info, convert_fields_to_tuple, split_foreign_keys_to_fields
+from .utils import apply_filters, apply_sorting, export_to_csv, export_to_parquet, EXPORT_LAYOUTS, get_field_types, get_field_info, convert_fields_to_tuple, split_foreign_keys_to_fields, list_queryset, list_values
 from typing import Dict, List, Any, Type
 from django.db.models import Model, QuerySet
 from django.forms import ModelForm
@@ -17,101 +19,40 @@ from django.db import models
 
 def handle_csv_upload(request: HttpRequest, model: Type[Model]) -> JsonResponse | StreamingHttpResponse:
     """
-    Обрабатывает загрузку CSV файла.
+    Обрабатывает загрузку CSV файла: потоковый импорт пачками (databaseadmin.importers).
+    Файлы больше INGESTION_ASYNC_THRESHOLD (или при async=1) импортируются в фоне (databaseadmin.ingestion):
+    ответ 202 с задачей и status_url для опроса прогресса. dedupe=1 - обновлять таймстемпы с тем же ключом.
+    Таймстемпы принимаются и в широком формате (databaseadmin.wide_format): CSV определяется по заголовку,
+    файлы .parquet всегда широкие и импортируются сразу.
     """
     if 'file' not in request.FILES:
         return JsonResponse({'error': 'Файл не найден'}, status=400)
 
     file = request.FILES['file']
-    if file.size > 10 * 1024 * 1024:  # 10MB
-        return JsonResponse({'error': 'Файл слишком большой (макс. 10MB)'}, status=400)
+    max_size: int = getattr(settings, 'CSV_IMPORT_MAX_SIZE', 0)
+    if max_size and file.size > max_size:
+        return JsonResponse({'error': f'Файл слишком большой (макс. {max_size // 2**20} МБ)'}, status=400)
 
+    dedupe = request.POST.get('dedupe') == '1'
+    threshold: int = getattr(settings, 'INGESTION_ASYNC_THRESHOLD', 0)
     try:
-        content = file.read().decode('utf-8-sig')
-        reader = csv.DictReader(io.StringIO(content))
-
-        # Получаем имя первичного ключа модели, если есть
-        pk_name = model._meta.pk.name if model._meta.pk is not None else 'id'
-        
-        required_fields = [
-            f.name for f in model._meta.fields if not f.auto_created and f.name != pk_name and not f.blank]
-        missing_fields = [
-            field for field in required_fields if field not in reader.fieldnames]
-
-        if missing_fields:
-            return JsonResponse({
-                'error': 'Отсутствуют обязательные поля',
-                'missing_fields': missing_fields
-            }, status=400)
-
-        # Получаем информацию о всех полях модели
-        model_fields = {}
-        for field in model._meta.fields:
-            model_fields[field.name] = field
-
-        with transaction.atomic():
-            success_count = 0
-            error_count = 0
-            errors = []
-
-            for row in reader:
-                try:
-                    # Преобразуем ключи словаря в строки и удаляем пустые значения
-                    cleaned_row = {}
-                    for k, v in row.items():
-                        if v and k is not None:
-                            key = str(k).strip()
-                            if isinstance(v, str):
-                                cleaned_row[key] = v.strip()
-                            else:
-                                cleaned_row[key] = v
-                    
-                    # Обрабатываем внешние ключи (ForeignKey)
-                    for field_name, value in list(cleaned_row.items()):
-                        if field_name in model_fields and hasattr(model_fields[field_name], 'related_model'):
-                            field = model_fields[field_name]
-                            related_model = field.related_model
-                            
-                            # Проверяем, что related_model не является None
-                            if related_model is None:
-                                continue
-                                
-                            # Пробуем найти объект по ID
-                            if isinstance(value, str) and value.isdigit():
-                                try:
-                                    related_obj = related_model.objects.get(pk=int(value))
-                                    cleaned_row[field_name] = related_obj
-                                    continue
-                                except Exception:
-                                    # В случае любой ошибки продолжаем и пробуем другие способы поиска
-                                    pass
-                                
-                            # Если не удалось найти по ID, пробуем найти по имени (если есть поле name)
-                            if isinstance(value, str):
-                                try:
-                                    if hasattr(related_model, 'name'):
-                                        related_obj = related_model.objects.get(name=value)
-                                        cleaned_row[field_name] = related_obj
-                                    else:
-                                        raise ValueError(f"Не удалось найти объект {related_model.__name__} с именем '{value}'")
-                                except Exception as e:
-                                    error_msg = f"Не удалось найти объект {related_model.__name__} с ID или именем '{value}'"
-                                    raise ValueError(error_msg)
-                    
-                    model.objects.create(**cleaned_row)
-                    success_count += 1
-                except Exception as e:
-                    error_count += 1
-                    errors.append(str(e))
-
-            return JsonResponse({
-                'success': True,
-                'processed': success_count + error_count,
-                'success_count': success_count,
-                'error_count': error_count,
-                'errors': errors[:10]  
-            })
-
+        if (file.name or '').lower().endswith('.parquet'):
+            if model is not Timestamp:
+                return JsonResponse({'error': 'Parquet поддерживается только для таймстемпов'}, status=400)
+            return JsonResponse(import_wide(file, file_format='parquet', dedupe=dedupe))
+        if request.POST.get('async') == '1' or (threshold and file.size > threshold):
+            job = create_ingestion_job(model, file, dedupe=dedupe)
+            response = job.to_dict()
+            response['status_url'] = reverse('ingestion_job_status', args=[job.job_id])
+            return JsonResponse(response, status=202)
+        if model is Timestamp:
+            header, _ = read_header(file)
+            file.seek(0)
+            if is_wide_header(header):
+                return JsonResponse(import_wide(file, dedupe=dedupe))
+        return JsonResponse(import_csv(model, file, dedupe=dedupe))
+    except CsvImportError as e:
+        return JsonResponse({'error': str(e), **e.details}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
@@ -151,9 +92,8 @@ def product_view(request: HttpRequest) -> HttpResponse | StreamingHttpResponse:
         f.name for f in Product._meta.fields 
         if not f.auto_created and f.name != pk_name and not f.blank]
     
-    paginator = Paginator(products, 50)
-    page_number = request.GET.get('page', '1')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(list_queryset(products, Product), 50).get_page(
+        request.GET.get('page', '1'), request.GET.get('cursor'), request.GET.get('direction') == 'prev')
 
     return render(request, 'data_view.html', {
         'title': 'Продукты',
@@ -207,9 +147,8 @@ def attribute_view(request: HttpRequest) -> HttpResponse | StreamingHttpResponse
         f.name for f in Attribute._meta.fields 
         if not f.auto_created and f.name != pk_name and not f.blank]
     
-    paginator = Paginator(attributes, 50)
-    page_number = request.GET.get('page', '1')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(list_queryset(attributes, Attribute), 50).get_page(
+        request.GET.get('page', '1'), request.GET.get('cursor'), request.GET.get('direction') == 'prev')
 
     return render(request, 'data_view.html', {
         'title': 'Атрибуты',
@@ -263,9 +202,8 @@ def timeseries_view(request: HttpRequest) -> (HttpResponse | JsonResponse | Stre
     if request.GET.get('export') == '1':
         return export_to_csv(qs, model=TimeSeries)
 
-    paginator: Paginator = Paginator(qs, 50)
-    page_number: str = request.GET.get('page', '1')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(list_queryset(qs, TimeSeries), 50).get_page(
+        request.GET.get('page', '1'), request.GET.get('cursor'), request.GET.get('direction') == 'prev')
 
     fields_tuple = split_foreign_keys_to_fields(TimeSeries)
 
@@ -320,11 +258,13 @@ def timestamp_view(request: HttpRequest) -> (HttpResponse | JsonResponse | Strea
         if not f.auto_created and f.name != pk_name and not f.blank]
 
     if request.GET.get('export') == '1':
-        return export_to_csv(qs, model=Timestamp)
+        if request.GET.get('format') == 'parquet':
+            return export_to_parquet(qs)
+        layout = request.GET.get('layout')
+        return export_to_csv(qs, model=Timestamp, layout=layout if layout in EXPORT_LAYOUTS else 'long')
 
-    paginator: Paginator = Paginator(qs, 50)
-    page_number: str = request.GET.get('page', '1')
-    page_obj = paginator.get_page(page_number)
+    page_obj = KeysetPaginator(list_values(qs, Timestamp), 50).get_page(
+        request.GET.get('page', '1'), request.GET.get('cursor'), request.GET.get('direction') == 'prev')
 
     fields_tuple = split_foreign_keys_to_fields(Timestamp)
 
@@ -1,9 +1,17 @@
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
 from django.http import StreamingHttpResponse, HttpRequest
-from django.db.models import IntegerField, FloatField, DecimalField, Q, Model, QuerySet
-from django.db import models
+from django.db.models import F, IntegerField, FloatField, DecimalField, Q, Model, QuerySet
+from django.db import connections, models
 import csv
+import io
 from datetime import datetime
+from itertools import islice
 from typing import Dict, List, Any, Optional, Type, Tuple, Generator
+from .. import wide_format
+
+EXPORT_METHODS = ('cursor', 'copy', 'keyset')
+EXPORT_LAYOUTS = ('long', 'wide')
 
 def get_field_types(model: Type[Model]) -> Dict[str, str]:
     """
@@ -111,104 +119,225 @@ def apply_sorting(qs: QuerySet, request: HttpRequest, allowed_sort_fields: List[
     return qs, primary_sort, primary_order
 
 
-def export_to_csv(queryset: Optional[QuerySet], model: Optional[Type[Model]] = None) -> StreamingHttpResponse:
+def export_fields(model: Type[Model]) -> List[Tuple[str, str]]:
+    """
+    Столбцы экспорта модели: (attname, имя в заголовке CSV).
+    Для внешних ключей выгружается id связанного объекта в столбце <поле>_id.
     """
-    Оптимизированная функция для экспорта QuerySet в CSV-файл с использованием потоковой передачи.
+    fields: List[Tuple[str, str]] = []
+    for field in model._meta.fields:
+        if field.get_internal_type() == 'ForeignKey':
+            field_export_name = f"{field.name}_id"
+        else:
+            field_export_name = field.name
+        fields.append((field.attname, field_export_name))
+    return fields
 
-    Оптимизации:
-    - Использует chunked processing для экономии памяти
-    - Использует StreamingHttpResponse для эффективной потоковой передачи
-    - Избегает вызова count() для больших таблиц
-    - Применяет фильтрацию по primary key для эффективного извлечения данных
+
+def get_export_method(queryset: QuerySet, method: Optional[str] = None) -> str:
+    """
+    Способ чтения строк для export_to_csv:
+    - cursor - серверный курсор PostgreSQL (QuerySet.iterator), порядок из apply_sorting сохраняется;
+    - copy - COPY ... TO STDOUT (только psycopg 3), значения в текстовом формате PostgreSQL;
+    - keyset - страницы по первичному ключу, если серверные курсоры недоступны
+      (DISABLE_SERVER_SIDE_CURSORS, например за pgbouncer в режиме transaction) или база не PostgreSQL.
+    """
+    method = method or getattr(settings, 'CSV_EXPORT_METHOD', 'cursor')
+    if method not in EXPORT_METHODS:
+        raise ValueError(f"Неизвестный способ экспорта: {method}")
+
+    db = connections[queryset.db]
+    if db.vendor != 'postgresql':
+        return 'keyset'
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+    if method == 'copy' and not is_psycopg3:
+        method = 'cursor'
+    if method == 'cursor' and db.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        method = 'keyset'
+    return method
+
+
+def _rows_by_keyset(queryset: QuerySet, columns: List[str], pk_field: str,
+                    chunk_size: int) -> Generator[tuple, None, None]:
+    pk_index: int = columns.index(pk_field)
+    queryset = queryset.order_by(pk_field).values_list(*columns)
+    last_pk: Any = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(**{f"{pk_field}__gt": last_pk})
+        chunk: List[tuple] = list(page[:chunk_size])
+        if not chunk:
+            break
+        yield from chunk
+        last_pk = chunk[-1][pk_index]
+
+
+def _rows_by_cursor(queryset: QuerySet, columns: List[str], chunk_size: int) -> Generator[tuple, None, None]:
+    yield from queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+
+
+def _rows_by_series_keyset(queryset: QuerySet, columns: List[str],
+                           chunk_size: int) -> Generator[tuple, None, None]:
+    """
+    Страницы таймстемпов в порядке wide_format.PIVOT_ORDERING без серверного курсора.
+    Последняя пара (ряд, start_dt) страницы дочитывается отдельным запросом, чтобы не разделять её.
+    """
+    queryset = queryset.order_by(*wide_format.PIVOT_ORDERING).values_list(*columns)
+    last_key: Optional[tuple] = None
+    while True:
+        page = queryset
+        if last_key is not None:
+            page = queryset.filter(Q(time_series_id__gt=last_key[0]) |
+                                   Q(time_series_id=last_key[0], start_dt__gt=last_key[1]))
+        chunk: List[tuple] = list(page[:chunk_size])
+        if not chunk:
+            break
+        if len(chunk) == chunk_size:
+            last_key = chunk[-1][:2]
+            chunk = [row for row in chunk if row[:2] != last_key]
+            chunk.extend(queryset.filter(time_series_id=last_key[0], start_dt=last_key[1]))
+        yield from chunk
+        last_key = chunk[-1][:2]
+
+
+def _wide_rows(queryset: QuerySet, method: str, chunk_size: int) -> Generator[tuple, None, None]:
+    """Таймстемпы (wide_format.PIVOT_FIELDS) в порядке (ряд, start_dt) для свёртки в широкий формат"""
+    columns = list(wide_format.PIVOT_FIELDS)
+    if method == 'keyset':
+        return _rows_by_series_keyset(queryset, columns, chunk_size)
+    return _rows_by_cursor(queryset.order_by(*wide_format.PIVOT_ORDERING), columns, chunk_size)
+
+
+def _copy_data(queryset: QuerySet, columns: List[str]) -> Generator[bytes, None, None]:
+    try:
+        sql, params = queryset.values_list(*columns).query.sql_with_params()
+    except EmptyResultSet:
+        return
+    with connections[queryset.db].cursor() as cursor:
+        with cursor.copy(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", params) as copy:
+            for data in copy:
+                yield bytes(data)
+
+
+def export_to_csv(queryset: Optional[QuerySet], model: Optional[Type[Model]] = None,
+                  method: Optional[str] = None, layout: str = 'long') -> StreamingHttpResponse:
+    """
+    Экспорт QuerySet в CSV-файл с потоковой передачей.
+
+    Строки читаются одним запросом через серверный курсор (или COPY) в порядке QuerySet,
+    то есть с учётом apply_filters/apply_sorting, как кортежи values_list без создания
+    объектов модели, и отдаются пачками по CSV_EXPORT_CHUNK_SIZE строк.
+    Файл начинается с BOM, в заголовке внешние ключи названы <поле>_id.
 
     Args:
         queryset: Django QuerySet для экспорта
         model: Модель Django (опционально, если не указана, будет взята из queryset)
+        method: cursor, copy или keyset (по умолчанию CSV_EXPORT_METHOD), см. get_export_method
+        layout: long - строка на объект; wide - только для таймстемпов, строка на (ряд, start_dt)
+            со столбцом на атрибут (databaseadmin.wide_format), строки упорядочены по ряду и start_dt
     """
-    if model is None and queryset:
+    if model is None and queryset is not None:
         model = queryset.model
 
     if model is None:
         raise ValueError("Модель должна быть указана для export_to_csv")
 
-    model_name = model._meta.model_name
-
-    fields: List[Dict[str, str]] = []
-    for field in model._meta.fields:
-        if field.get_internal_type() == 'ForeignKey':
-            field_export_name = f"{field.name}_id"
-        else:
-            field_export_name = field.name
+    if queryset is None:
+        queryset = model.objects.all()
 
-        fields.append({
-            'name': field.name,
-            'export_name': field_export_name
-        })
+    if layout not in EXPORT_LAYOUTS:
+        raise ValueError(f"Неизвестный формат экспорта: {layout}")
+    if layout == 'wide':
+        return _export_wide_csv(queryset, method)
 
-    header_names: List[str] = [field['export_name'] for field in fields]
+    model_name = model._meta.model_name
+    fields = export_fields(model)
+    columns: List[str] = [attname for attname, _ in fields]
+    header_names: List[str] = [export_name for _, export_name in fields]
+    method = get_export_method(queryset, method)
+    chunk_size: int = getattr(settings, 'CSV_EXPORT_CHUNK_SIZE', 2000)
 
     timestamp: str = datetime.now().strftime('%Y%m%d%H%M%S')
     filename: str = f"{model_name}_export_{timestamp}.csv"
 
-    class BOMEcho:
-        """
-        Класс, который имитирует файлоподобный объект, который пишет в дополнительный объект.
-        Также автоматически добавляет BOM-маркер для поддержки Unicode.
-        """
-
-        def __init__(self) -> None:
-            self.first_write: bool = True
-
-        def write(self, value: str) -> str:
-            if self.first_write:
-                self.first_write = False
-                return '\ufeff' + value
-            return value
-
-    pseudo_buffer: BOMEcho = BOMEcho()
-    writer = csv.writer(pseudo_buffer)
-
     def get_csv_data() -> Generator[bytes, None, None]:
-        yield writer.writerow(header_names).encode('utf-8')
+        buffer = io.StringIO()
+        # COPY завершает строки \n, поэтому в этом режиме и заголовок завершается \n, а не \r\n
+        writer = csv.writer(buffer, lineterminator='\n' if method == 'copy' else '\r\n')
+        buffer.write('\ufeff')
+        writer.writerow(header_names)
+
+        if method == 'copy':
+            yield buffer.getvalue().encode('utf-8')
+            yield from _copy_data(queryset, columns)
+            return
+
+        if method == 'keyset':
+            pk_field: str = model._meta.pk.attname if model._meta.pk is not None else 'id'
+            rows = _rows_by_keyset(queryset, columns, pk_field, chunk_size)
+        else:
+            rows = _rows_by_cursor(queryset, columns, chunk_size)
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            writer.writerows(chunk)
+            data = buffer.getvalue()
+            if data:
+                yield data.encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+            if len(chunk) < chunk_size:
+                break
 
-        pk_field: str = model._meta.pk.name if model._meta.pk is not None else 'id'
-        
-        nonlocal queryset
-        if queryset is None:
-            queryset = model.objects.all()
+    response = StreamingHttpResponse(
+        get_csv_data(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-        for field in model._meta.fields:
-            if field.is_relation and field.many_to_one and hasattr(queryset, 'select_related'):
-                queryset = queryset.select_related(field.name)
 
-        chunk_size: int = 1000
-        last_pk: int = 0
-        has_more: bool = True
+def _wide_export(queryset: QuerySet, method: Optional[str]) -> Tuple[List[Tuple[int, str, bool]], Generator]:
+    if queryset.model._meta.model_name != 'timestamp':
+        raise ValueError("Широкий формат поддерживается только для таймстемпов")
+    method = get_export_method(queryset, method)
+    chunk_size: int = getattr(settings, 'CSV_EXPORT_CHUNK_SIZE', 2000)
+    return wide_format.attribute_columns(queryset), _wide_rows(queryset, method, chunk_size)
 
-        while has_more:
-            chunk: List[Model] = list(queryset.filter(
-                **{f"{pk_field}__gt": last_pk}).order_by(pk_field)[:chunk_size])
 
-            if not chunk:
-                break
+def _export_wide_csv(queryset: QuerySet, method: Optional[str]) -> StreamingHttpResponse:
+    attributes, rows = _wide_export(queryset, method)
+    attribute_ids = [pk for pk, _, _ in attributes]
 
-            last_pk = getattr(chunk[-1], pk_field)
+    def get_csv_data() -> Generator[bytes, None, None]:
+        buffer = io.StringIO()
+        buffer.write('\ufeff')
+        csv.writer(buffer).writerow(['time_series_id', 'start_dt', *(column for _, column, _ in attributes)])
+        for frame in wide_format.pivot(rows, attribute_ids):
+            frame.to_csv(buffer, header=False, index=False)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.getvalue():
+            yield buffer.getvalue().encode('utf-8')
 
-            for obj in chunk:
-                row: List[Any] = []
-                for field_info in fields:
-                    field_name: str = field_info['name']
-                    value: Any = getattr(obj, field_name)
+    timestamp: str = datetime.now().strftime('%Y%m%d%H%M%S')
+    response = StreamingHttpResponse(get_csv_data(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="timestamp_wide_export_{timestamp}.csv"'
+    return response
 
-                    if isinstance(value, models.Model):
-                        value = value.pk
 
-                    row.append(value)
-                yield writer.writerow(row).encode('utf-8')
+def export_to_parquet(queryset: QuerySet, method: Optional[str] = None) -> StreamingHttpResponse:
+    """
+    Экспорт таймстемпов в Parquet в широком формате (нужен pyarrow), с потоковой передачей:
+    каждая свёрнутая часть - группа строк файла. Числовые атрибуты выгружаются числами (value_num),
+    кроме атрибутов с не приводимыми к числу значениями (см. wide_format.parquet_columns).
+    """
+    wide_format.require_pyarrow()
+    attributes, rows = _wide_export(queryset, method)
+    attributes = wide_format.parquet_columns(queryset, attributes)
 
-    response = StreamingHttpResponse(
-        get_csv_data(), content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    timestamp: str = datetime.now().strftime('%Y%m%d%H%M%S')
+    response = StreamingHttpResponse(wide_format.parquet_data(rows, attributes),
+                                     content_type='application/vnd.apache.parquet')
+    response['Content-Disposition'] = f'attachment; filename="timestamp_wide_export_{timestamp}.parquet"'
     return response
 
 
@@ -241,7 +370,7 @@ def get_field_info(model: Type[Model]) -> List[Dict[str, Any]]:
     """
     field_info = []
     for field in model._meta.fields:
-        if field.auto_created:
+        if field.auto_created or not field.editable:
             continue
 
         field_info.append({
@@ -301,3 +430,49 @@ def split_foreign_keys_to_fields(model: Type[Model]) -> List[Tuple[str, str]]:
             result.append((field_name, field_name))
     
     return result
+
+
+def _list_foreign_keys(model: Type[Model]) -> List[models.ForeignKey]:
+    """Внешние ключи, которые split_foreign_keys_to_fields выводит столбцом связанного объекта"""
+    columns = {name for name, _ in split_foreign_keys_to_fields(model)}
+    return [field for field in model._meta.fields
+            if field.get_internal_type() == 'ForeignKey' and field.name in columns]
+
+
+def related_label_lookup(field: models.ForeignKey) -> str:
+    """
+    Путь к подписи связанного объекта, как её выводит фильтр get_attr:
+    <поле>__name, если у связанной модели есть name, иначе <поле>__pk.
+    """
+    related_fields = {related.name for related in field.related_model._meta.fields}
+    return f"{field.name}__{'name' if 'name' in related_fields else 'pk'}"
+
+
+def list_queryset(qs: QuerySet, model: Type[Model]) -> QuerySet:
+    """
+    QuerySet строк таблицы data_view без запроса на каждую строку: связанные объекты
+    столбцов split_foreign_keys_to_fields загружаются тем же запросом (select_related),
+    из них читается только подпись (only). Поля самой модели загружаются все:
+    по ним сортирует apply_sorting и строит курсоры KeysetPaginator.
+    """
+    foreign_keys = _list_foreign_keys(model)
+    if not foreign_keys:
+        return qs
+    return qs.select_related(*(field.name for field in foreign_keys)).only(
+        *(field.name for field in model._meta.concrete_fields),
+        *(related_label_lookup(field) for field in foreign_keys),
+    )
+
+
+def list_values(qs: QuerySet, model: Type[Model]) -> QuerySet:
+    """
+    Строки таблицы data_view словарями (values()) - для больших таблиц, где создание
+    экземпляров моделей на каждую строку заметно дороже самого запроса.
+    Ключи: attname полей модели, pk и подписи внешних ключей (related_label_lookup),
+    которые находят фильтры get_attr и get_related_id.
+    """
+    return qs.values(
+        *(field.attname for field in model._meta.concrete_fields),
+        *(related_label_lookup(field) for field in _list_foreign_keys(model)),
+        pk=F(model._meta.pk.attname),
+    )
@@ -0,0 +1,350 @@
+"""
+Широкий формат таймстемпов: одна строка на пару (ряд, start_dt), по столбцу на атрибут.
+
+    time_series_id,start_dt,price,volume
+    12,2024-01-01 00:00:00+00:00,10.5,300
+
+Столбец ряда называется time_series или time_series_id (id или имя ряда), столбцы атрибутов -
+именами атрибутов, а если имя неоднозначно - id атрибута. Пустая ячейка означает, что значения нет.
+end_dt в широком формате не передаётся.
+
+Импорт разворачивает файл частями: ячейки со значениями выбираются из массива части numpy,
+полученные длинные строки (ряд, атрибут, значение, start_dt) записывает CsvImporter.
+Экспорт читает таймстемпы в порядке (ряд, start_dt) и сворачивает их pandas по частям.
+Кроме CSV поддерживается Parquet (нужен pyarrow): числовые атрибуты в нём хранятся числами
+(value_num), остальные - строками. Числовой атрибут, среди значений которого есть не приводимые
+к числу, тоже выгружается строками, чтобы эти значения не терялись.
+"""
+import csv
+import io
+import time
+from collections import Counter
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from django.db import models, transaction
+from django.db.models.expressions import RawSQL
+
+from .data_access import parse_numeric_value, value_number_sql
+from .importers import CsvImporter, CsvImportError, ForeignKeyMap
+from .models import Attribute, Timestamp
+
+SERIES_COLUMNS = ('time_series', 'time_series_id')
+START_COLUMN = 'start_dt'
+# Заголовок длинных строк, которые получает CsvImporter
+LONG_HEADER = ['time_series', 'attribute', 'value', 'start_dt']
+# Поля таймстемпов для свёртки и порядок их чтения
+PIVOT_FIELDS = ('time_series_id', 'start_dt', 'attribute_id', 'value', 'value_num')
+PIVOT_ORDERING = ('time_series_id', 'start_dt', 'attribute_id', 'timestamp_id')
+# Таймстемпов в одной сворачиваемой части при экспорте
+PIVOT_CHUNK_ROWS = 100_000
+# Строк широкого файла в одной разворачиваемой части при импорте
+UNPIVOT_CHUNK_ROWS = 20_000
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Для импорта и экспорта Parquet установите pyarrow")
+    return pyarrow
+
+
+def is_wide_header(header: Iterable[str]) -> bool:
+    """Заголовок таймстемпов в широком формате: есть столбцы ряда и start_dt, но нет столбца атрибута"""
+    names = {(name or '').strip() for name in header}
+    return (START_COLUMN in names and bool(names & set(SERIES_COLUMNS))
+            and not names & {'attribute', 'attribute_id'})
+
+
+class WideLayout:
+    """Столбцы широкого файла: столбец ряда, start_dt и id атрибута каждого столбца атрибута"""
+
+    def __init__(self, header: List[str]):
+        self.header = [(name or '').strip() for name in header]
+        duplicates = [name for name, count in Counter(self.header).items() if count > 1]
+        if duplicates:
+            raise CsvImportError('Повторяющиеся столбцы', duplicate_fields=duplicates)
+        series_columns = [name for name in self.header if name in SERIES_COLUMNS]
+        missing_fields = [name for name, present in (('time_series', bool(series_columns)),
+                                                     (START_COLUMN, START_COLUMN in self.header)) if not present]
+        if missing_fields:
+            raise CsvImportError('Отсутствуют обязательные поля', missing_fields=missing_fields)
+        self.series_column = series_columns[0]
+
+        attributes = ForeignKeyMap(Attribute)
+        self.attribute_ids: Dict[str, int] = {}
+        unknown = []
+        for name in self.header:
+            if name in SERIES_COLUMNS or name == START_COLUMN:
+                continue
+            try:
+                self.attribute_ids[name] = attributes.resolve(name)
+            except ValueError:
+                unknown.append(name)
+        if unknown:
+            raise CsvImportError('Неизвестные атрибуты', unknown_attributes=unknown)
+        if not self.attribute_ids:
+            raise CsvImportError('Нет столбцов атрибутов')
+
+    def unpivot(self, frame: pd.DataFrame, first_line: int) -> Iterator[Tuple[int, Dict[str, str]]]:
+        """
+        Длинные строки (номер строки файла, значения) части широкого файла для CsvImporter.import_rows.
+        Ячейки выбираются по строкам файла, поэтому порядок строк файла сохраняется.
+        """
+        frame = frame.fillna('')
+        columns = list(self.attribute_ids)
+        values = np.char.strip(frame[columns].to_numpy(dtype=str))
+        rows, cells = np.nonzero(values != '')
+        attribute_ids = np.array([str(self.attribute_ids[column]) for column in columns], dtype=object)
+        yield from (
+            (line, {'time_series': series, 'attribute': attribute, 'value': value, 'start_dt': start})
+            for line, series, attribute, value, start in zip(
+                (first_line + rows).tolist(),
+                np.char.strip(frame[self.series_column].to_numpy(dtype=str))[rows].tolist(),
+                attribute_ids[cells].tolist(),
+                values[rows, cells].tolist(),
+                np.char.strip(frame[START_COLUMN].to_numpy(dtype=str))[rows].tolist(),
+            )
+        )
+
+
+def _text_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Столбцы части Parquet в строки, как в CSV; даты - ISO 8601 в UTC"""
+    columns = {}
+    for name, column in frame.items():
+        if pd.api.types.is_datetime64_any_dtype(column):
+            if column.dt.tz is not None:
+                column = column.dt.tz_convert('UTC').dt.tz_localize(None)
+            column = column.dt.strftime('%Y-%m-%dT%H:%M:%S.%f')
+        elif pd.api.types.is_float_dtype(column) and (column.dropna() % 1 == 0).all():
+            # Целые числа со значениями null pandas хранит как float: выводим без дробной части
+            column = column.astype('Int64')
+        columns[name] = column.astype(object).where(column.notna(), '').astype(str)
+    return pd.DataFrame(columns)
+
+
+def read_csv_frames(stream: BinaryIO,
+                    chunk_rows: int = UNPIVOT_CHUNK_ROWS) -> Tuple[List[str], Iterator[pd.DataFrame]]:
+    """Заголовок и части широкого CSV как таблицы строк"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    header = next(csv.reader(text), [])
+    names = [(name or '').strip() for name in header]
+
+    def frames() -> Iterator[pd.DataFrame]:
+        yield from pd.read_csv(text, header=None, names=names, dtype=str, keep_default_na=False,
+                               chunksize=chunk_rows)
+    return header, frames()
+
+
+def read_csv_chunk(data: bytes, layout: WideLayout) -> pd.DataFrame:
+    """Таблица строк из части широкого CSV без заголовка (см. databaseadmin.ingestion.read_records)"""
+    try:
+        return pd.read_csv(io.BytesIO(data), header=None, names=layout.header, dtype=str, keep_default_na=False,
+                           encoding='utf-8')
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=layout.header)
+    except UnicodeDecodeError as exc:
+        raise CsvImportError(f"Файл не в кодировке UTF-8: {exc}")
+    except pd.errors.ParserError as exc:
+        raise CsvImportError(f"Ошибка разбора CSV: {exc}")
+
+
+def read_parquet_frames(stream: BinaryIO,
+                        chunk_rows: int = UNPIVOT_CHUNK_ROWS) -> Tuple[List[str], Iterator[pd.DataFrame]]:
+    """Заголовок и части широкого Parquet как таблицы строк"""
+    pa = require_pyarrow()
+    try:
+        parquet_file = pa.parquet.ParquetFile(stream)
+    except pa.ArrowException as exc:
+        raise CsvImportError(f"Ошибка чтения Parquet: {exc}")
+
+    def frames() -> Iterator[pd.DataFrame]:
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield _text_frame(batch.to_pandas())
+    return list(parquet_file.schema_arrow.names), frames()
+
+
+def import_wide(stream: BinaryIO, file_format: str = 'csv', dedupe: bool = False,
+                batch_size: Optional[int] = None, method: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Импортирует таймстемпы из широкого CSV или Parquet (file_format) одной транзакцией.
+
+    Returns:
+        Результат CsvImporter.run; processed - число непустых ячеек атрибутов
+    """
+    started = time.perf_counter()
+    importer = CsvImporter(Timestamp, batch_size=batch_size, method=method, dedupe=dedupe)
+    try:
+        if file_format == 'parquet':
+            header, frames = read_parquet_frames(stream)
+            first_line = 1
+        else:
+            header, frames = read_csv_frames(stream)
+            first_line = 2
+        layout = WideLayout(header)
+        importer.prepare(LONG_HEADER)
+        with transaction.atomic():
+            for frame in frames:
+                importer.import_rows(layout.unpivot(frame, first_line))
+                first_line += len(frame)
+            importer.finish()
+    except UnicodeDecodeError as exc:
+        raise CsvImportError(f"Файл не в кодировке UTF-8: {exc}")
+    except (csv.Error, pd.errors.ParserError) as exc:
+        raise CsvImportError(f"Ошибка разбора CSV: {exc}")
+    return importer.summary(started)
+
+
+def _attribute_columns(attributes: models.QuerySet) -> List[Tuple[int, str, bool]]:
+    """
+    (id атрибута, имя столбца, числовой) для атрибутов. Столбец называется именем атрибута,
+    если оно однозначно и при импорте не будет принято за id или другой столбец, иначе id.
+    """
+    rows = list(attributes.order_by('name', 'pk').values_list('pk', 'name', 'data_type'))
+    # Однозначность имени - среди всех атрибутов, как при разрешении имён в импорте
+    counts = Counter(Attribute.objects.filter(name__in={name for _, name, _ in rows}).values_list('name', flat=True))
+    reserved = {*SERIES_COLUMNS, START_COLUMN, 'attribute', 'attribute_id'}
+    return [
+        (pk, name if counts[name] == 1 and not name.isdigit() and name.strip() == name and name not in reserved
+         else str(pk), Attribute.is_numeric_type(data_type))
+        for pk, name, data_type in rows
+    ]
+
+
+def attribute_columns(queryset: models.QuerySet) -> List[Tuple[int, str, bool]]:
+    """Столбцы атрибутов широкого экспорта таймстемпов queryset, см. _attribute_columns"""
+    return _attribute_columns(Attribute.objects.filter(pk__in=queryset.order_by().values('attribute_id').distinct()))
+
+
+def parquet_columns(queryset: models.QuerySet,
+                    attributes: List[Tuple[int, str, bool]]) -> List[Tuple[int, str, bool]]:
+    """
+    Столбцы атрибутов (см. attribute_columns) для Parquet. Числовой атрибут, у которого в queryset есть
+    непустые значения, не приводимые к числу ('abc', '1e999'), выгружается строками, а не числами
+    """
+    numeric_ids = [pk for pk, _, numeric in attributes if numeric]
+    if not numeric_ids:
+        return attributes
+    text_ids = set(
+        queryset.order_by()
+        .filter(attribute_id__in=numeric_ids)
+        .annotate(number=RawSQL(value_number_sql(Timestamp._meta.db_table), [], output_field=models.FloatField()))
+        .filter(number__isnull=True)
+        .exclude(value__regex=r'^\s*$')
+        .values_list('attribute_id', flat=True)
+        .distinct()
+    )
+    return [(pk, column, numeric and pk not in text_ids) for pk, column, numeric in attributes]
+
+
+def _pivot_chunk(chunk: List[tuple], attribute_ids: List[int], numeric_ids: List[int]) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(chunk, columns=PIVOT_FIELDS)
+    # Повтор атрибута в одной точке: берётся последний записанный таймстемп
+    frame = frame.drop_duplicates(['time_series_id', 'start_dt', 'attribute_id'], keep='last')
+    wide = frame.pivot(index=['time_series_id', 'start_dt'], columns='attribute_id', values=['value', 'value_num'])
+    values = wide['value'].reindex(columns=attribute_ids)
+    if numeric_ids:
+        numbers = wide['value_num'].reindex(columns=numeric_ids).astype('float64')
+        # value_num пуст у строк, записанных в обход приложения: число разбирается из value
+        missing = numbers.isna() & values[numeric_ids].notna()
+        if missing.to_numpy().any():
+            parsed = values[numeric_ids].where(missing).map(
+                lambda value: parse_numeric_value(value) if isinstance(value, str) else None)
+            numbers = numbers.fillna(parsed.astype('float64'))
+        values = values.astype(object)
+        for attribute_id in numeric_ids:
+            values[attribute_id] = numbers[attribute_id]
+    return values.reset_index()
+
+
+def pivot(rows: Iterable[tuple], attribute_ids: List[int], numeric_ids: Optional[List[int]] = None,
+          chunk_rows: int = PIVOT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Части широкой таблицы из таймстемпов (PIVOT_FIELDS) в порядке PIVOT_ORDERING.
+
+    Строки одной пары (ряд, start_dt) не разделяются между частями. Столбцы части: time_series_id,
+    start_dt и id атрибутов attribute_ids; для numeric_ids вместо value берётся value_num.
+    """
+    rows = iter(rows)
+    numeric_ids = numeric_ids or []
+    carry: List[tuple] = []
+    while True:
+        read = list(islice(rows, chunk_rows))
+        chunk = carry + read
+        if not chunk:
+            return
+        if len(read) < chunk_rows:
+            yield _pivot_chunk(chunk, attribute_ids, numeric_ids)
+            return
+        # Последняя пара (ряд, start_dt) части может продолжиться в следующей: переносим её
+        key = chunk[-1][:2]
+        split = len(chunk)
+        while split and chunk[split - 1][:2] == key:
+            split -= 1
+        chunk, carry = chunk[:split], chunk[split:]
+        if chunk:
+            yield _pivot_chunk(chunk, attribute_ids, numeric_ids)
+
+
+def template_rows() -> Tuple[List[str], List[str]]:
+    """Заголовок и пример строки шаблона широкого CSV по существующим атрибутам"""
+    header = ['time_series', START_COLUMN]
+    example = ['1', '2024-01-01 12:00:00']
+    for _, column, numeric in _attribute_columns(Attribute.objects.all()):
+        header.append(column)
+        example.append('123.45' if numeric else 'example_value')
+    return header, example
+
+
+class _ParquetSink(io.RawIOBase):
+    """Поток для pyarrow.parquet.ParquetWriter: накапливает записанные байты до take()"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_data(rows: Iterable[tuple], attributes: List[Tuple[int, str, bool]]) -> Iterator[bytes]:
+    """
+    Широкий Parquet по частям для потоковой передачи: каждая свёрнутая часть - группа строк файла.
+
+    Args:
+        rows: Таймстемпы (PIVOT_FIELDS) в порядке PIVOT_ORDERING
+        attributes: Столбцы атрибутов, см. attribute_columns
+    """
+    pa = require_pyarrow()
+    schema = pa.schema([
+        ('time_series_id', pa.int64()),
+        ('start_dt', pa.timestamp('us', tz='UTC')),
+        *((column, pa.float64() if numeric else pa.string()) for _, column, numeric in attributes),
+    ])
+    attribute_ids = [pk for pk, _, _ in attributes]
+    numeric_ids = [pk for pk, _, numeric in attributes if numeric]
+    sink = _ParquetSink()
+    with pa.parquet.ParquetWriter(sink, schema) as writer:
+        for frame in pivot(rows, attribute_ids, numeric_ids):
+            frame.columns = schema.names
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            yield sink.take()
+    yield sink.take()
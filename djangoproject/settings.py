@@ -65,6 +65,18 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # True за pgbouncer в режиме transaction: серверные курсоры не переживают смену соединения
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', 'False').lower() == 'true',
+    }
+}
+
+# Кэш Django (кэш иерархии). Версии данных для него и для ETag дерева хранятся в БД (cache_versions),
+# поэтому локальный кэш процесса корректен; общий бэкенд избавляет процессы от повторных вычислений:
+# django.core.cache.backends.redis.RedisCache, ...filebased.FileBasedCache или ...db.DatabaseCache
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
@@ -93,4 +105,34 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOGIN_REDIRECT_URL = os.environ.get('LOGIN_REDIRECT_URL', '/')
-LOGOUT_REDIRECT_URL = os.environ.get('LOGOUT_REDIRECT_URL', '/accounts/login/')
\ No newline at end of file
+LOGOUT_REDIRECT_URL = os.environ.get('LOGOUT_REDIRECT_URL', '/accounts/login/')
+
+# Число процессов для перебора параметров SARIMAX (1 - последовательно, -1 - все ядра)
+FORECASTING_N_JOBS = int(os.environ.get('FORECASTING_N_JOBS', '1'))
+# Отбор лаговых признаков: corr, mutual_info или pacf
+FORECASTING_FEATURE_SELECTOR = os.environ.get('FORECASTING_FEATURE_SELECTOR', 'corr')
+# Кэш загруженных моделей в памяти процесса: максимум моделей и суммарный размер файлов (0 - отключить)
+FORECASTING_MODEL_CACHE_SIZE = int(os.environ.get('FORECASTING_MODEL_CACHE_SIZE', '8'))
+FORECASTING_MODEL_CACHE_MAX_BYTES = int(os.environ.get('FORECASTING_MODEL_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+# Формат файла обученной модели: compact (.npz, только состояние для прогноза) или pickle
+FORECASTING_MODEL_FORMAT = os.environ.get('FORECASTING_MODEL_FORMAT', 'compact')
+# Кэш таймстемпов иерархии: время жизни записи в секундах (0 - отключить) и максимум строк в записи
+HIERARCHY_CACHE_TIMEOUT = int(os.environ.get('HIERARCHY_CACHE_TIMEOUT', '600'))
+HIERARCHY_CACHE_MAX_ROWS = int(os.environ.get('HIERARCHY_CACHE_MAX_ROWS', '50000'))
+# Материализация таймстемпов иерархии в effective_timestamps (после включения: manage.py rebuild_effective_timestamps)
+EFFECTIVE_TIMESTAMPS_ENABLED = os.environ.get('EFFECTIVE_TIMESTAMPS_ENABLED', 'False').lower() == 'true'
+# Колоночные снимки значений рядов (Arrow IPC, нужен pyarrow) для обучения и прогнозов детей
+SERIES_STORE_ENABLED = os.environ.get('SERIES_STORE_ENABLED', 'False').lower() == 'true'
+SERIES_STORE_DIR = os.environ.get('SERIES_STORE_DIR') or str(BASE_DIR / 'series_store')
+# Экспорт CSV: cursor (серверный курсор), copy (COPY TO STDOUT, формат значений PostgreSQL) или keyset; строк в пачке
+CSV_EXPORT_METHOD = os.environ.get('CSV_EXPORT_METHOD', 'cursor')
+CSV_EXPORT_CHUNK_SIZE = int(os.environ.get('CSV_EXPORT_CHUNK_SIZE', '2000'))
+# Импорт CSV: предельный размер файла в байтах (0 - без ограничения), строк в пачке, copy (COPY для таймстемпов, иначе bulk_create) или bulk
+CSV_IMPORT_MAX_SIZE = int(os.environ.get('CSV_IMPORT_MAX_SIZE', str(10 * 1024 ** 3)))
+CSV_IMPORT_BATCH_SIZE = int(os.environ.get('CSV_IMPORT_BATCH_SIZE', '5000'))
+CSV_IMPORT_METHOD = os.environ.get('CSV_IMPORT_METHOD', 'copy')
+# Фоновый импорт CSV (IngestionJob): каталог загруженных файлов, записей в части (транзакции с контрольной точкой),
+# размер файла в байтах, начиная с которого загрузка со страниц данных импортируется в фоне (0 - только по async=1)
+INGESTION_STAGING_DIR = os.environ.get('INGESTION_STAGING_DIR') or str(BASE_DIR / 'ingestion_staging')
+INGESTION_CHUNK_ROWS = int(os.environ.get('INGESTION_CHUNK_ROWS', '50000'))
+INGESTION_ASYNC_THRESHOLD = int(os.environ.get('INGESTION_ASYNC_THRESHOLD', str(50 * 1024 ** 2)))
@@ -3,6 +3,7 @@ import numpy as np
 from pmdarima import auto_arima
 from statsmodels.tsa.statespace.sarimax import SARIMAX, SARIMAXResultsWrapper
 from typing import List, Optional, Tuple
+from databaseadmin.forecasting import lag_feature_cache
 
 class SARIMAXAutoForecaster:
     """
@@ -25,10 +26,7 @@ class SARIMAXAutoForecaster:
         self.best_mape_: float = np.inf
 
     def _make_exogs(self, ts_price: pd.Series) -> pd.DataFrame:
-        exog = pd.DataFrame(index=ts_price.index)
-        for lag in range(1, self.max_lags + 1):
-            exog[f'lag_diff_{lag}'] = ts_price - ts_price.shift(lag)
-        return exog.dropna()
+        return lag_feature_cache.get(ts_price, self.max_lags)
 
     def _split(
         self,